@@ -0,0 +1,212 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore
+from resample import resample_candles
+from strategy import TradingStrategy
+from config import (
+    SYMBOL, TIMEFRAME, MAX_DAILY_TRADES, DATA_DIR, BACKTEST_FEE_RATE, BACKTEST_INITIAL_BALANCE
+)
+
+# 平仓原因
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_SIGNAL = 3
+EXIT_END = 4
+EXIT_REASONS = {
+    EXIT_STOP_LOSS: 'stop_loss',
+    EXIT_TAKE_PROFIT: 'take_profit',
+    EXIT_SIGNAL: 'signal',
+    EXIT_END: 'end',
+}
+
+
+class BacktestResult:
+    """回测结果：成交列表和权益曲线"""
+
+    def __init__(self, trades, equity, initial_balance):
+        self.trades = trades
+        self.equity = equity
+        self.initial_balance = initial_balance
+
+    def summary(self):
+        equity = self.equity.to_numpy()
+        peak = np.maximum.accumulate(equity)
+        pnl = self.trades['pnl'].to_numpy()
+        return {
+            'trades': len(self.trades),
+            'final_equity': float(equity[-1]) if len(equity) else self.initial_balance,
+            'total_return': float(equity[-1] / self.initial_balance - 1) if len(equity) else 0.0,
+            'max_drawdown': float(np.max(1 - equity / peak)) if len(equity) else 0.0,
+            'win_rate': float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+            'fees': float(self.trades['fee'].sum()),
+        }
+
+
+class Backtester:
+    """向量化回测：用generate_signals计算全部信号，按笔而不是按K线推进，
+    止损止盈和平仓信号用NumPy在K线数组上批量查找"""
+
+    def __init__(self, strategy=None, initial_balance=BACKTEST_INITIAL_BALANCE,
+                 fee_rate=BACKTEST_FEE_RATE, max_daily_trades=MAX_DAILY_TRADES, bar='1m'):
+        self.strategy = strategy or TradingStrategy()
+        self.bar = bar
+        self.initial_balance = initial_balance
+        self.fee_rate = fee_rate
+        self.max_daily_trades = max_daily_trades
+
+    def run(self, df, signals=None):
+        """对按时间正序排列的K线回测；signals可传入已计算好的generate_signals结果。
+        策略的趋势过滤周期由df合成，与实盘一样只使用已走完的高周期K线"""
+        if signals is None:
+            frames = {timeframe: resample_candles(df, timeframe, self.bar)
+                      for timeframe in self.strategy.trend_timeframes}
+            signals = self.strategy.generate_signals(df.copy(), frames, self.bar)
+        self._open = signals['open'].to_numpy(dtype=np.float64)
+        self._high = signals['high'].to_numpy(dtype=np.float64)
+        self._low = signals['low'].to_numpy(dtype=np.float64)
+        self._close = signals['close'].to_numpy(dtype=np.float64)
+        signal = signals['signal'].to_numpy()
+        strength = signals['signal_strength'].to_numpy(dtype=np.float64)
+        atr = signals['atr'].to_numpy(dtype=np.float64)
+        timestamps = signals['timestamp'].to_numpy()
+        n = len(signals)
+
+        # 每日交易计数：按自然日编号，计数保存在数组中
+        _, self._day_idx = np.unique(timestamps.astype('datetime64[D]'), return_inverse=True)
+        self._day_counts = np.zeros(self._day_idx.max() + 1 if n else 0, dtype=np.int64)
+        self._sell = signal == -1
+        buy_idx = np.flatnonzero(signal == 1)
+
+        # 预分配成交数组，最多每个买入信号一笔
+        capacity = len(buy_idx)
+        entry_idx = np.empty(capacity, dtype=np.int64)
+        exit_idx = np.empty(capacity, dtype=np.int64)
+        entry_px = np.empty(capacity)
+        exit_px = np.empty(capacity)
+        amount = np.empty(capacity)
+        fee = np.empty(capacity)
+        pnl = np.empty(capacity)
+        reason = np.empty(capacity, dtype=np.int8)
+
+        balance = self.initial_balance
+        count = 0
+        pos = 0
+        while pos < len(buy_idx):
+            i = buy_idx[pos]
+            day = self._day_idx[i]
+            if self._day_counts[day] >= self.max_daily_trades or not np.isfinite(atr[i]):
+                pos += 1
+                continue
+
+            price = self._close[i]
+            size = self.strategy.calculate_position_size(balance, price, strength[i])
+            if size <= 0:
+                pos += 1
+                continue
+            stop_loss = self.strategy.calculate_stop_loss(price, 'buy', atr[i])
+            take_profit = self.strategy.calculate_take_profit(price, 'buy', atr[i])
+            self._day_counts[day] += 1
+
+            j, exit_reason, exit_price = self._find_exit(i, stop_loss, take_profit)
+            if exit_reason == EXIT_SIGNAL:
+                self._day_counts[self._day_idx[j]] += 1
+
+            trade_fee = (price + exit_price) * size * self.fee_rate
+            trade_pnl = (exit_price - price) * size - trade_fee
+            entry_idx[count], exit_idx[count] = i, j
+            entry_px[count], exit_px[count] = price, exit_price
+            amount[count], fee[count], pnl[count] = size, trade_fee, trade_pnl
+            reason[count] = exit_reason
+            count += 1
+            balance += trade_pnl
+
+            if exit_reason == EXIT_END:
+                break
+            # 止损止盈在K线内成交，同一根K线收盘时可再次开仓；信号平仓则从下一根开始
+            side = 'right' if exit_reason == EXIT_SIGNAL else 'left'
+            pos = np.searchsorted(buy_idx, j, side=side)
+
+        trades = pd.DataFrame({
+            'entry_time': timestamps[entry_idx[:count]],
+            'exit_time': timestamps[exit_idx[:count]],
+            'side': 'buy',
+            'entry_price': entry_px[:count],
+            'exit_price': exit_px[:count],
+            'amount': amount[:count],
+            'fee': fee[:count],
+            'pnl': pnl[:count],
+            'exit_reason': [EXIT_REASONS[r] for r in reason[:count]],
+        })
+        equity = self._equity_curve(n, entry_idx[:count], exit_idx[:count], entry_px[:count],
+                                    amount[:count], fee[:count], pnl[:count])
+        return BacktestResult(trades, pd.Series(equity, index=timestamps), self.initial_balance)
+
+    def _find_exit(self, i, stop_loss, take_profit):
+        """从开仓后的下一根K线起，分段向量化查找首个止损、止盈或平仓信号"""
+        n = len(self._close)
+        start = i + 1
+        size = 256
+        while start < n:
+            end = min(n, start + size)
+            sl_hit = self._low[start:end] <= stop_loss
+            tp_hit = self._high[start:end] >= take_profit
+            # 当日交易次数已满时机器人不会执行卖出
+            sell = self._sell[start:end] & (self._day_counts[self._day_idx[start:end]] < self.max_daily_trades)
+            hit = sl_hit | tp_hit | sell
+            if hit.any():
+                k = int(np.argmax(hit))
+                j = start + k
+                # 同一根K线同时触及止损和止盈时保守地按止损处理；跳空时按开盘价成交
+                if sl_hit[k]:
+                    return j, EXIT_STOP_LOSS, min(self._open[j], stop_loss)
+                if tp_hit[k]:
+                    return j, EXIT_TAKE_PROFIT, max(self._open[j], take_profit)
+                return j, EXIT_SIGNAL, self._close[j]
+            start = end
+            size *= 4
+        return n - 1, EXIT_END, self._close[n - 1]
+
+    def _equity_curve(self, n, entry_idx, exit_idx, entry_px, amount, fee, pnl):
+        """权益 = 已实现资金 + 持仓浮动盈亏"""
+        realized = np.zeros(n)
+        np.add.at(realized, exit_idx, pnl)
+        equity = self.initial_balance + np.cumsum(realized)
+        for i, j, price, size, trade_fee in zip(entry_idx, exit_idx, entry_px, amount, fee):
+            entry_fee = price * size * self.fee_rate
+            equity[i:j] += (self._close[i:j] - price) * size - entry_fee
+        return equity
+
+
+def load_candles(inst_id=SYMBOL, bar=None, root=None):
+    """从本地K线存储加载回测数据"""
+    from okx_api import TIMEFRAME_MAP
+    bar = bar or TIMEFRAME_MAP[TIMEFRAME]
+    store = CandleStore(root or os.path.join(DATA_DIR, 'candles'))
+    columns = store.read(inst_id, bar)
+    df = pd.DataFrame({name: np.asarray(values) for name, values in columns.items()})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基于本地K线数据回测策略")
+    parser.add_argument('--inst', default=SYMBOL, help="合约ID")
+    parser.add_argument('--bar', default=None, help="K线粒度，如1m、1H")
+    parser.add_argument('--trades', default=None, help="成交列表输出CSV路径")
+    parser.add_argument('--history', action='store_true', help="使用history.py下载的历史K线")
+    args = parser.parse_args()
+
+    from okx_api import TIMEFRAME_MAP
+    bar = args.bar or TIMEFRAME_MAP[TIMEFRAME]
+    if args.history:
+        from history import load_history
+        df = load_history(args.inst, bar)
+    else:
+        df = load_candles(args.inst, bar)
+    result = Backtester(bar=bar).run(df)
+    for key, value in result.summary().items():
+        print(f"{key}: {value}")
+    if args.trades:
+        result.trades.to_csv(args.trades, index=False)
@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore, parse_candles
+from strategy import TradingStrategy
+
+# 策略基准覆盖的K线数量
+SIZES = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+DEFAULT_MAX_BARS = 1_000_000
+
+# 默认基线文件
+BASELINE_FILE = 'benchmark_baseline.json'
+
+# 中位数比基线慢多少（比例）视为性能回退
+REGRESSION_THRESHOLD = 0.15
+
+
+def synthetic_candles(n, seed=7):
+    """随机游走K线，与实盘数据列一致"""
+    rng = np.random.default_rng(seed)
+    close = 96000 + np.cumsum(rng.normal(0, 30, n))
+    spread = rng.uniform(0, 20, n)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2025-05-07', periods=n, freq='min'),
+        'open': close,
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.uniform(1, 100, n),
+        'confirm': '1',
+    })
+
+
+def raw_candle_rows(n, start=1746576000000):
+    """OKX接口格式的原始K线（时间正序，字符串字段）"""
+    df = synthetic_candles(n)
+    return [[str(start + i * 60000), f"{o:.1f}", f"{h:.1f}", f"{l:.1f}", f"{c:.1f}", f"{v:.4f}", '1', '1', '1']
+            for i, (o, h, l, c, v) in enumerate(zip(df['open'], df['high'], df['low'], df['close'], df['volume']))]
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """多次计时：先估算每轮调用次数使单轮耗时不少于min_time/repeat，返回每次调用的耗时统计（秒）"""
+    start = time.perf_counter()
+    func()
+    single = time.perf_counter() - start
+    number = max(1, int(min_time / repeat / max(single, 1e-9)))
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def strategy_benchmarks(max_bars=DEFAULT_MAX_BARS):
+    """(1) 不同数据量下的指标和信号计算"""
+    for n in SIZES:
+        if n > max_bars:
+            break
+        df = synthetic_candles(n)
+        strategy = TradingStrategy()
+        # 大数据量单次调用已足够长，减少重复次数
+        repeat = 5 if n <= 100_000 else 2
+        yield f'strategy.calculate_indicators[{n}]', lambda df=df: strategy.calculate_indicators(df), repeat
+        yield f'strategy.calculate_indicators_numpy[{n}]', lambda df=df: strategy.calculate_indicators_numpy(df), repeat
+        yield f'strategy.generate_signals[{n}]', lambda df=df: strategy.generate_signals(df), repeat
+
+
+def api_benchmarks(api):
+    """(2) 签名及请求开销（本地模拟交易所，排除网络）"""
+    params = {'instId': api.symbol, 'bar': '1m', 'limit': 100}
+    body = {'instId': api.symbol, 'tdMode': 'isolated', 'side': 'buy', 'ordType': 'market', 'sz': '1'}
+    yield 'api.sign', lambda: api._sign(api._get_timestamp(), 'POST', '/api/v5/trade/order', body), 5
+    yield 'api.prepare_request', lambda: api._prepare_request('GET', '/api/v5/market/candles', params=params), 5
+    yield 'api.make_request', lambda: api._make_request('GET', '/api/v5/public/time'), 5
+
+
+def ohlcv_benchmarks(api):
+    """(3) K线解析、写入本地存储和内存缓冲区，以及完整的get_ohlcv"""
+    for n in (100, 300):
+        rows = raw_candle_rows(n)
+        yield f'ohlcv.parse_candles[{n}]', lambda rows=rows: parse_candles(rows), 5
+
+    rows = raw_candle_rows(300)
+    state = {'i': 0}
+
+    def ingest():
+        # 每次写入新的合约，避免去重后变成空操作
+        state['i'] += 1
+        api.ingest_candles('1m', rows, inst_id=f"BENCH-{state['i']}")
+
+    yield 'ohlcv.ingest_candles[300]', ingest, 5
+    api.get_ohlcv()
+    yield 'ohlcv.get_ohlcv[cached]', lambda: api.get_ohlcv(refresh=False), 5
+    yield 'ohlcv.get_ohlcv[refresh]', api.get_ohlcv, 5
+
+
+def tick_benchmarks(bot, loop):
+    """(4) 完整的一轮交易：并发获取K线和账户数据、计算信号、交易决策"""
+    def tick():
+        # 每轮都按新K线处理，计入策略计算
+        bot.last_bar_ts = None
+        loop.run_until_complete(bot.tick_async())
+
+    yield 'bot.tick_async', tick, 5
+
+
+def run(filter=None, max_bars=DEFAULT_MAX_BARS, min_time=0.2):
+    """运行基准测试，返回{名称: 统计}；filter为名称子串"""
+    from exchange_sim import ExchangeServer, SimulatedExchange
+    from main import TradingBot
+    from retry import RetryPolicy
+
+    server = ExchangeServer(SimulatedExchange(seed=1)).start()
+    loop = asyncio.new_event_loop()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            bot = TradingBot()
+            bot.api.set_base_url(server.url)
+            bot.api.candle_store = CandleStore(root)
+            bot.api.retry_policy = RetryPolicy(max_attempts=1)
+            # 交易决策只走到下单前，不向模拟交易所下单
+            bot.execute_trade = lambda *args, **kwargs: False
+
+            groups = (strategy_benchmarks(max_bars), api_benchmarks(bot.api),
+                      ohlcv_benchmarks(bot.api), tick_benchmarks(bot, loop))
+            for group in groups:
+                for name, func, repeat in group:
+                    if filter and filter not in name:
+                        continue
+                    results[name] = measure(func, repeat=repeat, min_time=min_time)
+            loop.run_until_complete(bot.api.async_transport.close())
+    finally:
+        loop.close()
+        server.stop()
+    return results
+
+
+def environment():
+    return {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, ensure_ascii=False)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """按中位数与基线比较，返回[(名称, 基线, 当前, 比值, 状态)]，状态为regression/improved/ok/new"""
+    rows = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, None, stats['median'], None, 'new'))
+            continue
+        ratio = stats['median'] / base['median']
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append((name, base['median'], stats['median'], ratio, status))
+    return rows
+
+
+def _format_time(seconds):
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g}{unit}"
+    return f"{seconds / 1e-9:.3g}ns"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="性能基准测试：策略计算、API客户端、K线解析和完整交易轮次")
+    parser.add_argument('--filter', default=None, help="只运行名称包含该子串的基准")
+    parser.add_argument('--max-bars', type=int, default=DEFAULT_MAX_BARS, help="策略基准的最大K线数量（最大10000000）")
+    parser.add_argument('--min-time', type=float, default=0.2, help="每个基准的最短计时时间（秒）")
+    parser.add_argument('--save', nargs='?', const=BASELINE_FILE, default=None, help="保存结果为基线JSON")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_FILE, default=None, help="与基线JSON比较")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="判定回退的变慢比例")
+    args = parser.parse_args()
+
+    results = run(args.filter, args.max_bars, args.min_time)
+    regressions = []
+    if args.compare:
+        for name, base, current, ratio, status in compare(results, load(args.compare), args.threshold):
+            ratio = f"{ratio:.2f}x" if ratio is not None else '-'
+            print(f"{name:40s} {_format_time(base):>10s} {_format_time(current):>10s} {ratio:>7s}  {status}")
+            if status == 'regression':
+                regressions.append(name)
+    else:
+        for name, stats in results.items():
+            print(f"{name:40s} {_format_time(stats['median']):>10s}  (x{stats['number']})")
+    if args.save:
+        save(results, args.save)
+        print(f"基线已保存: {args.save}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+import pandas as pd
+from candle_store import COLUMNS
+
+
+class CandleBuffer:
+    """单个(instId, bar)的内存K线容器：每列一个预分配的环形缓冲区，追加时不重新分配内存。
+
+    每根K线同时写在位置p和p+capacity，任意最近n根（n≤capacity）在数组中总是连续的，
+    因此只含已确认K线的view()/frame()返回零拷贝视图，在之后的capacity-n次追加内不会被覆盖；
+    未确认K线写在最新一根之后的槽位并被推送原地更新，包含它的视图返回副本。
+    写入与取视图共用一把锁，推送线程写入时读取方不会看到写了一半的数据。"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        size = 2 * capacity + 1
+        self._data = {name: np.zeros(size, dtype=dtype) for name, dtype in COLUMNS}
+        self._confirm = np.full(size, '1', dtype='<U1')
+        self.total = 0
+        self._end = capacity
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def last_timestamp(self):
+        """最后一根已确认K线的时间戳（毫秒），无数据时返回None"""
+        return int(self._data['timestamp'][self._end - 1]) if self.total else None
+
+    def append(self, columns):
+        """追加已确认K线（各列数组，时间正序），不晚于已有数据的行会被忽略，返回追加数量"""
+        with self._lock:
+            return self._append(columns)
+
+    def _append(self, columns):
+        timestamps = np.asarray(columns['timestamp'])
+        start = 0
+        if self.total:
+            start = int(np.searchsorted(timestamps, self.last_timestamp, side='right'))
+        count = len(timestamps) - start
+        if count <= 0:
+            return 0
+        # 超过容量时只保留最新的capacity根
+        skip = max(count - self.capacity, 0)
+        positions = (self.total + skip + np.arange(count - skip)) % self.capacity
+        for name, _ in COLUMNS:
+            values = np.asarray(columns[name])[start + skip:]
+            self._data[name][positions] = values
+            self._data[name][positions + self.capacity] = values
+        self._confirm[positions + self.capacity] = '1'
+        self.total += count
+        self._end = (self.total - 1) % self.capacity + self.capacity + 1
+        if self._pending is not None:
+            self._write_pending()
+        return count
+
+    def set_pending(self, values):
+        """更新未确认K线，values为各列的数值"""
+        with self._lock:
+            self._pending = values
+            self._write_pending()
+
+    def _write_pending(self):
+        if self.total and self._pending['timestamp'] <= self.last_timestamp:
+            # 该K线已确认
+            self._pending = None
+            return
+        for name, _ in COLUMNS:
+            self._data[name][self._end] = self._pending[name]
+        self._confirm[self._end] = '0'
+
+    def view(self, limit=None, pending=True):
+        """最近limit根已确认K线的各列只读视图；包含未确认K线时返回各列的副本"""
+        with self._lock:
+            count = len(self) if limit is None else min(limit, len(self))
+            start = self._end - count
+            copy = pending and self._pending is not None
+            end = self._end + (1 if copy else 0)
+            columns = {name: self._data[name][start:end] for name, _ in COLUMNS}
+            columns['confirm'] = self._confirm[start:end]
+            if copy:
+                columns = {name: values.copy() for name, values in columns.items()}
+        for values in columns.values():
+            values.flags.writeable = False
+        return columns
+
+    def frame(self, limit=None, pending=True):
+        """兼容原接口的DataFrame：数值列直接引用view()返回的数组，timestamp以毫秒精度的datetime64视图呈现"""
+        columns = self.view(limit, pending)
+        columns['timestamp'] = columns['timestamp'].view('datetime64[ms]')
+        return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,114 @@
+import os
+import threading
+import numpy as np
+
+# 列名与数据类型，每列单独存一个定长二进制文件，便于追加和内存映射
+COLUMNS = (
+    ('timestamp', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+    ('volCcy', np.float64),
+    ('volCcyQuote', np.float64),
+)
+
+
+def parse_candles(rows):
+    """把OKX原始K线（字符串数组）一次性解析为各列数组，返回(列字典, confirm数组)"""
+    if not len(rows):
+        return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}, np.empty(0, dtype='<U1')
+    data = np.array([row[:len(COLUMNS) + 1] for row in rows])
+    columns = {name: data[:, i].astype(dtype) for i, (name, dtype) in enumerate(COLUMNS)}
+    return columns, data[:, len(COLUMNS)].astype('<U1')
+
+
+class CandleStore:
+    """按(instId, bar)分目录的列式K线存储，只追加已确认K线，读取时使用内存映射；
+    追加与读取（读取时可能截断残缺的尾部）在同一把锁内进行，可被多个线程同时使用"""
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._lock = threading.RLock()
+
+    def _dir(self, inst_id, bar):
+        return os.path.join(self.root, f"{inst_id}_{bar}")
+
+    def _path(self, inst_id, bar, name):
+        return os.path.join(self._dir(inst_id, bar), f"{name}.bin")
+
+    def length(self, inst_id, bar):
+        """已存储的K线数量（以最短的列为准，防止写入中断导致列长度不一致）"""
+        lengths = []
+        for name, dtype in COLUMNS:
+            path = self._path(inst_id, bar, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths.append(size // np.dtype(dtype).itemsize)
+        return min(lengths)
+
+    def _repair(self, inst_id, bar, length):
+        """截断多写的尾部数据，使所有列长度一致"""
+        for name, dtype in COLUMNS:
+            path = self._path(inst_id, bar, name)
+            if os.path.exists(path):
+                expected = length * np.dtype(dtype).itemsize
+                if os.path.getsize(path) != expected:
+                    with open(path, 'r+b') as f:
+                        f.truncate(expected)
+
+    def _columns(self, inst_id, bar):
+        """返回各列的内存映射视图，数据长度变化后才重新映射"""
+        key = (inst_id, bar)
+        with self._lock:
+            length = self.length(inst_id, bar)
+            cached = self._maps.get(key)
+            if cached is not None and cached[0] == length:
+                return cached[1]
+
+            self._repair(inst_id, bar, length)
+            columns = {}
+            for name, dtype in COLUMNS:
+                if length:
+                    columns[name] = np.memmap(self._path(inst_id, bar, name), dtype=dtype, mode='r', shape=(length,))
+                else:
+                    columns[name] = np.empty(0, dtype=dtype)
+            self._maps[key] = (length, columns)
+            return columns
+
+    def last_timestamp(self, inst_id, bar):
+        """最后一根已存储K线的时间戳（毫秒），无数据时返回None"""
+        ts = self._columns(inst_id, bar)['timestamp']
+        return int(ts[-1]) if len(ts) else None
+
+    def append(self, inst_id, bar, rows):
+        """追加已确认K线，rows为按时间正序排列的OKX原始K线数组，早于已有数据的行会被忽略"""
+        return self.append_columns(inst_id, bar, parse_candles(rows)[0])
+
+    def append_columns(self, inst_id, bar, columns):
+        """追加已解析的已确认K线（各列数组，时间正序），早于已有数据的行会被忽略"""
+        timestamps = columns['timestamp']
+        with self._lock:
+            last_ts = self.last_timestamp(inst_id, bar)
+            if last_ts is not None and len(timestamps):
+                keep = timestamps > last_ts
+                if not keep.all():
+                    columns = {name: values[keep] for name, values in columns.items()}
+            count = len(columns['timestamp'])
+            if not count:
+                return 0
+
+            os.makedirs(self._dir(inst_id, bar), exist_ok=True)
+            for name, dtype in COLUMNS:
+                values = np.ascontiguousarray(columns[name], dtype=dtype)
+                with open(self._path(inst_id, bar, name), 'ab') as f:
+                    f.write(values.tobytes())
+            return count
+
+    def read(self, inst_id, bar, limit=None):
+        """读取最近limit根K线，返回各列的只读视图"""
+        columns = self._columns(inst_id, bar)
+        if limit is None:
+            return dict(columns)
+        return {name: values[-limit:] for name, values in columns.items()}
@@ -9,11 +9,91 @@ API_KEY = os.getenv('OKX_API_KEY')
 SECRET_KEY = os.getenv('OKX_SECRET_KEY')
 PASSPHRASE = os.getenv('OKX_PASSPHRASE')
 
+# REST地址，可指向本地模拟交易所（exchange_sim.py）
+OKX_REST_URL = os.getenv('OKX_REST_URL', 'https://www.okx.com')
+
+# 本地数据目录（K线存储等）
+DATA_DIR = os.getenv('OKX_DATA_DIR', 'data')
+
+# 历史K线批量下载
+HISTORY_DIR = os.path.join(DATA_DIR, 'history')  # 按时间分区的历史K线目录
+HISTORY_RATE_LIMIT = 20   # history-candles 限速：每个窗口的请求数
+HISTORY_RATE_WINDOW = 2   # 限速窗口（秒）
+HISTORY_CONCURRENCY = 8   # 同时下载的分区数
+
+# 启动元数据缓存
+METADATA_CACHE_FILE = os.path.join(DATA_DIR, 'metadata_cache.json')  # 合约信息、杠杆设置、账户模式校验结果的本地缓存，为空时只缓存在内存
+METADATA_CACHE_TTL = 6 * 3600  # 元数据缓存有效期（秒）
+
 # 交易配置
 SYMBOL = 'BTC-USDT-SWAP'  # 交易对，添加-SWAP后缀表示永续合约
+SYMBOLS = [SYMBOL]   # 多合约模式交易的合约列表
 TIMEFRAME = '1m'     # 时间周期
 LEVERAGE = 3         # 杠杆倍数
 POSITION_SIZE = 0.05  # 仓位大小（占总资金的百分比）
+CANDLE_BUFFER_SIZE = 1000  # 每个合约在内存中保留的K线数量
+USE_WEBSOCKET = True  # 使用WebSocket推送行情，替代REST轮询
+ASYNC_RUN = True      # 使用asyncio运行模式，每轮并发获取数据
+USE_PRIVATE_WEBSOCKET = True       # 通过私有频道推送维护余额、持仓和订单，替代每轮REST查询
+ACCOUNT_RECONCILE_INTERVAL = 300   # 账户推送缓存用REST校准的间隔（秒）
+
+# 订单管理
+CLIENT_ORDER_PREFIX = 'bot'        # 客户端订单ID（clOrdId）前缀，其余部分由交易意图确定性生成
+ORDER_INDEX_SIZE = 1000            # 内存订单表保留的已结束订单数量
+ORDER_RECONCILE_INTERVAL = 60      # 有未结束订单时与orders-pending对账的间隔（秒）
+
+# 交易日志
+JOURNAL_DIR = os.path.join(DATA_DIR, 'journal')  # 预写日志与快照目录，为None时不记录
+JOURNAL_FSYNC_INTERVAL = 1.0       # 批量fsync的最长间隔（秒）
+JOURNAL_FSYNC_BATCH = 64           # 累计多少条记录后fsync
+JOURNAL_SNAPSHOT_INTERVAL = 1000   # 每多少条记录写一次快照并切换日志段，限制启动时的重放量
+
+# K线收盘调度
+CLOCK_SYNC_INTERVAL = 600  # 用交易所服务器时间校准本地时钟的间隔（秒）
+BAR_CLOSE_DELAY = 0.5      # K线收盘后延迟多久唤醒（秒），等待交易所生成确认数据
+BAR_CONFIRM_POLL = 1       # 收盘后K线仍未确认时的重试间隔（秒）
+BAR_CONFIRM_TIMEOUT = 15   # 收盘后最多等待确认的时间（秒）
+
+# 多周期
+RESAMPLE_TIMEFRAMES = ['5m', '15m', '1H', '4H', '1D']  # 由基础K线在本地增量合成的更高周期，不额外请求
+RESAMPLE_BUFFER_SIZE = 500  # 每个合成周期在内存中保留的K线数量
+RESAMPLE_WARMUP_BARS = 100  # 启动时用本地存储的基础K线预热最长周期的K线数量
+TREND_TIMEFRAMES = []       # 信号方向须与这些周期的趋势一致（如['15m', '1H']），空列表不过滤
+
+# 订单簿
+ORDER_BOOK_CHANNEL = 'books'  # 订单簿频道：'books'为400档增量推送（带校验和），'books5'为5档快照，None为不订阅
+
+# 多合约模式
+STRATEGY_WORKERS = os.cpu_count() or 1  # 策略计算进程数
+SYMBOL_TIMEFRAMES = {}                  # 按合约覆盖时间周期，如{'ETH-USDT-SWAP': '5m'}，未列出的使用TIMEFRAME
+ORDER_RATE_LIMIT = 60                   # 下单限速：每个窗口内最多请求数
+ORDER_RATE_WINDOW = 2                   # 下单限速窗口（秒）
+ORDER_WORKERS = 4                       # 执行网关并发下单线程数
+MARKET_RATE_LIMIT = 40                  # K线REST限速：每个窗口内最多请求数
+MARKET_RATE_WINDOW = 2                  # K线REST限速窗口（秒）
+
+# 请求重试与熔断
+RETRY_MAX_ATTEMPTS = 5         # 单次调用最多尝试次数
+RETRY_BASE_DELAY = 0.5         # 指数退避的初始等待（秒）
+RETRY_MAX_DELAY = 8            # 单次退避的最长等待（秒）
+REQUEST_DEADLINE = 20          # 单次调用（含重试）的最长耗时（秒）
+CIRCUIT_FAILURE_THRESHOLD = 5  # 接口连续失败多少次后熔断
+CIRCUIT_RESET_TIMEOUT = 30     # 熔断后多久放行试探请求（秒）
+TICK_BUDGET = 50               # 每轮交易循环的耗时上限（秒），小于循环周期
+
+# 日志
+LOG_FILE = 'trading_bot.log'                       # 日志文件（JSON Lines），为空时只输出到控制台
+LOG_LEVEL = os.getenv('OKX_LOG_LEVEL', 'INFO')     # 日志级别
+LOG_QUEUE_SIZE = 10000                             # 日志队列长度，队列满时丢弃新日志而不阻塞
+LOG_MAX_BYTES = 20 * 1024 * 1024                   # 按大小轮转：单个日志文件上限（字节）
+LOG_BACKUP_COUNT = 5                               # 保留的历史日志文件数
+LOG_ROTATE_WHEN = None                             # 按时间轮转，如'midnight'；为None时按大小轮转
+LOG_SAMPLE_INTERVAL = 60                           # 高频日志采样：同一事件在该间隔内只记录一次（秒）
+
+# 性能指标
+METRICS_HOST = '127.0.0.1'                           # 指标端点监听地址
+METRICS_PORT = int(os.getenv('OKX_METRICS_PORT', 9108))  # 指标端点端口，0为不启动
+METRICS_SUMMARY_INTERVAL = 300                       # 指标汇总写入日志的间隔（秒）
 
 # 策略参数
 RSI_PERIOD = 9
@@ -22,8 +102,19 @@ RSI_OVERSOLD = 25
 MA_PERIOD = 10
 MA_FAST = 5
 MA_SLOW = 20
+INDICATOR_BACKEND = 'pandas'   # 批量指标计算后端：'pandas'，或'numpy'（分块单遍内核，适合大数据量）
+INDICATOR_CHUNK_SIZE = 1 << 16  # numpy后端每块处理的K线数量
 
 # 风险管理
 STOP_LOSS_PERCENT = 0.01
 TAKE_PROFIT_PERCENT = 0.02
-MAX_DAILY_TRADES = 500 
\ No newline at end of file
+MAX_DAILY_TRADES = 500
+PRICE_JUMP_LIMIT = 0.05     # 最新价相对上次风控检查的最大波动，超过则拒绝下单，None为不检查
+MAX_ORDER_NOTIONAL = None   # 单笔订单名义价值上限（USDT），None为不限
+MAX_SYMBOL_EXPOSURE = None  # 下单后单合约持仓名义价值上限（USDT），None为不限
+MAX_LEVERAGE = LEVERAGE     # 下单后全部持仓名义价值相对权益的上限倍数，None为不限
+MAX_SLIPPAGE = 0.002  # 按订单簿估算的最大可接受滑点（成交均价相对最优价），超过则放弃下单
+
+# 回测
+BACKTEST_INITIAL_BALANCE = 5000  # 初始资金（USDT）
+BACKTEST_FEE_RATE = 0.0005       # 手续费率（吃单）
@@ -0,0 +1,513 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+from scheduler import bar_period, next_bar_close
+
+# 未指定时各合约的基准价格
+BASE_PRICES = {'BTC-USDT-SWAP': 96000.0, 'ETH-USDT-SWAP': 3300.0, 'SOL-USDT-SWAP': 150.0}
+
+# 默认注入的故障：HTTP状态码（int）或OKX错误码（str）
+DEFAULT_FAULTS = (503, '50001', '50011')
+
+# 订单错误码
+ORDER_NOT_FOUND = '51603'
+DUPLICATE_CLORDID = '51016'
+CANCEL_FAILED = '51400'
+INVALID_PARAM = '51000'
+
+# /api/v5/market/candles 单次最多返回的K线数量
+MAX_CANDLES = 300
+# history-candles 单次最多返回的K线数量
+MAX_HISTORY_CANDLES = 100
+
+
+def _fmt(value):
+    return f"{value:.8f}".rstrip('0').rstrip('.')
+
+
+class SimulatedExchange:
+    """本地模拟交易所：确定性的行情、净持仓账户和简单撮合引擎。
+
+    行情价格是时间的确定函数（也可用set_price手动指定）；市价单按最新价成交，
+    限价单可成交时立即成交，否则挂单，价格变化时撮合；成交后按附带的slTriggerPx/tpTriggerPx
+    生成止损止盈单，触发其一后另一个撤销。盈亏按1张=1个标的计算，不计保证金。
+    所有方法线程安全。"""
+
+    def __init__(self, balance=10000.0, fee_rate=0.0005, prices=None, latency=0, error_rate=0,
+                 faults=DEFAULT_FAULTS, acct_lv='2', seed=None):
+        self._lock = threading.Lock()
+        self.fee_rate = fee_rate
+        self.base_prices = dict(BASE_PRICES, **(prices or {}))
+        self.latency = latency
+        self.error_rate = error_rate
+        self.faults = faults
+        self.acct_lv = acct_lv
+        self._random = random.Random(seed)
+        self._fail_next = []
+        self._manual_prices = {}
+        self._ids = itertools.count(1)
+        self.balance = {'available': float(balance), 'frozen': 0.0}
+        self.positions = {}
+        self.leverage = {}
+        self.orders = {}
+        self._cl_ord_ids = {}
+        self.algos = {}
+        self.fills = []
+        self.requests = Counter()
+
+    # ---- 行情 ----
+
+    def price_at(self, inst_id, t):
+        """t时刻（秒）的行情价格：不同周期的正弦波叠加"""
+        base = self.base_prices.get(inst_id, 100.0)
+        return base * (1 + 0.02 * math.sin(2 * math.pi * t / 86400)
+                       + 0.01 * math.sin(2 * math.pi * t / 7200)
+                       + 0.003 * math.sin(2 * math.pi * t / 600))
+
+    def last_price(self, inst_id):
+        price = self._manual_prices.get(inst_id)
+        return price if price is not None else self.price_at(inst_id, time.time())
+
+    def set_price(self, inst_id, price):
+        """手动指定最新价，并立即撮合挂单和触发止损止盈；price为None时恢复为时间函数"""
+        with self._lock:
+            if price is None:
+                self._manual_prices.pop(inst_id, None)
+            else:
+                self._manual_prices[inst_id] = float(price)
+            self._match(inst_id)
+
+    def ticker(self, inst_id):
+        last = self.last_price(inst_id)
+        return {'instId': inst_id, 'last': _fmt(last), 'bidPx': _fmt(last * 0.9999), 'askPx': _fmt(last * 1.0001),
+                'ts': str(int(time.time() * 1000))}
+
+    def instrument(self, inst_id):
+        """合约信息：固定面值和精度"""
+        return {'instId': inst_id, 'instType': 'SWAP', 'ctVal': '1', 'ctValCcy': inst_id.split('-')[0],
+                'settleCcy': 'USDT', 'lotSz': '0.0001', 'minSz': '0.0001', 'tickSz': '0.1', 'state': 'live'}
+
+    def candles(self, inst_id, bar, limit=100, before=None, after=None):
+        """时间倒序的K线，最新一根未确认；before/after为时间戳（毫秒），只返回更新/更早的K线"""
+        now = time.time()
+        period = bar_period(bar) or 30 * 86400
+        newest = next_bar_close(bar, now) - period
+        if after is not None:
+            newest = min(newest, (int(after) // 1000) - period)
+        rows = []
+        ts = newest
+        while len(rows) < min(int(limit), MAX_CANDLES):
+            if before is not None and ts * 1000 <= int(before):
+                break
+            confirmed = ts + period <= now
+            open_ = self.price_at(inst_id, ts)
+            close = self.price_at(inst_id, ts + period if confirmed else now)
+            rows.append([str(int(ts * 1000)), _fmt(open_), _fmt(max(open_, close) * 1.0005),
+                         _fmt(min(open_, close) * 0.9995), _fmt(close), '100', '1', _fmt(100 * close),
+                         '1' if confirmed else '0'])
+            ts -= period
+        return rows
+
+    # ---- 故障注入 ----
+
+    def fail_next(self, *faults):
+        """接下来的请求依次返回指定故障（HTTP状态码或OKX错误码）"""
+        with self._lock:
+            self._fail_next.extend(faults)
+
+    def delay(self):
+        """本次请求的模拟延迟（秒），latency可以是固定值或(最小, 最大)"""
+        if isinstance(self.latency, (tuple, list)):
+            return self._random.uniform(*self.latency)
+        return self.latency
+
+    def record_request(self, path):
+        """按路径累计请求次数（各请求处理线程并发调用）"""
+        with self._lock:
+            self.requests[path] += 1
+
+    def fault(self):
+        """本次请求是否注入故障，返回故障或None"""
+        with self._lock:
+            if self._fail_next:
+                return self._fail_next.pop(0)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self._random.choice(self.faults)
+        return None
+
+    # ---- 账户 ----
+
+    def get_balance(self):
+        with self._lock:
+            return [{'totalEq': _fmt(self.balance['available'] + self.balance['frozen']), 'details': [{
+                'ccy': 'USDT', 'availBal': _fmt(self.balance['available']),
+                'frozenBal': _fmt(self.balance['frozen']), 'eq': _fmt(self.balance['available'] + self.balance['frozen']),
+            }]}]
+
+    def get_positions(self, inst_id=None):
+        with self._lock:
+            return [self._position_data(i, p) for i, p in self.positions.items()
+                    if p['pos'] != 0 and (inst_id is None or i == inst_id)]
+
+    def _position_data(self, inst_id, position):
+        last = self.last_price(inst_id)
+        return {'instId': inst_id, 'instType': 'SWAP', 'posSide': 'net', 'mgnMode': 'isolated',
+                'pos': _fmt(position['pos']), 'avgPx': _fmt(position['avgPx']), 'last': _fmt(last),
+                'upl': _fmt((last - position['avgPx']) * position['pos']),
+                'lever': self.leverage.get(inst_id, '1')}
+
+    def set_leverage(self, body):
+        with self._lock:
+            self.leverage[body['instId']] = body['lever']
+        return [{'instId': body['instId'], 'lever': body['lever'], 'mgnMode': body.get('mgnMode', 'cross')}]
+
+    def account_config(self):
+        return [{'acctLv': self.acct_lv, 'posMode': 'net_mode'}]
+
+    # ---- 订单 ----
+
+    def place_order(self, body):
+        """下单，返回逐笔结果{ordId, clOrdId, sCode, sMsg}"""
+        with self._lock:
+            cl_ord_id = body.get('clOrdId', '')
+            try:
+                side = body['side']
+                sz = float(body['sz'])
+                ord_type = body.get('ordType', 'market')
+                px = float(body['px']) if ord_type != 'market' else None
+            except (KeyError, ValueError):
+                return self._result('', cl_ord_id, INVALID_PARAM, '参数错误')
+            if side not in ('buy', 'sell') or sz <= 0:
+                return self._result('', cl_ord_id, INVALID_PARAM, '参数错误')
+            if cl_ord_id and cl_ord_id in self._cl_ord_ids:
+                return self._result('', cl_ord_id, DUPLICATE_CLORDID, 'clOrdId重复')
+
+            order = {
+                'ordId': str(next(self._ids)), 'clOrdId': cl_ord_id, 'instId': body['instId'], 'side': side,
+                'ordType': ord_type, 'px': body.get('px', ''), 'sz': body['sz'], 'state': 'live',
+                'accFillSz': '0', 'avgPx': '', 'cTime': str(int(time.time() * 1000)),
+            }
+            for field in ('slTriggerPx', 'slOrdPx', 'tpTriggerPx', 'tpOrdPx'):
+                if body.get(field):
+                    order[field] = body[field]
+            self.orders[order['ordId']] = order
+            if cl_ord_id:
+                self._cl_ord_ids[cl_ord_id] = order['ordId']
+            self._try_fill(order, self.last_price(order['instId']), px)
+            return self._result(order['ordId'], cl_ord_id)
+
+    def cancel_order(self, body):
+        with self._lock:
+            order = self._lookup(body)
+            if order is None or order['state'] != 'live':
+                code = ORDER_NOT_FOUND if order is None else CANCEL_FAILED
+                return self._result(body.get('ordId', ''), body.get('clOrdId', ''), code, '撤单失败')
+            order['state'] = 'canceled'
+            return self._result(order['ordId'], order['clOrdId'])
+
+    def amend_order(self, body):
+        with self._lock:
+            order = self._lookup(body)
+            if order is None or order['state'] != 'live':
+                return self._result(body.get('ordId', ''), body.get('clOrdId', ''), ORDER_NOT_FOUND, '改单失败')
+            if body.get('newSz'):
+                order['sz'] = body['newSz']
+            if body.get('newPx'):
+                order['px'] = body['newPx']
+            self._try_fill(order, self.last_price(order['instId']), float(order['px']) if order['px'] else None)
+            return self._result(order['ordId'], order['clOrdId'])
+
+    def get_order(self, params):
+        with self._lock:
+            order = self._lookup(params)
+            return dict(order) if order is not None else None
+
+    def pending_orders(self, inst_id=None):
+        with self._lock:
+            for inst in {o['instId'] for o in self.orders.values() if o['state'] == 'live'}:
+                self._match(inst)
+            return [dict(o) for o in self.orders.values()
+                    if o['state'] == 'live' and (inst_id is None or o['instId'] == inst_id)]
+
+    def _lookup(self, params):
+        if params.get('ordId'):
+            return self.orders.get(params['ordId'])
+        ord_id = self._cl_ord_ids.get(params.get('clOrdId'))
+        return self.orders.get(ord_id) if ord_id is not None else None
+
+    @staticmethod
+    def _result(ord_id, cl_ord_id, code='0', msg=''):
+        return {'ordId': ord_id, 'clOrdId': cl_ord_id, 'sCode': code, 'sMsg': msg}
+
+    # ---- 撮合 ----
+
+    def match(self, inst_id=None):
+        """按当前价格撮合挂单并检查止损止盈（默认全部合约）"""
+        with self._lock:
+            insts = {o['instId'] for o in self.orders.values() if o['state'] == 'live'} | {
+                a['instId'] for a in self.algos.values()}
+            for inst in insts if inst_id is None else [inst_id]:
+                self._match(inst)
+
+    def _match(self, inst_id):
+        last = self.last_price(inst_id)
+        for order in list(self.orders.values()):
+            if order['instId'] == inst_id and order['state'] == 'live':
+                self._try_fill(order, last, float(order['px']) if order['px'] else None)
+        for algo_id, algo in list(self.algos.items()):
+            if algo['instId'] != inst_id:
+                continue
+            # 平多方向：价格跌破止损或涨过止盈；平空方向相反
+            up = algo['side'] == 'sell'
+            for kind in ('sl', 'tp'):
+                trigger = algo.get(kind + 'TriggerPx')
+                if trigger is None:
+                    continue
+                hit = (last <= trigger) if (kind == 'sl') == up else (last >= trigger)
+                if hit:
+                    del self.algos[algo_id]
+                    self._fire(algo, kind, last)
+                    break
+
+    def _fire(self, algo, kind, last):
+        ord_px = algo[kind + 'OrdPx']
+        order = {
+            'ordId': str(next(self._ids)), 'clOrdId': '', 'instId': algo['instId'], 'side': algo['side'],
+            'ordType': 'market' if ord_px == '-1' else 'limit', 'px': '' if ord_px == '-1' else ord_px,
+            'sz': _fmt(algo['sz']), 'state': 'live', 'accFillSz': '0', 'avgPx': '',
+            'cTime': str(int(time.time() * 1000)), 'algoId': algo['algoId'], 'source': kind,
+        }
+        self.orders[order['ordId']] = order
+        self._try_fill(order, last, None if ord_px == '-1' else float(ord_px))
+
+    def _try_fill(self, order, last, px):
+        """市价单按最新价成交；限价买单在最新价不高于委托价时成交，卖单相反"""
+        if px is not None and (last > px if order['side'] == 'buy' else last < px):
+            return
+        sz = float(order['sz'])
+        self._fill(order['instId'], order['side'], sz, last)
+        order.update({'state': 'filled', 'accFillSz': order['sz'], 'avgPx': _fmt(last),
+                      'fillTime': str(int(time.time() * 1000))})
+        self.fills.append(dict(order))
+        if 'slTriggerPx' in order or 'tpTriggerPx' in order:
+            algo_id = str(next(self._ids))
+            algo = {'algoId': algo_id, 'instId': order['instId'], 'side': 'sell' if order['side'] == 'buy' else 'buy',
+                    'sz': sz}
+            for kind in ('sl', 'tp'):
+                if order.get(kind + 'TriggerPx'):
+                    algo[kind + 'TriggerPx'] = float(order[kind + 'TriggerPx'])
+                    algo[kind + 'OrdPx'] = order.get(kind + 'OrdPx', '-1')
+            self.algos[algo_id] = algo
+            order['algoId'] = algo_id
+
+    def _fill(self, inst_id, side, sz, price):
+        """更新净持仓和余额：同向加仓更新均价，反向减仓结算盈亏"""
+        position = self.positions.setdefault(inst_id, {'pos': 0.0, 'avgPx': 0.0})
+        signed = sz if side == 'buy' else -sz
+        pos = position['pos']
+        if pos == 0 or (pos > 0) == (signed > 0):
+            total = abs(pos) + sz
+            position['avgPx'] = (abs(pos) * position['avgPx'] + sz * price) / total
+        else:
+            closed = min(abs(pos), sz)
+            self.balance['available'] += closed * (price - position['avgPx']) * (1 if pos > 0 else -1)
+            if sz > abs(pos):
+                position['avgPx'] = price
+        position['pos'] = pos + signed
+        if abs(position['pos']) < 1e-12:
+            position['pos'] = 0.0
+        self.balance['available'] -= sz * price * self.fee_rate
+
+
+class ExchangeHandler(BaseHTTPRequestHandler):
+    """把OKX REST路径映射到SimulatedExchange，响应格式与OKX一致"""
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次写出，关闭Nagle算法避免与客户端延迟确认叠加产生40ms停顿
+    disable_nagle_algorithm = True
+
+    def _handle(self):
+        exchange = self.server.exchange
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length).decode('utf-8') if length else ''
+        split = urlsplit(self.path)
+        path = split.path
+        params = dict(parse_qsl(split.query))
+        exchange.record_request(path)
+
+        delay = exchange.delay()
+        if delay:
+            time.sleep(delay)
+        if path == '/':
+            return self._send(200, {'code': '0', 'msg': '', 'data': []})
+        if self.server.secret is not None and not self._signed(raw):
+            return self._send(401, {'code': '50113', 'msg': 'Invalid Sign', 'data': []})
+        fault = exchange.fault()
+        if isinstance(fault, int):
+            # 网关错误，响应体不是OKX格式
+            return self._send(fault, None)
+        if fault is not None:
+            return self._send(200, {'code': fault, 'msg': 'injected', 'data': []})
+
+        route = self.server.routes.get((self.command, path))
+        if route is None:
+            return self._send(404, {'code': '404', 'msg': f'unknown path {path}', 'data': []})
+        try:
+            body = json.loads(raw) if raw else {}
+            self._send(200, route(exchange, params, body))
+        except Exception as e:
+            self._send(200, {'code': INVALID_PARAM, 'msg': str(e), 'data': []})
+
+    def _signed(self, raw):
+        message = f"{self.headers.get('OK-ACCESS-TIMESTAMP', '')}{self.command}{self.path}{raw}"
+        expected = base64.b64encode(hmac.new(self.server.secret.encode(), message.encode(), hashlib.sha256).digest())
+        return hmac.compare_digest(expected.decode(), self.headers.get('OK-ACCESS-SIGN', ''))
+
+    def _send(self, status, result):
+        if result is None:
+            payload, content_type = b'injected fault', 'text/plain'
+        else:
+            payload, content_type = json.dumps(result).encode('utf-8'), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _ok(data):
+    return {'code': '0', 'msg': '', 'data': data}
+
+
+def _order_response(results):
+    """单笔下单/撤单：失败时与OKX一致返回code=1，错误码在sCode中"""
+    failed = [r for r in results if r['sCode'] != '0']
+    if not failed:
+        return _ok(results)
+    code = '1' if len(failed) == len(results) else '2'
+    return {'code': code, 'msg': 'Operation failed' if code == '1' else 'Partially successful', 'data': results}
+
+
+def _get_order(exchange, params, body):
+    order = exchange.get_order(params)
+    if order is None:
+        return {'code': ORDER_NOT_FOUND, 'msg': 'Order does not exist', 'data': []}
+    return _ok([order])
+
+
+ROUTES = {
+    ('GET', '/api/v5/public/time'): lambda ex, p, b: _ok([{'ts': str(int(time.time() * 1000))}]),
+    ('GET', '/api/v5/public/instruments'): lambda ex, p, b: _ok([ex.instrument(p['instId'])]),
+    ('GET', '/api/v5/market/ticker'): lambda ex, p, b: _ok([ex.ticker(p['instId'])]),
+    ('GET', '/api/v5/market/candles'): lambda ex, p, b: _ok(ex.candles(
+        p['instId'], p.get('bar', '1m'), p.get('limit', 100), p.get('before'), p.get('after'))),
+    ('GET', '/api/v5/market/history-candles'): lambda ex, p, b: _ok(ex.candles(
+        p['instId'], p.get('bar', '1m'), min(int(p.get('limit', 100)), MAX_HISTORY_CANDLES),
+        p.get('before'), p.get('after'))),
+    ('GET', '/api/v5/account/balance'): lambda ex, p, b: _ok(ex.get_balance()),
+    ('GET', '/api/v5/account/positions'): lambda ex, p, b: _ok(ex.get_positions(p.get('instId'))),
+    ('GET', '/api/v5/account/config'): lambda ex, p, b: _ok(ex.account_config()),
+    ('POST', '/api/v5/account/set-leverage'): lambda ex, p, b: _ok(ex.set_leverage(b)),
+    ('POST', '/api/v5/trade/order'): lambda ex, p, b: _order_response([ex.place_order(b)]),
+    ('GET', '/api/v5/trade/order'): _get_order,
+    ('POST', '/api/v5/trade/amend-order'): lambda ex, p, b: _order_response([ex.amend_order(b)]),
+    ('POST', '/api/v5/trade/cancel-order'): lambda ex, p, b: _order_response([ex.cancel_order(b)]),
+    ('GET', '/api/v5/trade/orders-pending'): lambda ex, p, b: _ok(ex.pending_orders(p.get('instId'))),
+    ('POST', '/api/v5/trade/batch-orders'): lambda ex, p, b: _order_response([ex.place_order(o) for o in b]),
+    ('POST', '/api/v5/trade/cancel-batch-orders'): lambda ex, p, b: _order_response([ex.cancel_order(o) for o in b]),
+    ('POST', '/api/v5/trade/amend-batch-orders'): lambda ex, p, b: _order_response([ex.amend_order(o) for o in b]),
+}
+
+
+class ExchangeServer:
+    """在本地端口上提供模拟交易所的REST接口；secret不为None时按OKX规则校验签名"""
+
+    def __init__(self, exchange=None, host='127.0.0.1', port=0, secret=None):
+        self.exchange = exchange or SimulatedExchange()
+        self._server = ThreadingHTTPServer((host, port), ExchangeHandler)
+        self._server.daemon_threads = True
+        self._server.exchange = self.exchange
+        self._server.secret = secret
+        self._server.routes = ROUTES
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='exchange-sim', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(5)
+
+
+async def load_test(api, requests=10000, concurrency=100, endpoint='/api/v5/market/ticker'):
+    """用OKXAPI的异步传输并发压测，返回(每秒请求数, 失败数)"""
+    failures = 0
+    params = {'instId': api.symbol}
+
+    async def worker(count):
+        nonlocal failures
+        for _ in range(count):
+            try:
+                await api._make_request_async('GET', endpoint, params=params)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    share, extra = divmod(requests, concurrency)
+    await asyncio.gather(*(worker(share + (1 if i < extra else 0)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await api.async_transport.close()
+    return requests / elapsed, failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='本地模拟OKX交易所')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的延迟（秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='注入故障的概率')
+    parser.add_argument('--load', type=int, default=0, help='启动后用OKXAPI压测的请求数，0为只提供服务')
+    parser.add_argument('--concurrency', type=int, default=100)
+    args = parser.parse_args()
+
+    server = ExchangeServer(SimulatedExchange(latency=args.latency, error_rate=args.error_rate),
+                            host=args.host, port=args.port).start()
+    print(f"模拟交易所已启动: {server.url}")
+    try:
+        if args.load:
+            from okx_api import OKXAPI
+            api = OKXAPI()
+            api.set_base_url(server.url)
+            rate, failures = asyncio.run(load_test(api, args.load, args.concurrency))
+            print(f"{args.load} 个请求，{rate:.0f} 请求/秒，失败 {failures}")
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
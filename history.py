@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from candle_store import COLUMNS, parse_candles
+from rate_limit import RateLimiter
+from scheduler import bar_period
+from config import HISTORY_DIR, HISTORY_RATE_LIMIT, HISTORY_RATE_WINDOW, HISTORY_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# /api/v5/market/history-candles 单次最多返回的K线数量
+HISTORY_PAGE_LIMIT = 100
+
+# 小时线以下按UTC日分区，其余按月分区
+DAY_PARTITION_MAX_PERIOD = 3600
+
+PARTIAL_SUFFIX = '.partial.npz'
+
+
+def _ms(dt):
+    return int(dt.timestamp() * 1000)
+
+
+def partitions(bar, start_ms, end_ms):
+    """[start_ms, end_ms) 覆盖的分区：[(分区名, 起始毫秒, 结束毫秒)]"""
+    period = bar_period(bar)
+    by_day = period is not None and period < DAY_PARTITION_MAX_PERIOD
+    current = datetime.fromtimestamp(start_ms / 1000, timezone.utc)
+    if by_day:
+        current = current.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        current = current.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    result = []
+    while _ms(current) < end_ms:
+        if by_day:
+            following = datetime.fromtimestamp(current.timestamp() + 86400, timezone.utc)
+            name = current.strftime('%Y-%m-%d')
+        else:
+            year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+            following = current.replace(year=year, month=month)
+            name = current.strftime('%Y-%m')
+        result.append((name, _ms(current), _ms(following)))
+        current = following
+    return result
+
+
+class HistoryStore:
+    """按时间分区的压缩列式K线文件：每个(instId, bar)一个目录，每个分区一个.npz（各列一个数组），
+    写入先落临时文件再替换，中断不会留下残缺分区；未结束的分区以.partial.npz保存，下次重新下载"""
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+
+    def _dir(self, inst_id, bar):
+        return os.path.join(self.root, f"{inst_id}_{bar}")
+
+    def path(self, inst_id, bar, partition, complete=True):
+        return os.path.join(self._dir(inst_id, bar), partition + ('.npz' if complete else PARTIAL_SUFFIX))
+
+    def has(self, inst_id, bar, partition):
+        """分区是否已完整下载"""
+        return os.path.exists(self.path(inst_id, bar, partition))
+
+    def write(self, inst_id, bar, partition, columns, complete=True):
+        os.makedirs(self._dir(inst_id, bar), exist_ok=True)
+        path = self.path(inst_id, bar, partition, complete)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(tmp, path)
+        if complete:
+            partial = self.path(inst_id, bar, partition, complete=False)
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    def files(self, inst_id, bar):
+        """按时间排序的分区文件（已完成的分区优先于同名的未完成分区）"""
+        directory = self._dir(inst_id, bar)
+        if not os.path.isdir(directory):
+            return []
+        names = {}
+        for filename in os.listdir(directory):
+            if filename.endswith(PARTIAL_SUFFIX):
+                names.setdefault(filename[:-len(PARTIAL_SUFFIX)], filename)
+            elif filename.endswith('.npz'):
+                names[filename[:-len('.npz')]] = filename
+        return [os.path.join(directory, names[name]) for name in sorted(names)]
+
+    def read(self, inst_id, bar, start=None, end=None):
+        """读取[start, end)（毫秒）内的K线，返回各列数组"""
+        parts = {name: [] for name, _ in COLUMNS}
+        for path in self.files(inst_id, bar):
+            with np.load(path) as data:
+                for name, _ in COLUMNS:
+                    parts[name].append(data[name])
+        columns = {name: np.concatenate(values) if values else np.empty(0, dtype=dtype)
+                   for (name, dtype), values in zip(COLUMNS, parts.values())}
+        ts = columns['timestamp']
+        lo = 0 if start is None else np.searchsorted(ts, start, side='left')
+        hi = len(ts) if end is None else np.searchsorted(ts, end, side='left')
+        return {name: values[lo:hi] for name, values in columns.items()}
+
+
+def load_history(inst_id, bar, start=None, end=None, root=HISTORY_DIR):
+    """加载历史K线为DataFrame（与实盘K线相同的列），可直接用于策略计算和回测"""
+    columns = HistoryStore(root).read(inst_id, bar, start, end)
+    df = pd.DataFrame(columns, copy=False)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+def merge_pages(pages, start_ms, end_ms):
+    """合并分页结果：解析、去掉未确认和范围外的K线，按时间去重排序"""
+    rows = [row for page in pages for row in page]
+    columns, confirm = parse_candles(rows)
+    ts = columns['timestamp']
+    keep = (confirm == '1') & (ts >= start_ms) & (ts < end_ms)
+    ts = ts[keep]
+    # 相邻分页可能重叠，按时间戳去重
+    _, index = np.unique(ts, return_index=True)
+    return {name: values[keep][index] for name, values in columns.items()}
+
+
+class HistoryDownloader:
+    """并发分页下载历史K线：按(合约, 分区)拆分任务，共用一个限速器，已完成的分区跳过，支持中断后续传"""
+
+    def __init__(self, api, store=None, limit=HISTORY_RATE_LIMIT, window=HISTORY_RATE_WINDOW,
+                 concurrency=HISTORY_CONCURRENCY):
+        self.api = api
+        self.store = store or HistoryStore()
+        self.limiter = RateLimiter(limit, window)
+        self.concurrency = concurrency
+        self.requests = 0
+
+    async def fetch_range(self, inst_id, bar, start_ms, end_ms):
+        """从end_ms向前翻页直到start_ms，返回原始分页列表"""
+        pages = []
+        after = end_ms
+        while after > start_ms:
+            await self.limiter.acquire_async()
+            params = {'instId': inst_id, 'bar': bar, 'after': str(after), 'limit': HISTORY_PAGE_LIMIT}
+            response = await self.api._retry_on_failure_async(
+                self.api._make_request_async, 'GET', '/api/v5/market/history-candles', params=params)
+            self.requests += 1
+            page = response['data']
+            if not page:
+                break
+            pages.append(page)
+            # 返回按时间倒序，最后一行最早
+            oldest = int(page[-1][0])
+            if oldest >= after:
+                break
+            after = oldest
+        return pages
+
+    async def download_partition(self, inst_id, bar, partition, start_ms, end_ms, now_ms):
+        complete = end_ms <= now_ms
+        pages = await self.fetch_range(inst_id, bar, start_ms, min(end_ms, now_ms))
+        columns = merge_pages(pages, start_ms, end_ms)
+        self.store.write(inst_id, bar, partition, columns, complete=complete)
+        logger.info(f"{inst_id} {bar} {partition}: {len(columns['timestamp'])} 根K线")
+        return len(columns['timestamp'])
+
+    async def download(self, inst_ids, bar, start, end=None):
+        """下载多个合约[start, end)的历史K线（datetime或毫秒），返回新写入的K线数量"""
+        start_ms = start if isinstance(start, int) else _ms(start)
+        now_ms = _ms(datetime.now(timezone.utc))
+        end_ms = now_ms if end is None else (end if isinstance(end, int) else _ms(end))
+        tasks = [(inst_id, name, lo, hi)
+                 for inst_id in inst_ids
+                 for name, lo, hi in partitions(bar, start_ms, end_ms)
+                 if not self.store.has(inst_id, bar, name)]
+        logger.info(f"待下载分区: {len(tasks)}")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(inst_id, name, lo, hi):
+            async with semaphore:
+                return await self.download_partition(inst_id, bar, name, lo, hi, now_ms)
+
+        counts = await asyncio.gather(*(run(*task) for task in tasks))
+        return sum(counts)
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+if __name__ == "__main__":
+    from okx_api import OKXAPI
+    from structured_log import setup_logging
+    from config import SYMBOL
+
+    parser = argparse.ArgumentParser(description="批量下载历史K线到按时间分区的压缩列式文件")
+    parser.add_argument('--inst', nargs='+', default=[SYMBOL], help="合约ID，可多个")
+    parser.add_argument('--bar', default='1m', help="K线粒度")
+    parser.add_argument('--start', required=True, help="开始日期（UTC），如2025-01-01")
+    parser.add_argument('--end', default=None, help="结束日期（UTC，不含），默认到当前时间")
+    parser.add_argument('--root', default=HISTORY_DIR, help="存储目录")
+    args = parser.parse_args()
+
+    setup_logging()
+    api = OKXAPI()
+    downloader = HistoryDownloader(api, HistoryStore(args.root))
+
+    async def main():
+        try:
+            return await downloader.download(args.inst, args.bar, _parse_date(args.start),
+                                             _parse_date(args.end) if args.end else None)
+        finally:
+            await api.async_transport.close()
+
+    total = asyncio.run(main())
+    print(f"完成：{total} 根K线，{downloader.requests} 个请求")
@@ -0,0 +1,252 @@
+import math
+import os
+import numpy as np
+from config import INDICATOR_CHUNK_SIZE
+
+# 内核输出的指标列，与TradingStrategy.calculate_indicators一致
+OUTPUT_COLUMNS = ('rsi', 'ma', 'ma_fast', 'ma_slow', 'macd', 'macd_signal', 'macd_hist',
+                  'volume_ma', 'volume_ratio', 'atr', 'adx')
+
+# EMA按块求解时 (1-alpha)^-L 的指数上限，保证中间值不溢出
+EMA_BLOCK_EXPONENT = 300.0
+
+
+class RollingWindow:
+    """分块滚动均值：保留上一块末尾window-1个值，块内一次求出全部窗口均值；
+    窗口内有NaN或inf时结果为NaN，与pandas rolling(window).mean()一致"""
+
+    def __init__(self, window):
+        self.window = window
+        self.tail = np.empty(0)
+
+    def __call__(self, values, out):
+        w = self.window
+        ext = np.concatenate((self.tail, values)) if len(self.tail) else np.asarray(values)
+        valid = np.isfinite(ext)
+        clean = np.where(valid, ext, 0.0)
+        # 减去块内的参考值再求前缀和，减小相减时的舍入误差
+        center = float(clean[-1]) if len(clean) else 0.0
+        sums = np.zeros(len(ext) + 1)
+        np.cumsum(clean - center, out=sums[1:])
+        counts = np.zeros((2, len(ext) + 1), dtype=np.int64)
+        np.cumsum(~valid, out=counts[0, 1:])
+        np.cumsum(clean != 0, out=counts[1, 1:])
+
+        # values[i]对应ext[offset + i]，窗口为ext[offset + i - w + 1 : offset + i + 1]；
+        # 前first个值的窗口不完整，其余窗口的前缀和下标都是连续切片
+        offset = len(ext) - len(values)
+        first = min(max(w - 1 - offset, 0), len(values))
+        out[:first] = np.nan
+        end = slice(offset + first + 1, len(ext) + 1)
+        start = slice(offset + first + 1 - w, len(ext) + 1 - w)
+        body = out[first:]
+        np.subtract(sums[end], sums[start], out=body)
+        body /= w
+        body += center
+        # 全零窗口严格为0（前缀和相减会留下舍入误差）；含NaN或inf时为NaN
+        body[counts[1, end] == counts[1, start]] = 0.0
+        body[counts[0, end] != counts[0, start]] = np.nan
+        if w > 1:
+            self.tail = np.array(ext[-(w - 1):], dtype=np.float64)
+        return out
+
+
+class EMAState:
+    """分块EMA，等价于pandas ewm(span=span, adjust=False).mean()（输入须为有限值）：
+    y_t = b^(t+1)·y_prev + a·Σ b^(t-k)·x_k，每块长度受限以免 b^-L 溢出"""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1)
+        self.value = math.nan
+        decay = 1.0 - self.alpha
+        self.block = max(1, int(EMA_BLOCK_EXPONENT / -math.log(decay))) if decay > 0 else None
+        if self.block is not None:
+            k = np.arange(1, self.block + 1, dtype=np.float64)
+            self._growth = decay ** -k
+            self._decay = decay ** k
+
+    def __call__(self, values, out):
+        if self.block is None:
+            # span=1时EMA就是原序列
+            out[:] = values
+            self.value = float(values[-1]) if len(values) else self.value
+            return out
+        start = 0
+        if self.value != self.value and len(values):
+            out[0] = self.value = float(values[0])
+            start = 1
+        for lo in range(start, len(values), self.block):
+            hi = min(lo + self.block, len(values))
+            n = hi - lo
+            block = out[lo:hi]
+            np.multiply(values[lo:hi], self._growth[:n], out=block)
+            np.cumsum(block, out=block)
+            block *= self.alpha
+            block += self.value
+            block *= self._decay[:n]
+            self.value = float(block[-1])
+        return out
+
+
+class IndicatorKernel:
+    """批量指标计算的NumPy后端：按块遍历连续的float64数组，每块一次算出全部指标，
+    真实波幅、DM等中间结果只算一次并在ATR和ADX之间复用；跨块的状态（窗口尾部、EMA、上一根K线）保留在内核中，
+    因此可以处理内存映射或分块读入的超长序列，内存占用只与块大小有关。结果与TradingStrategy的pandas实现一致"""
+
+    def __init__(self, rsi_period, ma_period, ma_fast, ma_slow,
+                 macd_fast, macd_slow, macd_signal, volume_ma_period, atr_period):
+        self.rsi_gain = RollingWindow(rsi_period)
+        self.rsi_loss = RollingWindow(rsi_period)
+        self.ma = RollingWindow(ma_period)
+        self.ma_fast = RollingWindow(ma_fast)
+        self.ma_slow = RollingWindow(ma_slow)
+        self.macd_fast = EMAState(macd_fast)
+        self.macd_slow = EMAState(macd_slow)
+        self.macd_signal = EMAState(macd_signal)
+        self.volume_ma = RollingWindow(volume_ma_period)
+        self.atr = RollingWindow(atr_period)
+        self.adx_tr = RollingWindow(atr_period)
+        self.plus_dm = RollingWindow(atr_period)
+        self.minus_dm = RollingWindow(atr_period)
+        self.adx = RollingWindow(atr_period)
+        self.prev = (math.nan, math.nan, math.nan)
+
+    @classmethod
+    def from_strategy(cls, strategy):
+        """按策略参数创建内核"""
+        return cls(
+            rsi_period=strategy.rsi_period,
+            ma_period=strategy.ma_period,
+            ma_fast=strategy.ma_fast,
+            ma_slow=strategy.ma_slow,
+            macd_fast=strategy.macd_fast,
+            macd_slow=strategy.macd_slow,
+            macd_signal=strategy.macd_signal,
+            volume_ma_period=strategy.volume_ma_period,
+            atr_period=strategy.atr_period,
+        )
+
+    def process(self, high, low, close, volume, out):
+        """计算一块K线的全部指标，写入out（{列名: 与输入等长的float64数组}）"""
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        n = len(close)
+        if not n:
+            return out
+        prev_high, prev_low, prev_close = self.prev
+        scratch = np.empty(n)
+        tmp = np.empty(n)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # RSI：首根K线的涨跌幅为NaN，涨跌都记为0
+            np.subtract(close[1:], close[:-1], out=scratch[1:])
+            scratch[0] = close[0] - prev_close
+            np.maximum(scratch, 0.0, out=tmp)
+            gain = self.rsi_gain(np.where(np.isnan(scratch), 0.0, tmp), out['rsi'])
+            np.minimum(scratch, 0.0, out=tmp)
+            np.negative(tmp, out=tmp)
+            loss = self.rsi_loss(np.where(np.isnan(scratch), 0.0, tmp), np.empty(n))
+            rsi = out['rsi']
+            np.divide(gain, loss, out=rsi)
+            rsi += 1
+            np.divide(100.0, rsi, out=rsi)
+            np.subtract(100.0, rsi, out=rsi)
+
+            # 均线
+            self.ma(close, out['ma'])
+            self.ma_fast(close, out['ma_fast'])
+            self.ma_slow(close, out['ma_slow'])
+
+            # MACD
+            macd = out['macd']
+            self.macd_fast(close, macd)
+            macd -= self.macd_slow(close, tmp)
+            self.macd_signal(macd, out['macd_signal'])
+            np.subtract(macd, out['macd_signal'], out=out['macd_hist'])
+
+            # 成交量
+            self.volume_ma(volume, out['volume_ma'])
+            np.divide(volume, out['volume_ma'], out=out['volume_ratio'])
+
+            # 真实波幅：与前收盘价的差距跳过NaN取最大值
+            np.subtract(high, low, out=scratch)
+            shifted = np.empty(n)
+            shifted[0] = prev_close
+            shifted[1:] = close[:-1]
+            np.fmax(scratch, np.abs(high - shifted), out=scratch)
+            np.fmax(scratch, np.abs(low - shifted), out=scratch)
+            atr = self.atr(scratch, out['atr'])
+
+            # ADX复用ATR
+            tr14 = self.adx_tr(atr, np.empty(n))
+            shifted[0] = prev_high
+            shifted[1:] = high[:-1]
+            np.subtract(high, shifted, out=scratch)
+            scratch[scratch < 0] = 0.0
+            plus_di = self.plus_dm(scratch, np.empty(n))
+            shifted[0] = prev_low
+            shifted[1:] = low[:-1]
+            np.subtract(low, shifted, out=scratch)
+            scratch[scratch > 0] = 0.0
+            minus_di = np.abs(self.minus_dm(scratch, tmp), out=tmp)
+            plus_di /= tr14
+            plus_di *= 100
+            minus_di /= tr14
+            minus_di *= 100
+            np.subtract(plus_di, minus_di, out=scratch)
+            np.abs(scratch, out=scratch)
+            plus_di += minus_di
+            scratch /= plus_di
+            scratch *= 100
+            self.adx(scratch, out['adx'])
+
+        self.prev = (float(high[-1]), float(low[-1]), float(close[-1]))
+        return out
+
+    def run(self, high, low, close, volume, out=None, chunk_size=INDICATOR_CHUNK_SIZE):
+        """按块计算整段序列；输入可以是内存映射数组，out可传入预分配（或内存映射）的输出数组"""
+        n = len(close)
+        if out is None:
+            out = allocate_outputs(n)
+        for lo in range(0, n, chunk_size):
+            hi = min(lo + chunk_size, n)
+            self.process(high[lo:hi], low[lo:hi], close[lo:hi], volume[lo:hi],
+                         {name: out[name][lo:hi] for name in OUTPUT_COLUMNS})
+        return out
+
+
+def allocate_outputs(n, directory=None):
+    """预分配各指标列；指定directory时创建为.npy内存映射文件，可处理超出内存的数据量"""
+    if directory is None:
+        return {name: np.empty(n) for name in OUTPUT_COLUMNS}
+    os.makedirs(directory, exist_ok=True)
+    return {name: np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode='w+',
+                                            dtype=np.float64, shape=(n,))
+            for name in OUTPUT_COLUMNS}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from candle_store import CandleStore
+    from strategy import TradingStrategy
+    from config import SYMBOL, DATA_DIR
+
+    parser = argparse.ArgumentParser(description="对本地K线存储（内存映射）分块计算全部指标，结果写入.npy内存映射文件")
+    parser.add_argument('--inst', default=SYMBOL, help="合约ID")
+    parser.add_argument('--bar', default='1m', help="K线粒度")
+    parser.add_argument('--out', required=True, help="输出目录，每个指标一个.npy文件")
+    parser.add_argument('--chunk-size', type=int, default=INDICATOR_CHUNK_SIZE, help="每块处理的K线数量")
+    args = parser.parse_args()
+
+    columns = CandleStore(os.path.join(DATA_DIR, 'candles')).read(args.inst, args.bar)
+    n = len(columns['close'])
+    start = time.perf_counter()
+    out = allocate_outputs(n, args.out)
+    IndicatorKernel.from_strategy(TradingStrategy()).run(
+        columns['high'], columns['low'], columns['close'], columns['volume'], out, args.chunk_size)
+    for values in out.values():
+        values.flush()
+    print(f"{n} 根K线，耗时 {time.perf_counter() - start:.2f}s，输出: {args.out}")
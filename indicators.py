@@ -0,0 +1,188 @@
+import math
+from collections import deque
+
+
+def safe_div(a, b):
+    """按numpy语义做除法（除零得到inf或nan），保证与pandas批量计算结果一致"""
+    if b == 0:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class RollingMean:
+    """定长窗口滚动均值，O(1)更新，NaN/inf语义与pandas rolling(window).mean()一致"""
+
+    # 每隔若干次更新用精确求和重算一次，避免长时间运行的浮点误差累积
+    RESYNC_INTERVAL = 4096
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.invalid = 0
+        self._updates = 0
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            if math.isfinite(old):
+                self.total -= old
+            else:
+                self.invalid -= 1
+        self.values.append(value)
+        if math.isfinite(value):
+            self.total += value
+        else:
+            self.invalid += 1
+
+        self._updates += 1
+        if self._updates % self.RESYNC_INTERVAL == 0:
+            self.total = math.fsum(v for v in self.values if math.isfinite(v))
+        return self.value
+
+    @property
+    def value(self):
+        # pandas在窗口内存在NaN或inf时返回NaN
+        if len(self.values) < self.window or self.invalid:
+            return math.nan
+        return self.total / self.window
+
+
+class EMA:
+    """指数移动平均，等价于pandas ewm(span=span, adjust=False).mean()"""
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1)
+        self.value = math.nan
+
+    def update(self, value):
+        if self.value != self.value:
+            self.value = value
+        elif value == value:
+            self.value = self.alpha * value + (1 - self.alpha) * self.value
+        return self.value
+
+
+class IndicatorEngine:
+    """增量指标引擎：每根已确认K线以O(1)代价更新全部指标，结果与TradingStrategy批量计算一致"""
+
+    def __init__(self, rsi_period, ma_period, ma_fast, ma_slow,
+                 macd_fast, macd_slow, macd_signal, volume_ma_period, atr_period):
+        # RSI
+        self.rsi_gain = RollingMean(rsi_period)
+        self.rsi_loss = RollingMean(rsi_period)
+
+        # 移动平均线
+        self.ma = RollingMean(ma_period)
+        self.ma_fast = RollingMean(ma_fast)
+        self.ma_slow = RollingMean(ma_slow)
+
+        # MACD
+        self.macd_fast = EMA(macd_fast)
+        self.macd_slow = EMA(macd_slow)
+        self.macd_signal = EMA(macd_signal)
+
+        # 成交量
+        self.volume_ma = RollingMean(volume_ma_period)
+
+        # ATR / ADX（ADX复用同周期的ATR，不再重复计算）
+        self.atr = RollingMean(atr_period)
+        self.adx_tr = RollingMean(atr_period)
+        self.plus_dm = RollingMean(atr_period)
+        self.minus_dm = RollingMean(atr_period)
+        self.adx = RollingMean(atr_period)
+
+        self.prev_close = math.nan
+        self.prev_high = math.nan
+        self.prev_low = math.nan
+        self.last_timestamp = None
+        self.count = 0
+        self.latest = None
+
+    @classmethod
+    def from_strategy(cls, strategy):
+        """按策略参数创建引擎"""
+        return cls(
+            rsi_period=strategy.rsi_period,
+            ma_period=strategy.ma_period,
+            ma_fast=strategy.ma_fast,
+            ma_slow=strategy.ma_slow,
+            macd_fast=strategy.macd_fast,
+            macd_slow=strategy.macd_slow,
+            macd_signal=strategy.macd_signal,
+            volume_ma_period=strategy.volume_ma_period,
+            atr_period=strategy.atr_period,
+        )
+
+    def update(self, high, low, close, volume, timestamp=None):
+        """输入一根已确认K线，返回该K线的全部指标"""
+        # RSI：首根K线的涨跌幅视为0，与pandas的where(delta > 0, 0)行为一致
+        delta = close - self.prev_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        rs = safe_div(self.rsi_gain.update(gain), self.rsi_loss.update(loss))
+        rsi = 100 - 100 / (1 + rs)
+
+        ma = self.ma.update(close)
+        ma_fast = self.ma_fast.update(close)
+        ma_slow = self.ma_slow.update(close)
+
+        macd = self.macd_fast.update(close) - self.macd_slow.update(close)
+        macd_signal = self.macd_signal.update(macd)
+
+        volume_ma = self.volume_ma.update(volume)
+        volume_ratio = safe_div(volume, volume_ma)
+
+        # 真实波幅：跳过NaN取最大值
+        tr = high - low
+        if self.prev_close == self.prev_close:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        atr = self.atr.update(tr)
+
+        plus_dm = high - self.prev_high
+        if plus_dm < 0:
+            plus_dm = 0.0
+        minus_dm = low - self.prev_low
+        if minus_dm > 0:
+            minus_dm = 0.0
+        plus_dm = self.plus_dm.update(plus_dm)
+        minus_dm = abs(self.minus_dm.update(minus_dm))
+        tr14 = self.adx_tr.update(atr)
+        plus_di = 100 * safe_div(plus_dm, tr14)
+        minus_di = 100 * safe_div(minus_dm, tr14)
+        dx = 100 * safe_div(abs(plus_di - minus_di), plus_di + minus_di)
+        adx = self.adx.update(dx)
+
+        self.prev_close = close
+        self.prev_high = high
+        self.prev_low = low
+        self.last_timestamp = timestamp
+        self.count += 1
+
+        self.latest = {
+            'timestamp': timestamp,
+            'close': close,
+            'rsi': rsi,
+            'ma': ma,
+            'ma_fast': ma_fast,
+            'ma_slow': ma_slow,
+            'macd': macd,
+            'macd_signal': macd_signal,
+            'macd_hist': macd - macd_signal,
+            'volume_ma': volume_ma,
+            'volume_ratio': volume_ratio,
+            'atr': atr,
+            'adx': adx,
+        }
+        return self.latest
+
+    def warm_up(self, df):
+        """用历史K线预热引擎状态"""
+        latest = None
+        timestamps = df['timestamp'] if 'timestamp' in df.columns else [None] * len(df)
+        for high, low, close, volume, timestamp in zip(
+                df['high'], df['low'], df['close'], df['volume'], timestamps):
+            latest = self.update(float(high), float(low), float(close), float(volume), timestamp)
+        return latest
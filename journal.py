@@ -0,0 +1,213 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from config import (
+    JOURNAL_DIR, JOURNAL_FSYNC_INTERVAL, JOURNAL_FSYNC_BATCH, JOURNAL_SNAPSHOT_INTERVAL, ORDER_INDEX_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# 记录头：负载长度、负载CRC32、序号（小端）
+HEADER = struct.Struct('<IIQ')
+
+SEGMENT_PREFIX = 'journal-'
+SEGMENT_SUFFIX = '.log'
+SNAPSHOT_FILE = 'snapshot.json'
+
+# 仍可能成交的订单状态（与order_manager一致）
+OPEN_ORDER_STATES = ('submitting', 'live', 'partially_filled')
+
+# 订单状态对应的记录类型：下单意图、交易所确认、成交，其余为一般订单更新
+ORDER_KINDS = {'submitting': 'intent', 'live': 'ack', 'partially_filled': 'fill', 'filled': 'fill'}
+
+
+def empty_state():
+    """机器人可恢复的状态"""
+    return {
+        'seq': 0,
+        'last_bar_ts': None,
+        'trade_day': None,
+        'trades_today': 0,
+        'prices': {},
+        'positions': {},
+        'balance': None,
+        'orders': {},
+    }
+
+
+def apply(state, record, history=ORDER_INDEX_SIZE):
+    """把一条记录合并进状态；重放与写入时使用同一逻辑"""
+    kind = record['k']
+    if kind == 'signal':
+        state['last_bar_ts'] = record['ts']
+        if record.get('px') is not None:
+            state['prices'][record['instId']] = record['px']
+    elif kind == 'trade':
+        state['trade_day'] = record['day']
+        state['trades_today'] = record['n']
+    elif kind == 'account':
+        if record.get('balance') is not None:
+            state['balance'] = record['balance']
+        for inst_id, position in record.get('positions', {}).items():
+            if position is None:
+                state['positions'].pop(inst_id, None)
+            else:
+                state['positions'][inst_id] = position
+    elif kind in ('intent', 'ack', 'fill', 'order'):
+        order = record['order']
+        key = order.get('clOrdId') or order['ordId']
+        orders = state['orders']
+        # 重新插入使字典保持按最近更新排序，便于只保留最近的已结束订单
+        orders[key] = {**orders.pop(key, {}), **order}
+        if len(orders) > history:
+            finished = [k for k, o in orders.items() if o.get('state') not in OPEN_ORDER_STATES]
+            for k in finished[:len(orders) - history]:
+                del orders[k]
+    state['seq'] = record['seq']
+    return state
+
+
+def read_segment(path):
+    """按内存映射读取一个日志段，返回(记录列表, 有效数据的字节长度)；遇到残缺或校验失败的记录即停止"""
+    records = []
+    if os.path.getsize(path) == 0:
+        return records, 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            length, crc, seq = HEADER.unpack_from(data, offset)
+            start = offset + HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            record = json.loads(payload)
+            record['seq'] = seq
+            records.append(record)
+            offset = start + length
+        return records, offset
+
+
+class Journal:
+    """交易预写日志：信号、下单意图、交易所确认、成交和账户变化按顺序追加到日志段，
+    每条记录带长度和CRC32，写入后立即交给操作系统（进程崩溃不丢），fsync按条数或时间批量进行；
+    内存中同步维护折叠后的状态，每JOURNAL_SNAPSHOT_INTERVAL条写一次快照并切换到新日志段，
+    启动时只需读快照再重放其后的少量记录"""
+
+    def __init__(self, directory=JOURNAL_DIR, fsync_interval=JOURNAL_FSYNC_INTERVAL,
+                 fsync_batch=JOURNAL_FSYNC_BATCH, snapshot_interval=JOURNAL_SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.snapshot_interval = snapshot_interval
+        self.state = empty_state()
+        self.recovered = False
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._since_snapshot = 0
+        self._lock = threading.Lock()
+
+    def _segments(self):
+        names = [name for name in os.listdir(self.directory)
+                 if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)]
+        return [os.path.join(self.directory, name) for name in sorted(names)]
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:016d}{SEGMENT_SUFFIX}")
+
+    def open(self):
+        """读取快照并重放之后的记录，截掉末尾残缺的记录，返回恢复的状态"""
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot):
+            with open(snapshot) as f:
+                self.state = json.load(f)
+            self.recovered = True
+
+        replayed = 0
+        segments = self._segments()
+        for path in segments:
+            records, valid = read_segment(path)
+            for record in records:
+                if record['seq'] > self.state['seq']:
+                    apply(self.state, record)
+                    replayed += 1
+            if valid < os.path.getsize(path):
+                logger.warning(f"日志段末尾有残缺记录，已截断: {path}")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+        self.recovered = self.recovered or replayed > 0
+        self._since_snapshot = replayed
+
+        path = segments[-1] if segments else self._segment_path(self.state['seq'] + 1)
+        self._file = open(path, 'ab')
+        logger.info(f"交易日志恢复完成：重放 {replayed} 条记录，序号 {self.state['seq']}，"
+                    f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return self.state
+
+    def append(self, kind, **data):
+        """追加一条记录并合并进内存状态"""
+        with self._lock:
+            seq = self.state['seq'] + 1
+            payload = json.dumps({'k': kind, **data}, separators=(',', ':'), default=str).encode()
+            self._file.write(HEADER.pack(len(payload), zlib.crc32(payload), seq) + payload)
+            self._file.flush()
+            apply(self.state, {'k': kind, **data, 'seq': seq})
+            self._unsynced += 1
+            self._since_snapshot += 1
+            if self._since_snapshot >= self.snapshot_interval:
+                self._snapshot()
+            elif self._unsynced >= self.fsync_batch or time.monotonic() - self._synced_at >= self.fsync_interval:
+                self._sync()
+            return seq
+
+    def record_order(self, order):
+        """订单表变化（OrderManager监听者），按订单状态记为意图、确认、成交或一般更新"""
+        self.append(ORDER_KINDS.get(order.get('state'), 'order'), order=order)
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def sync(self):
+        """把尚未fsync的记录落盘"""
+        with self._lock:
+            if self._file is not None and self._unsynced:
+                self._sync()
+
+    def _snapshot(self):
+        """写快照（先写临时文件再替换），然后切换到新日志段并删除旧日志段"""
+        self._sync()
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, separators=(',', ':'), default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        self._file.close()
+        current = self._segment_path(self.state['seq'] + 1)
+        for segment in self._segments():
+            os.remove(segment)
+        self._file = open(current, 'ab')
+        self._since_snapshot = 0
+
+    def snapshot(self):
+        """立即写快照"""
+        with self._lock:
+            self._snapshot()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
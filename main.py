@@ -1,29 +1,49 @@
 import time
+import asyncio
 import logging
-from datetime import datetime
 from okx_api import OKXAPI
 from strategy import TradingStrategy
-from config import SYMBOL, POSITION_SIZE, MAX_DAILY_TRADES
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('trading_bot.log'),
-        logging.StreamHandler()
-    ]
+from ws_client import MarketDataState, MarketDataFeed, AccountState, AccountFeed
+from order_manager import OrderManager
+from risk import RiskEngine
+from journal import Journal
+from scheduler import ServerClock, BarScheduler
+from retry import deadline_scope
+from metrics import REGISTRY, start_metrics
+from structured_log import setup_logging
+from config import (
+    API_KEY, SYMBOL, POSITION_SIZE, MAX_SLIPPAGE, USE_WEBSOCKET, USE_PRIVATE_WEBSOCKET, ASYNC_RUN,
+    TICK_BUDGET, JOURNAL_DIR
 )
 
+
 class TradingBot:
     def __init__(self):
         self.api = OKXAPI()
         self.strategy = TradingStrategy()
-        self.last_trade_time = None
-        self.trades_today = 0
-        self.last_price = None
+        # 下单前风控，只读本地缓存的行情和账户状态
+        self.risk = RiskEngine()
+        self.current_price = None
         self.position = None
         self.balance = None
+        self.ticker = None
+        self.market_data = MarketDataState()
+        self.feed = None
+        self.account = AccountState()
+        self.account_feed = None
+        # 订单表：下单结果和私有频道的订单推送都写入其中
+        self.orders = OrderManager(self.api)
+        self.account.order_listeners.append(self.orders.on_order)
+        # 交易日志：启动时恢复状态，之后记录信号、订单和账户变化
+        self.journal = None
+        self._resync = True
+        self._bar_event = None
+        self.tick_started = None
+        self.metrics = []
+        # 按交易所服务器时间在K线收盘时唤醒
+        self.clock = ServerClock(self.api)
+        self.scheduler = BarScheduler(self.clock, [self.api.get_bar()])
+        self.last_bar_ts = None
         self.setup_logging()
 
     def setup_logging(self):
@@ -32,55 +52,190 @@ class TradingBot:
 
     def update_trade_count(self):
         """更新每日交易计数"""
-        current_time = datetime.now()
-        if self.last_trade_time is None or current_time.date() != self.last_trade_time.date():
-            self.trades_today = 0
-            self.logger.info("新的一天开始，重置交易计数")
-        self.last_trade_time = current_time
-        self.trades_today += 1
-        self.logger.info(f"今日已执行 {self.trades_today} 笔交易")
-
-    def check_market_conditions(self):
-        """检查市场条件"""
-        try:
-            # 获取当前行情
-            ticker = self.api.get_ticker()
-            print("ticker:", ticker)
-            current_price = ticker['data'][0]['last']
-            print("current_price:", current_price)
-            
-            # 检查价格波动
-            if self.last_price is not None:
-                price_change = abs(current_price - self.last_price) / self.last_price
-                if price_change > 0.05:  # 价格波动超过5%
-                    self.logger.warning(f"价格波动过大: {price_change:.2%}")
-                    return False
-            
-            self.last_price = current_price
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"检查市场条件时出错: {e}")
+        trades_today = self.risk.record_trade()
+        self.record('trade', day=self.risk.trade_day.isoformat(), n=trades_today)
+        self.logger.info(f"今日已执行 {trades_today} 笔交易")
+
+    def recover(self):
+        """从交易日志恢复每日交易计数、最近处理的K线、参考价、持仓、余额和订单表，
+        之后的订单变化写入日志；返回是否恢复了状态"""
+        if not JOURNAL_DIR:
+            return False
+        self.journal = Journal(JOURNAL_DIR)
+        state = self.journal.open()
+        if self.journal.recovered:
+            self.last_bar_ts = state['last_bar_ts']
+            self.risk.restore(state['trade_day'], state['trades_today'], state['prices'])
+            self.account.restore({'USDT': state['balance']} if state['balance'] else {}, state['positions'])
+            self.position = state['positions'].get(SYMBOL)
+            self.balance = state['balance']
+            self.orders.restore(state['orders'].values())
+        self.orders.listeners.append(self.journal.record_order)
+        return self.journal.recovered
+
+    def adopt_server_time(self):
+        """用初始化时取得的服务器时间校准时钟，第一轮之前不再单独请求"""
+        if self.api.server_time is not None:
+            self.clock.adopt(*self.api.server_time)
+
+    def reconcile_gap(self, recovered):
+        """启动时对账：从日志恢复时只核对恢复出的未结束订单，否则接管交易所已有的挂单；
+        持仓和余额在第一轮按账户缓存的校准规则用REST核对"""
+        if not recovered or self.orders.open_orders():
+            self.maintain_orders(force=True)
+
+    def record(self, kind, **data):
+        """写交易日志（未启用时忽略）"""
+        if self.journal is not None:
+            self.journal.append(kind, **data)
+
+    def record_account(self):
+        """持仓或余额有变化时写交易日志"""
+        if self.journal is None:
+            return
+        state = self.journal.state
+        if state['positions'].get(SYMBOL) != self.position or state['balance'] != self.balance:
+            self.journal.append('account', positions={SYMBOL: self.position}, balance=self.balance)
+
+    def sync_journal(self):
+        """每轮结束时把交易日志落盘"""
+        if self.journal is not None:
+            self.journal.sync()
+
+    def start_market_data(self):
+        """启动WebSocket行情订阅，收盘K线直接写入本地K线存储"""
+        def on_candle(inst_id, bar, row):
+            if inst_id == SYMBOL:
+                self.api.ingest_candles(bar, [row])
+
+        def on_connect():
+            # (重新)连接后用REST补齐断线期间缺失的K线
+            self._resync = True
+
+        self.market_data.candle_listeners.append(on_candle)
+        self.feed = MarketDataFeed(self.market_data, [SYMBOL], self.api.get_bar(),
+                                   simulated=self.api.is_simulated, on_connect=on_connect)
+        self.feed.start()
+
+    def feed_ready(self):
+        """WebSocket行情是否可用"""
+        return self.feed is not None and self.feed.connected
+
+    def start_account_feed(self):
+        """启动私有频道推送，余额、持仓和订单写入本地账户缓存"""
+        self.account_feed = AccountFeed(self.account, self.api.ws_login_args, simulated=self.api.is_simulated)
+        self.account_feed.start()
+
+    def account_ready(self):
+        """账户推送可用且已用REST校准过，可以直接读缓存"""
+        return (self.account_feed is not None and self.account_feed.connected
+                and not self.account.needs_reconcile())
+
+    def reconcile_account(self, position, balance):
+        """用REST获取的持仓和余额校准账户缓存"""
+        self.account.reconcile({'USDT': balance}, {SYMBOL: position}, inst_ids=[SYMBOL])
+
+    def refresh_account(self):
+        """读取持仓和余额：推送缓存可用时直接读缓存，否则（以及定期校准时）通过REST获取"""
+        if not self.account_ready():
+            self.reconcile_account(self.api.get_position(), self.api.get_balance('USDT'))
+        self.position = self.account.get_position(SYMBOL)
+        self.balance = self.account.get_balance('USDT')
+        self.record_account()
+
+    def strategy_frames(self):
+        """策略用到的高周期K线（趋势过滤周期），没有用到时不取出也不计算"""
+        timeframes = self.strategy.trend_timeframes
+        return self.api.get_frames(timeframes=timeframes) if timeframes else None
+
+    def load_candles(self):
+        """获取K线：行情推送正常时直接读本地数据，否则通过REST增量拉取"""
+        if self.feed_ready() and not self._resync:
+            return self.api.get_ohlcv(refresh=False)
+        self._resync = False
+        return self.api.get_ohlcv()
+
+    def has_new_bar(self, df):
+        """是否出现了新的已确认K线，同时向调度器报告确认进度"""
+        confirmed = df['timestamp'][df['confirm'] == '1']
+        if confirmed.empty:
+            return False
+        last = confirmed.iloc[-1].value // 10 ** 6
+        self.scheduler.confirm(self.api.get_bar(), last)
+        if last == self.last_bar_ts:
+            return False
+        self.last_bar_ts = last
+        return True
+
+    def wait_next_cycle(self):
+        """等待到下一根K线收盘：有推送时收到收盘K线立即返回，超时则改用REST补齐"""
+        timeout = self.scheduler.wait_seconds()
+        if self.feed_ready():
+            if not self.market_data.wait_for_bar(timeout=timeout):
+                self._resync = True
+        else:
+            time.sleep(timeout)
+        self.scheduler.pop_due()
+
+    def market_price(self, inst_id=SYMBOL):
+        """最新价：优先使用WebSocket推送或本轮已并发获取的行情，其次是最新K线收盘价；
+        本地都没有时（如在主循环之外直接下单）才通过REST获取，其他合约没有推送时返回None"""
+        ticker = self.market_data.get_ticker(inst_id) if self.feed_ready() else None
+        if inst_id != SYMBOL:
+            return float(ticker['last']) if ticker is not None else None
+        ticker = ticker or self.ticker
+        if ticker is not None:
+            self.logger.debug(f"当前行情: {ticker['last']}", extra={'sample': 'ticker', 'ticker': ticker})
+            return float(ticker['last'])
+        if self.current_price is not None:
+            return float(self.current_price)
+        return float(self.api.get_ticker()['data'][0]['last'])
+
+    def check_risk(self, side, amount, inst_id=SYMBOL, price=None):
+        """下单前风控，规则只读本地缓存的行情、持仓和余额，不增加网络往返"""
+        if price is None:
+            price = self.market_price(inst_id)
+        return self.risk.check(inst_id, side, amount, price, self.account.get_positions(), self.balance)
+
+    def limit_price(self, side, amount):
+        """按本地订单簿估算滑点并给出可立即成交的限价；没有订单簿时返回None（市价单），
+        深度不足或滑点超限时返回False"""
+        book = self.market_data.get_book(SYMBOL) if self.feed_ready() else None
+        if book is None:
+            return None
+        quote = book.quote(side, float(amount))
+        if quote is None:
+            self.logger.warning(f"订单簿深度不足以成交 {amount}")
+            return False
+        if quote['slippage'] > MAX_SLIPPAGE:
+            self.logger.warning(f"预估滑点过大: {quote['slippage']:.4%}")
             return False
+        return quote['price']
 
     def execute_trade(self, side, amount, stop_loss, take_profit):
         """执行交易"""
         try:
-            if self.trades_today >= MAX_DAILY_TRADES:
-                self.logger.warning("达到每日最大交易次数限制")
+            decision = self.check_risk(side, amount)
+            if not decision:
+                self.logger.warning(f"风控未通过（{decision.reason}），取消交易")
                 return False
 
-            if not self.check_market_conditions():
-                self.logger.warning("市场条件不满足，取消交易")
+            price = self.limit_price(side, amount)
+            if price is False:
+                self.logger.warning("流动性不足，取消交易")
                 return False
 
-            order = self.api.create_order(
+            # clOrdId由信号所在K线确定，同一信号重试或重启后不会重复下单
+            order = self.orders.place(
                 side,
                 amount,
+                price=price,
                 stop_loss=stop_loss,
-                take_profit=take_profit
+                take_profit=take_profit,
+                tag=self.last_bar_ts
             )
             
+            self.record_tick_to_order()
             self.logger.info(f"{side}订单已创建: {order}")
             self.update_trade_count()
             return True
@@ -89,70 +244,281 @@ class TradingBot:
             self.logger.error(f"执行交易时出错: {e}")
             return False
 
+    def submit_intents(self, intents, tag=None):
+        """一次性提交多笔交易意图（side、amount，可选price、stop_loss、take_profit、instId），
+        通过订单管理器的批量下单减少往返次数，返回逐笔结果；clOrdId由tag（默认为信号所在K线）确定"""
+        try:
+            remaining = self.risk.remaining_trades()
+            if remaining == 0:
+                self.logger.warning("达到每日最大交易次数限制")
+                return []
+            if remaining is not None and len(intents) > remaining:
+                self.logger.warning(f"交易意图数量超过今日剩余次数，仅提交前 {remaining} 笔")
+                intents = intents[:remaining]
+
+            # 逐笔风控，被拒绝的意图以拒绝原因代码作为sCode返回
+            results = [None] * len(intents)
+            accepted = []
+            for i, intent in enumerate(intents):
+                inst_id = intent.get('instId') or SYMBOL
+                decision = self.check_risk(intent['side'], intent['amount'], inst_id)
+                if decision:
+                    accepted.append(i)
+                else:
+                    results[i] = {'ok': False, 'ordId': '', 'clOrdId': '', 'sCode': decision.reason,
+                                  'sMsg': decision.message,
+                                  'request': {'instId': inst_id, 'side': intent['side'], 'sz': str(intent['amount'])}}
+            if accepted:
+                tag = tag if tag is not None else self.last_bar_ts
+                placed = self.orders.place_batch([{'seq': i, **intents[i]} for i in accepted], tag=tag)
+                for i, result in zip(accepted, placed):
+                    results[i] = result
+                self.record_tick_to_order()
+            for result in results:
+                request = result['request']
+                if result['ok']:
+                    self.logger.info(f"{request['instId']} {request['side']}订单已创建: {result['ordId']}")
+                    self.update_trade_count()
+                else:
+                    self.logger.error(f"{request['instId']} {request['side']}订单失败: {result['sCode']} {result['sMsg']}")
+            return results
+
+        except Exception as e:
+            self.logger.error(f"批量执行交易时出错: {e}")
+            return []
+
+    def maintain_orders(self, force=False):
+        """有未结束订单时定期与交易所挂单对账；force为True时立即对账（启动时接管已有挂单）"""
+        try:
+            if force or self.orders.needs_reconcile():
+                self.orders.reconcile()
+        except Exception as e:
+            self.logger.error(f"订单对账出错: {e}")
+
+    def record_tick_to_order(self):
+        """记录本轮开始到订单提交完成的耗时"""
+        if self.tick_started is not None:
+            REGISTRY.observe('tick_to_order_seconds', time.perf_counter() - self.tick_started)
+
+    def handle_signal(self, current_price, latest):
+        """根据最新信号和账户状态执行交易逻辑"""
+        latest_signal = latest['signal']
+        signal_strength = latest['signal_strength']
+        atr = latest['atr']
+        contracts = float(self.position['pos'] or 0) if self.position is not None else 0.0
+        self.current_price = current_price
+        self.record('signal', instId=SYMBOL, ts=self.last_bar_ts, signal=int(latest_signal),
+                    strength=float(signal_strength), px=float(current_price))
+
+        self.logger.info(f"当前价格: {current_price}, 信号: {latest_signal}, 强度: {signal_strength:.2f}, 持仓: {contracts}, 余额: {self.balance}",
+                         extra={'price': current_price, 'signal': latest_signal, 'position': contracts})
+
+        if latest_signal == 1 and contracts <= 0:
+            # 买入信号
+            amount = self.strategy.calculate_position_size(
+                self.balance['available'],
+                current_price,
+                signal_strength
+            )
+            stop_loss = self.strategy.calculate_stop_loss(
+                current_price,
+                'buy',
+                atr
+            )
+            take_profit = self.strategy.calculate_take_profit(
+                current_price,
+                'buy',
+                atr
+            )
+            
+            self.execute_trade('buy', amount, stop_loss, take_profit)
+            
+        elif latest_signal == -1 and contracts > 0:
+            # 卖出信号
+            self.execute_trade('sell', contracts, None, None)
+
     def run(self):
         """运行交易机器人"""
         self.logger.info("启动交易机器人...")
         
         try:
-            # 初始化交易所连接
+            # 从交易日志恢复状态，初始化交易所连接后只对缺口对账
+            recovered = self.recover()
             self.api.initialize()
+            self.adopt_server_time()
+            self.reconcile_gap(recovered)
+            if USE_WEBSOCKET:
+                self.start_market_data()
+            if USE_PRIVATE_WEBSOCKET and API_KEY:
+                self.start_account_feed()
+            self.metrics = start_metrics(self.logger)
             
             while True:
                 try:
-                    # 获取市场数据
-                    df = self.api.get_ohlcv()
-                    current_price = df['close'].iloc[-1]
-                    
-                    # 生成交易信号
-                    df = self.strategy.generate_signals(df)
-                    latest_signal = df['signal'].iloc[-1]
-                    signal_strength = df['signal_strength'].iloc[-1]
-                    
-                    # 获取当前持仓和余额
-                    self.position = self.api.get_position()
-                    self.balance = self.api.get_balance('USDT')
-                    
-                    self.logger.info(f"当前价格: {current_price}, 信号: {latest_signal}, 强度: {signal_strength:.2f}, 持仓: {self.position}, 余额: {self.balance}")
-                    
-                    # 交易逻辑
-                    if latest_signal == 1 and (self.position is None or self.position['contracts'] <= 0):
-                        # 买入信号
-                        amount = self.strategy.calculate_position_size(
-                            self.balance,
-                            current_price,
-                            signal_strength
-                        )
-                        stop_loss = self.strategy.calculate_stop_loss(
-                            current_price,
-                            'buy',
-                            df['atr'].iloc[-1]
-                        )
-                        take_profit = self.strategy.calculate_take_profit(
-                            current_price,
-                            'buy',
-                            df['atr'].iloc[-1]
-                        )
-                        
-                        self.execute_trade('buy', amount, stop_loss, take_profit)
+                    if self.clock.stale:
+                        self.clock.sync()
+
+                    # 本轮所有请求（含重试）共享同一截止时间
+                    self.tick_started = time.perf_counter()
+                    with deadline_scope(TICK_BUDGET), REGISTRY.timer('tick_seconds'):
+                        # 获取市场数据
+                        df = self.load_candles()
+                        current_price = df['close'].iloc[-1]
                         
-                    elif latest_signal == -1 and self.position is not None and self.position['contracts'] > 0:
-                        # 卖出信号
-                        self.execute_trade('sell', self.position['contracts'], None, None)
-                    
-                    # 等待下一个周期
-                    time.sleep(60)
+                        # 没有新收盘的K线时不重复计算信号
+                        if self.has_new_bar(df):
+                            # 增量更新指标，只处理新确认的K线，并附加本地合成的高周期指标
+                            latest = self.strategy.update_signals(df, self.strategy_frames(), self.api.get_bar())
+                            
+                            # 获取当前持仓和余额
+                            self.refresh_account()
+                            
+                            # 交易逻辑
+                            self.handle_signal(current_price, latest)
+                        else:
+                            self.logger.debug("没有新的已确认K线，跳过策略计算", extra={'sample': 'no_new_bar'})
                     
                 except Exception as e:
                     self.logger.error(f"主循环出错: {e}")
-                    time.sleep(60)
+
+                self.maintain_orders()
+                self.sync_journal()
+                # 等待下一根K线收盘
+                self.wait_next_cycle()
                     
         except KeyboardInterrupt:
             self.logger.info("收到停止信号，正在关闭机器人...")
         except Exception as e:
             self.logger.error(f"机器人运行出错: {e}")
         finally:
+            if self.feed is not None:
+                self.feed.stop()
+            if self.account_feed is not None:
+                self.account_feed.stop()
+            for service in self.metrics:
+                service.stop()
+            if self.journal is not None:
+                self.journal.close()
+            self.logger.info("机器人已停止运行")
+
+    async def load_candles_async(self):
+        """异步获取K线，行情推送正常时直接读本地数据"""
+        if self.feed_ready() and not self._resync:
+            return self.api.get_ohlcv(refresh=False)
+        self._resync = False
+        return await self.api.get_ohlcv_async()
+
+    async def tick_async(self):
+        """单轮交易：并发获取K线、持仓、余额（及行情），K线一到就先计算信号；
+        账户推送可用时持仓和余额直接读缓存"""
+        self.tick_started = time.perf_counter()
+        candles = asyncio.ensure_future(self.load_candles_async())
+        requests = []
+        reconcile = not self.account_ready()
+        if reconcile:
+            requests += [self.api.get_position_async(), self.api.get_balance_async('USDT')]
+        if not self.feed_ready():
+            requests.append(self.api.get_ticker_async())
+        account = asyncio.gather(*requests)
+
+        try:
+            df = await candles
+        except Exception:
+            account.cancel()
+            raise
+        current_price = df['close'].iloc[-1]
+        new_bar = self.has_new_bar(df)
+        latest = self.strategy.update_signals(df, self.strategy_frames(), self.api.get_bar()) if new_bar else None
+
+        results = await account
+        if reconcile:
+            self.reconcile_account(results[0], results[1])
+            results = results[2:]
+        self.position = self.account.get_position(SYMBOL)
+        self.balance = self.account.get_balance('USDT')
+        self.record_account()
+        self.ticker = results[0]['data'][0] if results else None
+        # 下单、对账和日志落盘都是阻塞调用，放到线程执行，不阻塞事件循环；to_thread带上本轮的截止时间
+        if not new_bar:
+            self.logger.debug("没有新的已确认K线，跳过策略计算", extra={'sample': 'no_new_bar'})
+        else:
+            await asyncio.to_thread(self.handle_signal, current_price, latest)
+        await asyncio.to_thread(self.maintain_orders)
+        await asyncio.to_thread(self.sync_journal)
+
+    async def wait_until(self, deadline):
+        """等待到截止时间；行情推送正常时K线收盘会提前唤醒"""
+        remaining = max(deadline - time.monotonic(), 0)
+        if self._bar_event is not None and self.feed_ready():
+            try:
+                await asyncio.wait_for(self._bar_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                self._resync = True
+            self._bar_event.clear()
+        elif remaining > 0:
+            await asyncio.sleep(remaining)
+
+    async def run_async(self):
+        """asyncio运行模式：每轮并发获取数据，按服务器时间在K线收盘时调度，不随处理耗时漂移"""
+        self.logger.info("启动交易机器人(asyncio模式)...")
+        
+        try:
+            recovered = self.recover()
+            self.api.initialize()
+            self.adopt_server_time()
+            self.reconcile_gap(recovered)
+            if USE_PRIVATE_WEBSOCKET and API_KEY:
+                self.start_account_feed()
+            if USE_WEBSOCKET:
+                self.start_market_data()
+
+                # WebSocket线程收到收盘K线时唤醒事件循环
+                loop = asyncio.get_running_loop()
+                self._bar_event = asyncio.Event()
+
+                def on_candle(inst_id, bar, row):
+                    if row[8] == '1':
+                        loop.call_soon_threadsafe(self._bar_event.set)
+
+                self.market_data.candle_listeners.append(on_candle)
+            self.metrics = start_metrics(self.logger)
+
+            while True:
+                if self.clock.stale:
+                    await self.clock.sync_async()
+                try:
+                    # 本轮并发请求共享同一截止时间，重试不会拖过本轮预算
+                    with deadline_scope(TICK_BUDGET), REGISTRY.timer('tick_seconds'):
+                        await self.tick_async()
+                except Exception as e:
+                    self.logger.error(f"主循环出错: {e}")
+
+                # 下一轮在K线收盘时刻唤醒（收盘后尚未确认则短间隔轮询），本轮超时不会累积漂移
+                await self.wait_until(time.monotonic() + self.scheduler.wait_seconds())
+                self.scheduler.pop_due()
+                    
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            self.logger.info("收到停止信号，正在关闭机器人...")
+        except Exception as e:
+            self.logger.error(f"机器人运行出错: {e}")
+        finally:
+            if self.feed is not None:
+                self.feed.stop()
+            if self.account_feed is not None:
+                self.account_feed.stop()
+            for service in self.metrics:
+                service.stop()
+            if self.journal is not None:
+                self.journal.close()
+            await self.api.async_transport.close()
             self.logger.info("机器人已停止运行")
 
 if __name__ == "__main__":
+    # 配置日志：异步写出，文件为JSON Lines；只在作为程序运行时配置，导入（如测试）时不写日志文件
+    setup_logging()
     bot = TradingBot()
-    bot.run() 
\ No newline at end of file
+    if ASYNC_RUN:
+        asyncio.run(bot.run_async())
+    else:
+        bot.run()
+ 
\ No newline at end of file
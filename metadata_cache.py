@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import threading
+import time
+from config import METADATA_CACHE_FILE, METADATA_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCache:
+    """磁盘上的元数据缓存（单个JSON文件）：合约信息、杠杆设置和账户模式校验结果等很少变化的数据，
+    条目带写入时间，超过TTL视为失效；重启后在有效期内直接复用，不再请求交易所"""
+
+    def __init__(self, path=METADATA_CACHE_FILE, ttl=METADATA_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path) as f:
+                        self._entries = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"元数据缓存损坏，已忽略: {e}")
+        return self._entries
+
+    def _fresh(self, entry, now):
+        return now - entry['at'] <= self.ttl
+
+    def get(self, key):
+        """未过期的缓存值，没有或已过期时返回None"""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None or not self._fresh(entry, time.time()):
+                return None
+            return entry['value']
+
+    def set(self, key, value):
+        """写入缓存并落盘（先写临时文件再替换），同时清理过期条目"""
+        with self._lock:
+            now = time.time()
+            entries = {k: e for k, e in self._load().items() if self._fresh(e, now)}
+            entries[key] = {'at': now, 'value': value}
+            self._entries = entries
+            self._save()
+
+    def invalidate(self, key=None):
+        """删除一个条目，key为None时清空缓存"""
+        with self._lock:
+            entries = self._load()
+            if key is None:
+                entries.clear()
+            else:
+                entries.pop(key, None)
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self._entries, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"写入元数据缓存失败: {e}")
@@ -0,0 +1,204 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_HOST, METRICS_PORT, METRICS_SUMMARY_INTERVAL
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """累积直方图：按桶计数并记录总和，可估算分位数"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶线性插值估算分位数"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class MetricsRegistry:
+    """进程内指标：计数器和延迟直方图，按名称和标签区分，线程安全"""
+
+    def __init__(self, prefix='okx_bot_'):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """计数器加value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """记录一次耗时（秒）"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """统计with块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get(self, name, **labels):
+        """读取计数器的值，或直方图的(次数, 总和)"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key in self.histograms:
+                histogram = self.histograms[key]
+                return histogram.count, histogram.sum
+            return self.counters.get(key, 0)
+
+    def render(self):
+        """导出Prometheus文本格式"""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {self.prefix}{name} counter")
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{self.prefix}{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {self.prefix}{name} histogram")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{self.prefix}{name}_bucket{_format_labels(labels, {'le': bound})} {cumulative}")
+                    lines.append(f"{self.prefix}{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{self.prefix}{name}_count{_format_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """汇总：每个直方图的次数、均值、p50、p99（毫秒），以及各计数器"""
+        lines = []
+        with self._lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if histogram.count == 0:
+                    continue
+                lines.append(
+                    f"{name}{_format_labels(labels)} n={histogram.count} "
+                    f"mean={histogram.sum / histogram.count * 1000:.1f}ms "
+                    f"p50={histogram.quantile(0.5) * 1000:.1f}ms p99={histogram.quantile(0.99) * 1000:.1f}ms"
+                )
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return lines
+
+
+# 全局指标
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """本地HTTP端点，GET /metrics 返回Prometheus文本格式"""
+
+    def __init__(self, registry=REGISTRY, host=METRICS_HOST, port=METRICS_PORT):
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry_ref.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SummaryReporter:
+    """后台线程定期把指标汇总写入日志"""
+
+    def __init__(self, registry=REGISTRY, interval=METRICS_SUMMARY_INTERVAL, logger=None):
+        self.registry = registry
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-summary', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            lines = self.registry.summary()
+            if lines:
+                self.logger.info("性能指标汇总:\n" + '\n'.join(lines))
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def start_metrics(logger=None):
+    """启动指标端点（METRICS_PORT为0时不启动）和定期汇总，返回需要在退出时停止的对象"""
+    services = [SummaryReporter(logger=logger).start()]
+    if METRICS_PORT:
+        try:
+            services.append(MetricsServer().start())
+        except OSError as e:
+            (logger or logging.getLogger(__name__)).warning(f"指标端点启动失败: {e}")
+    return services
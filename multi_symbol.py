@@ -0,0 +1,399 @@
+import asyncio
+import contextvars
+import logging
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from okx_api import OKXAPI
+from order_manager import OrderManager
+from risk import RiskEngine
+from rate_limit import RateLimiter
+from retry import deadline_scope
+from metrics import REGISTRY, start_metrics
+from structured_log import setup_logging
+from strategy import TradingStrategy
+from ws_client import MarketDataState, MarketDataFeed, AccountState, AccountFeed
+from scheduler import ServerClock, BarScheduler
+from config import (
+    API_KEY, USE_PRIVATE_WEBSOCKET, SYMBOLS, SYMBOL_TIMEFRAMES, MAX_SLIPPAGE, USE_WEBSOCKET, STRATEGY_WORKERS,
+    ORDER_RATE_LIMIT, ORDER_RATE_WINDOW, ORDER_WORKERS, MARKET_RATE_LIMIT, MARKET_RATE_WINDOW, TICK_BUDGET
+)
+
+
+def _shard_worker(conn):
+    """策略进程：每个合约一个TradingStrategy，增量指标状态常驻进程内；
+    批次为{instId: (新增K线, 趋势过滤周期的K线, 基础周期)}"""
+    strategies = {}
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+        results = {}
+        for inst_id, (df, trend_frames, bar) in batch.items():
+            strategy = strategies.get(inst_id)
+            if strategy is None:
+                strategy = strategies[inst_id] = TradingStrategy()
+            try:
+                results[inst_id] = strategy.update_signals(df, trend_frames, bar)
+            except Exception as e:
+                results[inst_id] = {'error': str(e)}
+        conn.send(results)
+    conn.close()
+
+
+class StrategyShard:
+    """一个策略进程及其通信管道"""
+
+    def __init__(self, inst_ids):
+        self.inst_ids = inst_ids
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_shard_worker, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def submit(self, batch):
+        self.conn.send(batch)
+
+    def result(self):
+        return self.conn.recv()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(5)
+        self.conn.close()
+
+
+class StrategyPool:
+    """按合约分片到多个进程计算策略；同一合约始终由同一进程处理，每轮只传输新增K线"""
+
+    def __init__(self, inst_ids, workers=STRATEGY_WORKERS):
+        workers = max(1, min(workers, len(inst_ids)))
+        self.shards = [StrategyShard(inst_ids[i::workers]) for i in range(workers)]
+        self.shard_of = {inst_id: shard for shard in self.shards for inst_id in shard.inst_ids}
+        self._last_sent = {}
+
+    def evaluate(self, frames, trend_frames=None, bars=None):
+        """并行计算各合约最新信号，frames为{instId: K线DataFrame}；
+        trend_frames为{instId: {周期: K线DataFrame}}（策略的趋势过滤周期），bars为{instId: 基础周期}"""
+        batches = defaultdict(dict)
+        for inst_id, df in frames.items():
+            # 只发送上次已处理的最后一根K线及之后的数据，保留一根重叠K线用于衔接增量状态
+            last = self._last_sent.get(inst_id)
+            if last is not None:
+                df = df[df['timestamp'] >= last]
+            confirmed = df['timestamp'][df['confirm'] == '1']
+            if not confirmed.empty:
+                self._last_sent[inst_id] = confirmed.iloc[-1]
+            batches[self.shard_of[inst_id]][inst_id] = (
+                df, (trend_frames or {}).get(inst_id), (bars or {}).get(inst_id, '1m'))
+
+        for shard, batch in batches.items():
+            shard.submit(batch)
+        results = {}
+        for shard in batches:
+            results.update(shard.result())
+        return results
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+class ExecutionGateway:
+    """统一执行网关：所有合约的下单请求经同一个限速器和线程池，由订单管理器提交"""
+
+    def __init__(self, orders, limit=ORDER_RATE_LIMIT, window=ORDER_RATE_WINDOW, workers=ORDER_WORKERS):
+        self.orders = orders
+        self.limiter = RateLimiter(limit, window)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gateway')
+
+    def submit(self, inst_id, side, amount, stop_loss=None, take_profit=None, price=None, tag=None):
+        """提交下单意图，返回结果为订单的Future；price为None时下市价单，tag（信号所在K线）决定clOrdId"""
+        # 在调用方的上下文中执行，下单请求遵守调用方（本轮）的截止时间
+        return self.executor.submit(contextvars.copy_context().run, self._execute, inst_id, side, amount,
+                                    stop_loss, take_profit, price, tag)
+
+    def _execute(self, inst_id, side, amount, stop_loss, take_profit, price, tag):
+        self.limiter.acquire()
+        return self.orders.place(side, amount, price=price, stop_loss=stop_loss, take_profit=take_profit,
+                                 inst_id=inst_id, tag=tag)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class MultiSymbolBot:
+    """多合约交易机器人：共享一条行情推送和一个连接池，策略计算分片到多进程，下单经统一网关"""
+
+    def __init__(self, symbols=SYMBOLS, workers=STRATEGY_WORKERS):
+        self.symbols = list(symbols)
+        self.workers = workers
+        self.api = OKXAPI()
+        self.apis = {symbol: self.api.for_symbol(symbol, SYMBOL_TIMEFRAMES.get(symbol)) for symbol in self.symbols}
+        self.bars = {symbol: api.get_bar() for symbol, api in self.apis.items()}
+        self.strategy = TradingStrategy()
+        self.market_data = MarketDataState()
+        self.market_limiter = RateLimiter(MARKET_RATE_LIMIT, MARKET_RATE_WINDOW)
+        self.pool = None
+        self.feed = None
+        self.account = AccountState()
+        self.account_feed = None
+        # 全部合约共用一个订单表，私有频道的订单推送和对账都写入这里
+        self.orders = OrderManager(self.api)
+        self.account.order_listeners.append(self.orders.on_order)
+        self.gateway = ExecutionGateway(self.orders)
+        self.positions = {}
+        self.balance = None
+        # 所有合约共享同一个风控引擎（每日交易次数、账户杠杆）
+        self.risk = RiskEngine()
+        self._resync = True
+        self._bar_event = None
+        self.tick_started = None
+        self.metrics = []
+        # 各合约的时间周期可以不同，调度器在任一周期收盘时唤醒
+        self.clock = ServerClock(self.api)
+        self.scheduler = BarScheduler(self.clock, self.bars.values())
+        self.last_bar_ts = {}
+        self.logger = logging.getLogger(__name__)
+
+    def start_market_data(self, loop):
+        """启动一条覆盖全部合约的行情推送"""
+        self._bar_event = asyncio.Event()
+
+        def on_candle(inst_id, bar, row):
+            if inst_id in self.apis:
+                self.api.ingest_candles(bar, [row], inst_id=inst_id)
+                if row[8] == '1':
+                    loop.call_soon_threadsafe(self._bar_event.set)
+
+        def on_connect():
+            self._resync = True
+
+        self.market_data.candle_listeners.append(on_candle)
+        self.feed = MarketDataFeed(self.market_data, self.symbols, self.bars,
+                                   simulated=self.api.is_simulated, on_connect=on_connect)
+        self.feed.start()
+
+    def feed_ready(self):
+        return self.feed is not None and self.feed.connected
+
+    def start_account_feed(self):
+        """启动私有频道推送，全部合约的持仓和余额由同一条连接维护"""
+        self.account_feed = AccountFeed(self.account, self.api.ws_login_args, simulated=self.api.is_simulated)
+        self.account_feed.start()
+
+    def account_ready(self):
+        return (self.account_feed is not None and self.account_feed.connected
+                and not self.account.needs_reconcile())
+
+    async def load_account(self):
+        """持仓和余额：推送缓存可用时读缓存，否则（以及定期校准时）一次REST获取全部持仓并校准缓存"""
+        if not self.account_ready():
+            positions, balance = await asyncio.gather(
+                self.api.get_positions_async(), self.api.get_balance_async('USDT'))
+            self.account.reconcile({'USDT': balance}, positions)
+        return self.account.get_positions(), self.account.get_balance('USDT')
+
+    async def load_candles(self, symbols=None):
+        """获取合约K线（默认全部）：推送正常时读本地数据，否则限速并发REST增量拉取"""
+        if self.feed_ready() and not self._resync:
+            return {symbol: api.get_ohlcv(refresh=False) for symbol, api in self.apis.items()}
+        if symbols is None:
+            symbols = self.symbols
+            self._resync = False
+
+        async def fetch(api):
+            await self.market_limiter.acquire_async()
+            return await api.get_ohlcv_async()
+
+        frames = await asyncio.gather(*(fetch(self.apis[symbol]) for symbol in symbols))
+        return dict(zip(symbols, frames))
+
+    def new_bar_frames(self, frames):
+        """筛选出有新的已确认K线的合约，并向调度器报告各周期的确认进度"""
+        fresh = {}
+        progress = {}
+        for symbol, df in frames.items():
+            confirmed = df['timestamp'][df['confirm'] == '1']
+            if confirmed.empty:
+                continue
+            last = confirmed.iloc[-1].value // 10 ** 6
+            bar = self.bars[symbol]
+            # 同一周期以确认最慢的合约为准
+            progress[bar] = min(progress.get(bar, last), last)
+            if self.last_bar_ts.get(symbol) != last:
+                self.last_bar_ts[symbol] = last
+                fresh[symbol] = df
+        for bar, last in progress.items():
+            self.scheduler.confirm(bar, last)
+        return fresh
+
+    def trend_frames(self, symbol):
+        """合约由基础K线合成的趋势过滤周期K线，策略没有配置趋势过滤时为None"""
+        timeframes = self.strategy.trend_timeframes
+        return self.apis[symbol].get_frames(timeframes=timeframes) if timeframes else None
+
+    def handle_signal(self, symbol, current_price, latest):
+        """根据单个合约的信号生成下单意图并提交到执行网关"""
+        if latest is None or 'error' in latest:
+            if latest is not None:
+                self.logger.error(f"{symbol} 策略计算出错: {latest['error']}")
+            return None
+
+        position = self.positions.get(symbol)
+        contracts = float(position['pos'] or 0) if position is not None else 0.0
+        if latest['signal'] == 1 and contracts <= 0:
+            side = 'buy'
+            amount = self.strategy.calculate_position_size(
+                self.balance['available'], current_price, latest['signal_strength'])
+            stop_loss = self.strategy.calculate_stop_loss(current_price, side, latest['atr'])
+            take_profit = self.strategy.calculate_take_profit(current_price, side, latest['atr'])
+        elif latest['signal'] == -1 and contracts > 0:
+            side, amount, stop_loss, take_profit = 'sell', contracts, None, None
+        else:
+            return None
+
+        # 风控只读本地缓存：有推送时用最新成交价，否则用K线收盘价
+        ticker = self.market_data.get_ticker(symbol) if self.feed_ready() else None
+        market_price = float(ticker['last']) if ticker is not None else float(current_price)
+        if not self.risk.check(symbol, side, amount, market_price, self.positions, self.balance):
+            return None
+
+        # 有本地订单簿时按深度给出限价，滑点超限则放弃
+        price = None
+        book = self.market_data.get_book(symbol) if self.feed_ready() else None
+        if book is not None:
+            quote = book.quote(side, float(amount))
+            if quote is None or quote['slippage'] > MAX_SLIPPAGE:
+                self.logger.warning(f"{symbol} 流动性不足，放弃{side}订单")
+                return None
+            price = quote['price']
+
+        # 提交前预占当日交易次数，同一轮的多个信号不会合计超过上限；下单失败时归还
+        trade_day = self.risk.reserve_trade()
+        if trade_day is None:
+            self.logger.warning(f"{symbol} 达到每日最大交易次数限制，放弃{side}订单")
+            return None
+        self.logger.info(f"{symbol} 提交{side}订单: 数量 {amount}, 价格 {price or '市价'}, 止损 {stop_loss}, 止盈 {take_profit}")
+        future = self.gateway.submit(symbol, side, amount, stop_loss, take_profit, price, tag=self.last_bar_ts.get(symbol))
+        tick_started = self.tick_started
+        if tick_started is not None:
+            future.add_done_callback(lambda _: REGISTRY.observe(
+                'tick_to_order_seconds', time.perf_counter() - tick_started, inst_id=symbol))
+        future.add_done_callback(lambda done: self.on_order_done(symbol, side, trade_day, done))
+        return future
+
+    def on_order_done(self, symbol, side, trade_day, future):
+        """下单完成：失败时归还预占的交易次数"""
+        error = future.exception()
+        if error is not None:
+            self.logger.error(f"{symbol} {side}订单失败: {error}")
+            self.risk.release_trade(trade_day)
+            return
+        self.logger.info(f"{symbol} {side}订单已创建: {future.result()['clOrdId']}")
+
+    def maintain_orders(self):
+        """有未结束订单时定期与交易所挂单对账"""
+        try:
+            if self.orders.needs_reconcile():
+                self.orders.reconcile()
+        except Exception as e:
+            self.logger.error(f"订单对账出错: {e}")
+
+    async def tick(self, symbols=None):
+        """单轮：并发获取K线和账户数据，只对有新收盘K线的合约多进程计算信号，信号经网关下单"""
+        self.tick_started = time.perf_counter()
+        candles = asyncio.ensure_future(self.load_candles(symbols))
+        account = asyncio.ensure_future(self.load_account())
+        try:
+            frames = await candles
+        except Exception:
+            account.cancel()
+            raise
+
+        frames = self.new_bar_frames(frames)
+        signals = {}
+        if frames:
+            loop = asyncio.get_running_loop()
+            trend_frames = {symbol: self.trend_frames(symbol) for symbol in frames}
+            signals = await loop.run_in_executor(None, self.pool.evaluate, frames, trend_frames, self.bars)
+        self.positions, self.balance = await account
+
+        for symbol, latest in signals.items():
+            self.handle_signal(symbol, frames[symbol]['close'].iloc[-1], latest)
+        await asyncio.to_thread(self.maintain_orders)
+
+    def due_symbols(self, due):
+        """本次唤醒需要拉取K线的合约：推送正常时读本地数据，全部检查"""
+        if self.feed_ready() or self._resync:
+            return None
+        return [symbol for symbol in self.symbols if self.bars[symbol] in due]
+
+    async def wait_next_bar(self):
+        """等待到下一次K线收盘：有推送时收到收盘K线立即返回，超时则改用REST补齐"""
+        timeout = self.scheduler.wait_seconds()
+        if self.feed_ready():
+            try:
+                await asyncio.wait_for(self._bar_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                self._resync = True
+            self._bar_event.clear()
+        else:
+            await asyncio.sleep(timeout)
+        return self.scheduler.pop_due()
+
+    async def run(self):
+        """运行多合约机器人"""
+        self.logger.info(f"启动多合约交易机器人，合约数: {len(self.symbols)}")
+        try:
+            self.api.initialize()
+            if self.api.server_time is not None:
+                self.clock.adopt(*self.api.server_time)
+            # 其余合约的杠杆设置并发进行，元数据缓存有效期内直接跳过
+            others = [api for symbol, api in self.apis.items() if symbol != self.api.symbol]
+            list(self.gateway.executor.map(lambda api: api.set_leverage(), others))
+            self.pool = StrategyPool(self.symbols, self.workers)
+            self.metrics = start_metrics(self.logger)
+            if USE_PRIVATE_WEBSOCKET and API_KEY:
+                self.start_account_feed()
+            if USE_WEBSOCKET:
+                self.start_market_data(asyncio.get_running_loop())
+
+            symbols = None
+            while True:
+                if self.clock.stale:
+                    await self.clock.sync_async()
+                if symbols != []:
+                    try:
+                        with deadline_scope(TICK_BUDGET), REGISTRY.timer('tick_seconds'):
+                            await self.tick(symbols)
+                    except Exception as e:
+                        self.logger.error(f"主循环出错: {e}")
+
+                symbols = self.due_symbols(await self.wait_next_bar())
+
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            self.logger.info("收到停止信号，正在关闭机器人...")
+        except Exception as e:
+            self.logger.error(f"机器人运行出错: {e}")
+        finally:
+            if self.feed is not None:
+                self.feed.stop()
+            if self.account_feed is not None:
+                self.account_feed.stop()
+            if self.pool is not None:
+                self.pool.close()
+            self.gateway.close()
+            for service in self.metrics:
+                service.stop()
+            await self.api.async_transport.close()
+            self.logger.info("机器人已停止运行")
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(MultiSymbolBot().run())
@@ -1,25 +1,79 @@
-import ccxt
+import copy
+import hashlib
+import threading
+import logging
+import numpy as np
 import pandas as pd
 import time
 import os
-import hmac
-import base64
-import json
 import urllib3
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from config import API_KEY, SECRET_KEY, PASSPHRASE, SYMBOL, TIMEFRAME, LEVERAGE
+from config import (
+    API_KEY, SECRET_KEY, PASSPHRASE, SYMBOL, TIMEFRAME, LEVERAGE, DATA_DIR, CANDLE_BUFFER_SIZE, OKX_REST_URL,
+    RESAMPLE_TIMEFRAMES
+)
+from candle_store import CandleStore, parse_candles
+from candle_buffer import CandleBuffer
+from resample import Resampler, MONTH_SECONDS
+from history import HISTORY_PAGE_LIMIT
+from scheduler import bar_period
+from transport import HTTPTransport, AsyncHTTPTransport, RequestSigner, encode_request
+from retry import (
+    RetryPolicy, OKXAPIError, CircuitOpenError, is_ambiguous, new_client_order_id, request_timeout, error_reason
+)
+from metrics import REGISTRY
+from metadata_cache import MetadataCache
 
 # 禁用SSL警告
 urllib3.disable_warnings()
 
+logger = logging.getLogger(__name__)
+
+# 将时间周期转换为OKX API要求的格式
+TIMEFRAME_MAP = {
+    '1m': '1m',
+    '5m': '5m',
+    '15m': '15m',
+    '30m': '30m',
+    '1h': '1H',
+    '4h': '4H',
+    '1d': '1D',
+    '1w': '1W',
+    '1M': '1M'
+}
+
+# 最近K线和历史K线接口；/api/v5/market/candles 单次最多返回的K线数量
+CANDLES_ENDPOINT = '/api/v5/market/candles'
+HISTORY_CANDLES_ENDPOINT = '/api/v5/market/history-candles'
+CANDLES_PAGE_LIMIT = 300
+
+# 批量下单/撤单/改单单次最多的订单数量
+BATCH_ORDER_LIMIT = 20
+
+# 重复的clOrdId、订单不存在的错误码（幂等下单时查单用）
+DUPLICATE_CLORDID_CODE = '51016'
+ORDER_NOT_FOUND_CODE = '51603'
+
+# 批量接口的整批返回码：1全部失败，2部分成功，逐笔结果见data中的sCode
+BATCH_PARTIAL_CODES = ('1', '2')
+
+
+class OKXBatchError(Exception):
+    """批量请求中有订单失败，result为包含逐笔结果的完整响应"""
+
+    def __init__(self, result):
+        super().__init__(f"批量请求部分失败: {result.get('msg')}")
+        self.result = result
+
 class OKXAPI:
     def __init__(self):
         self.api_key = API_KEY
         self.secret_key = SECRET_KEY
         self.passphrase = PASSPHRASE
-        self.base_url = 'https://www.okx.com'  # 主API地址
-        self.simulated_url = 'https://www.okx.com'  # 模拟盘API地址
+        self.base_url = OKX_REST_URL  # 主API地址
+        self.simulated_url = OKX_REST_URL  # 模拟盘API地址
         self.is_simulated = True  # 设置为模拟盘模式
         
         # 配置代理（如果需要）
@@ -29,39 +83,91 @@ class OKXAPI:
         if os.getenv('HTTPS_PROXY'):
             self.proxies['https'] = os.getenv('HTTPS_PROXY')
 
-        # 配置ccxt
-        self.exchange = ccxt.okx({
-            'apiKey': self.api_key,
-            'secret': self.secret_key,
-            'password': self.passphrase,
-            'enableRateLimit': True,
-            'timeout': 30000,
-            'options': {
-                'defaultType': 'swap',
-                'adjustForTimeDifference': True,
-                'test': True,  # 设置为模拟盘模式
-            },
-            'urls': {
-                'api': {
-                    'rest': self.simulated_url,
-                    'fapiPublic': self.simulated_url,
-                    'fapiPrivate': self.simulated_url,
-                }
-            },
-            'headers': {
-                'Content-Type': 'application/json',
-                'OK-ACCESS-KEY': self.api_key,
-                'OK-ACCESS-PASSPHRASE': self.passphrase,
-                'x-simulated-trading': '1',  # 模拟盘标识
-            },
-            'proxies': self.proxies,
-        })
+        # ccxt客户端按需创建（见exchange），启动时不导入ccxt
+        self._exchange = None
         self.symbol = SYMBOL
         self.timeframe = TIMEFRAME
         self.leverage = LEVERAGE
-        self.max_retries = 5
-        self.retry_delay = 10
+        # 重试策略：错误分类 + 指数退避 + 截止时间，并按接口熔断
+        self.retry_policy = RetryPolicy()
         self.initialized = False
+        self.candle_store = CandleStore(os.path.join(DATA_DIR, 'candles'))
+        # 合约信息、杠杆设置、账户模式校验结果的磁盘缓存，重启后在有效期内不再请求
+        self.metadata_cache = MetadataCache()
+        # 初始化时取得的服务器时间 (发送时刻, 服务器毫秒, 接收时刻)，供时钟校准复用
+        self.server_time = None
+
+        # HTTP传输层：持久连接池 + 预编码密钥的签名器，请求头中固定部分只构建一次
+        self.signer = RequestSigner(self.secret_key)
+        self.transport = HTTPTransport(self.simulated_url, proxies=self.proxies)
+        self.async_transport = AsyncHTTPTransport(self.simulated_url, proxy=self.proxies.get('https'))
+        self._base_headers = {
+            'Content-Type': 'application/json',
+            'OK-ACCESS-KEY': self.api_key or '',
+            'OK-ACCESS-PASSPHRASE': self.passphrase or '',
+            'x-simulated-trading': '1',  # 模拟盘标识
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        # 内存K线环形缓冲区，按(instId, bar)区分，首次使用时从本地存储预加载
+        self.candle_buffers = {}
+        self._buffer_lock = threading.Lock()
+        # 每个(instId, bar)一把写入锁：WebSocket线程和主循环的REST补齐可能同时写入同一序列
+        self._ingest_locks = {}
+        # 由基础K线增量合成的高周期K线，按(instId, 基础bar)区分
+        self.resample_timeframes = RESAMPLE_TIMEFRAMES
+        self.resamplers = {}
+
+    @property
+    def exchange(self):
+        """ccxt客户端：机器人自身不使用，首次访问时才导入ccxt并创建"""
+        if self._exchange is None:
+            import ccxt
+            self._exchange = ccxt.okx({
+                'apiKey': self.api_key,
+                'secret': self.secret_key,
+                'password': self.passphrase,
+                'enableRateLimit': True,
+                'timeout': 30000,
+                'options': {
+                    'defaultType': 'swap',
+                    'adjustForTimeDifference': True,
+                    'test': True,  # 设置为模拟盘模式
+                },
+                'urls': {
+                    'api': {
+                        'rest': self.simulated_url,
+                        'fapiPublic': self.simulated_url,
+                        'fapiPrivate': self.simulated_url,
+                    }
+                },
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'OK-ACCESS-KEY': self.api_key,
+                    'OK-ACCESS-PASSPHRASE': self.passphrase,
+                    'x-simulated-trading': '1',  # 模拟盘标识
+                },
+                'proxies': self.proxies,
+            })
+        return self._exchange
+
+    def _cache_key(self, *parts):
+        """元数据缓存键：区分REST地址和API Key（只取哈希前缀）"""
+        account = hashlib.sha256(self.api_key.encode()).hexdigest()[:12] if self.api_key else 'public'
+        return '|'.join((self.base_url, account) + parts)
+
+    def set_base_url(self, url):
+        """切换REST地址（如本地模拟交易所），重建连接池"""
+        self.base_url = self.simulated_url = url
+        self.transport = HTTPTransport(url, proxies=self.proxies)
+        self.async_transport = AsyncHTTPTransport(url, proxy=self.proxies.get('https'))
+
+    def for_symbol(self, symbol, timeframe=None):
+        """返回交易指定合约的客户端，与当前实例共享连接池、签名器和K线存储，可单独指定时间周期"""
+        api = copy.copy(self)
+        api.symbol = symbol
+        if timeframe is not None:
+            api.timeframe = timeframe
+        return api
 
     def _get_timestamp(self):
         """生成ISO 8601标准UTC时间戳（含'Z'标识）"""
@@ -72,177 +178,294 @@ class OKXAPI:
         if body is None:
             body = ''
         elif isinstance(body, dict):
-            body = json.dumps(body)
+            body = encode_request('POST', request_path, body=body)[1]
         elif not isinstance(body, str):
             body = str(body)
-            
-        # 构建签名字符串
-        message = timestamp + method + request_path
+
+        # GET请求的查询串拼接在路径后参与签名
         if method == 'GET' and body:
-            message += '?' + body
-        else:
-            message += body
-            
-        # 生成签名
-        mac = hmac.new(bytes(self.secret_key, encoding='utf8'), 
-                      bytes(message, encoding='utf-8'), 
-                      digestmod='sha256')
-        return base64.b64encode(mac.digest()).decode('utf-8')
+            request_path += '?' + body
+            body = ''
+        return self.signer.sign(timestamp, method, request_path, body)
 
-    def _make_request(self, method, endpoint, params=None, body=None):
-        """直接发送请求到OKX API"""
-        # 使用模拟盘API地址
-        url = f"{self.simulated_url}{endpoint}"
+    def ws_login_args(self):
+        """私有WebSocket登录请求，时间戳为Unix秒"""
+        timestamp = str(int(time.time()))
+        return {'op': 'login', 'args': [{
+            'apiKey': self.api_key,
+            'passphrase': self.passphrase,
+            'timestamp': timestamp,
+            'sign': self.signer.sign(timestamp, 'GET', '/users/self/verify'),
+        }]}
+
+    def _prepare_request(self, method, endpoint, params=None, body=None):
+        """编码请求并生成签名头，请求体只序列化一次"""
+        request_path, payload = encode_request(method, endpoint, params, body)
         timestamp = self._get_timestamp()
-        
-        # 处理GET请求的查询参数
-        if method == 'GET' and params:
-            query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
-            sign = self._sign(timestamp, method, endpoint, query_string)
-        else:
-            sign = self._sign(timestamp, method, endpoint, body)
-        
-        headers = {
-            'Content-Type': 'application/json',
-            'OK-ACCESS-KEY': self.api_key,
-            'OK-ACCESS-SIGN': sign,
-            'OK-ACCESS-TIMESTAMP': timestamp,
-            'OK-ACCESS-PASSPHRASE': self.passphrase,
-            'x-simulated-trading': '1',  # 模拟盘标识
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+        headers = dict(self._base_headers)
+        headers['OK-ACCESS-SIGN'] = self.signer.sign(timestamp, method, request_path, payload)
+        headers['OK-ACCESS-TIMESTAMP'] = timestamp
+        return request_path, payload, headers
 
-        print(f"请求URL: {url}", f"请求方法: {method}", f"请求时间戳: {timestamp}", f"请求参数: {params}", f"请求体: {body}", f"请求头: {headers}")
-        
+    def _check_response(self, status, result, params=None, body=None):
+        """检查HTTP状态和OKX API的响应码"""
+        if not isinstance(result, dict) or 'code' not in result:
+            raise OKXAPIError(f"HTTP错误: {status}", status=status)
+        if result.get('code') in BATCH_PARTIAL_CODES and isinstance(body, list) and result.get('data'):
+            raise OKXBatchError(result)
+        if result.get('code') != '0':
+            error_msg = result.get('msg', '未知错误')
+            error_code = result.get('code', '未知错误码')
+            data = result.get('data')
+            if error_code == '1' and isinstance(data, list) and len(data) == 1 and data[0].get('sCode'):
+                # 单笔下单/撤单失败时整体返回码为1，具体原因在sCode中
+                error_code, error_msg = data[0]['sCode'], data[0].get('sMsg') or error_msg
+            logger.error(f"API错误: {error_msg} (错误码: {error_code})",
+                         extra={'code': error_code, 'params': params, 'body': body})
+            raise OKXAPIError(f"API错误: {error_msg}", code=error_code, status=status)
+        return result
+
+    def _open_circuit(self, endpoint):
+        """获取接口的熔断器，熔断中直接失败，不发送请求"""
+        breaker = self.retry_policy.breaker(endpoint)
+        if not breaker.allow():
+            REGISTRY.inc('circuit_rejections_total', endpoint=endpoint)
+            raise CircuitOpenError(f"接口熔断中: {endpoint}")
+        return breaker
+
+    def _make_request(self, method, endpoint, params=None, body=None):
+        """直接发送请求到OKX API（复用连接池），超时不超过当前调用的剩余时间"""
+        timeout = request_timeout(self.transport.timeout)
+        breaker = self._open_circuit(endpoint)
+        request_path, payload, headers = self._prepare_request(method, endpoint, params, body)
+        timing = {}
+        start = time.perf_counter()
         try:
-            if method == 'GET':
-                response = requests.get(url, params=params, headers=headers, proxies=self.proxies, verify=False, timeout=30)
-            else:
-                response = requests.post(url, json=body, headers=headers, proxies=self.proxies, verify=False, timeout=30)
-            
-            response.raise_for_status()
-            result = response.json()
-            print(f"请求结果: {result}")
-            
-            # 检查OKX API的响应码
-            if result.get('code') != '0':
-                error_msg = result.get('msg', '未知错误')
-                error_code = result.get('code', '未知错误码')
-                print(f"API错误: {error_msg} (错误码: {error_code})")
-                if params:
-                    print(f"请求参数: {params}")
-                if body:
-                    print(f"请求体: {body}")
-                raise Exception(f"API错误: {error_msg}")
-                
-            return result
-        except requests.exceptions.RequestException as e:
-            print(f"请求失败: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_response = e.response.json()
-                    print(f"错误响应: {error_response}")
-                except:
-                    print(f"响应内容: {e.response.text}")
+            status, result = self.transport.request(method, request_path, payload, headers,
+                                                    timeout=timeout, timing=timing)
+            result = self._check_response(status, result, params, body)
+        except Exception as e:
+            if isinstance(e, requests.exceptions.RequestException):
+                logger.warning(f"请求失败: {method} {endpoint} {e}")
+            self._record_request(breaker, endpoint, start, timing, e)
             raise
+        self._record_request(breaker, endpoint, start, timing)
+        return result
+
+    async def _make_request_async(self, method, endpoint, params=None, body=None):
+        """异步发送请求到OKX API，签名和编码与同步版本一致"""
+        timeout = request_timeout(self.async_transport.timeout)
+        breaker = self._open_circuit(endpoint)
+        request_path, payload, headers = self._prepare_request(method, endpoint, params, body)
+        timing = {}
+        start = time.perf_counter()
+        try:
+            status, result = await self.async_transport.request(method, request_path, payload, headers,
+                                                                timeout=timeout, timing=timing)
         except Exception as e:
-            print(f"处理响应时出错: {e}")
+            logger.warning(f"请求失败: {method} {endpoint} {e}")
+            self._record_request(breaker, endpoint, start, timing, e)
             raise
+        try:
+            result = self._check_response(status, result, params, body)
+        except Exception as e:
+            self._record_request(breaker, endpoint, start, timing, e)
+            raise
+        self._record_request(breaker, endpoint, start, timing)
+        return result
+
+    def _record_request(self, breaker, endpoint, start, timing, error=None):
+        """记录请求结果：更新熔断器，写入接口总耗时、分阶段耗时和错误计数"""
+        breaker.record(error)
+        REGISTRY.observe('http_request_seconds', time.perf_counter() - start, endpoint=endpoint)
+        for phase, seconds in timing.items():
+            REGISTRY.observe('http_phase_seconds', seconds, endpoint=endpoint, phase=phase)
+        if error is not None:
+            REGISTRY.inc('http_errors_total', endpoint=endpoint, reason=error_reason(error))
 
     def initialize(self):
-        """初始化交易所连接"""
-        if not self.initialized:
-            try:
-                # 测试网络连接
-                print("正在测试网络连接...")
-                if not self._test_connection():
-                    raise Exception("网络连接测试失败")
+        """初始化交易所连接：服务器时间（兼作网络连通性检查）、私有API、合约信息和杠杆设置相互独立，
+        并发进行；合约信息和杠杆设置在元数据缓存有效期内直接复用"""
+        if self.initialized:
+            return
+        start = time.perf_counter()
 
-                # 测试API连接
-                print("正在测试API连接...")
-                try:
-                    # 测试公共API
-                    print("测试公共API...")
-                    public_response = self._make_request('GET', '/api/v5/public/time')
-                    print(f"API时间: {public_response}")
-                    
-                    # 测试私有API
-                    print("测试私有API...")
-                    private_response = self._make_request('GET', '/api/v5/account/balance')
-                    print(f"账户信息: {private_response}")
-                    
-                    # 设置杠杆
-                    print("设置杠杆...")
-                    leverage_response = self._make_request('POST', '/api/v5/account/set-leverage', body={
-                        'instId': self.symbol,
-                        'lever': str(self.leverage),
-                        'mgnMode': 'cross'
-                    })
-                    print(f"杠杆设置: {leverage_response}")
-                    
-                    self.initialized = True
-                    print("交易所初始化成功")
-                except Exception as e:
-                    print(f"API错误: {e}")
-                    raise
-            except Exception as e:
-                print(f"初始化失败: {e}")
-                raise
+        def _server_time():
+            sent = time.time()
+            server_ms = self.get_server_time()
+            self.server_time = (sent, server_ms, time.time())
 
-    def _test_connection(self):
-        """测试网络连接"""
+        steps = {
+            '服务器时间': _server_time,
+            '私有API': lambda: self._make_request('GET', '/api/v5/account/balance'),
+            '合约信息': self.get_instrument,
+            '杠杆设置': self.set_leverage,
+        }
         try:
-            response = requests.get('https://www.okx.com', timeout=10, verify=False)
-            if response.status_code == 200:
-                print("网络连接正常")
-                return True
-            else:
-                print(f"网络连接异常，状态码: {response.status_code}")
-                return False
+            with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix='initialize') as pool:
+                futures = {name: pool.submit(step) for name, step in steps.items()}
+                for name, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"{name}检查失败: {e}")
+                        raise
         except Exception as e:
-            print(f"网络连接测试失败: {e}")
-            return False
+            logger.error(f"初始化失败: {e}")
+            raise
+        self.initialized = True
+        logger.info(f"交易所初始化成功，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
 
-    def get_ohlcv(self, limit=100):
-        """获取K线数据"""
-        def _fetch():
-            # 将时间周期转换为OKX API要求的格式
-            timeframe_map = {
-                '1m': '1m',
-                '5m': '5m',
-                '15m': '15m',
-                '30m': '30m',
-                '1h': '1H',
-                '4h': '4H',
-                '1d': '1D',
-                '1w': '1W',
-                '1M': '1M'
-            }
-            
-            bar = timeframe_map.get(self.timeframe)
-            if not bar:
-                raise ValueError(f"不支持的时间周期: {self.timeframe}")
-            
-            response = self._make_request('GET', '/api/v5/market/candles', params={
-                'instId': self.symbol,
-                'bar': bar,
-                'limit': limit
-            })
-            
-            ohlcv = response['data']
-            # 将字符串转换为数值类型
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'volCcy', 'volCcyQuote', 'confirm'])
-            
-            # 转换数据类型
-            df['timestamp'] = pd.to_datetime(df['timestamp'].astype('int64'), unit='ms')
-            df['open'] = df['open'].astype('float64')
-            df['high'] = df['high'].astype('float64')
-            df['low'] = df['low'].astype('float64')
-            df['close'] = df['close'].astype('float64')
-            df['volume'] = df['volume'].astype('float64')
-            
-            return df
-        return self._retry_on_failure(_fetch)
+    def get_ohlcv(self, limit=100, refresh=True):
+        """获取K线数据：已确认K线读自本地存储，refresh时只向交易所请求上次之后的新K线"""
+        bar = self.get_bar()
+        if refresh:
+            self._retry_on_failure(self._refresh_candles, bar, limit)
+        return self._load_ohlcv(bar, limit)
+
+    async def get_ohlcv_async(self, limit=100):
+        """异步增量拉取K线，返回与get_ohlcv相同的DataFrame"""
+        bar = self.get_bar()
+        await self._retry_on_failure_async(self._refresh_candles_async, bar, limit)
+        return self._load_ohlcv(bar, limit)
+
+    def _refresh_candles(self, bar, limit):
+        pages = self._candle_pages(bar, limit, self.candle_store.last_timestamp(self.symbol, bar))
+        endpoint, params = next(pages)
+        while True:
+            page = self._make_request('GET', endpoint, params=params)['data']
+            try:
+                endpoint, params = pages.send(page)
+            except StopIteration as done:
+                rows = done.value
+                break
+        # OKX按时间倒序返回，转换为时间正序
+        self.ingest_candles(bar, rows[::-1])
+
+    async def _refresh_candles_async(self, bar, limit):
+        pages = self._candle_pages(bar, limit, self.candle_store.last_timestamp(self.symbol, bar))
+        endpoint, params = next(pages)
+        while True:
+            response = await self._make_request_async('GET', endpoint, params=params)
+            try:
+                endpoint, params = pages.send(response['data'])
+            except StopIteration as done:
+                rows = done.value
+                break
+        self.ingest_candles(bar, rows[::-1])
+
+    def _candle_pages(self, bar, limit, last_ts):
+        """增量拉取K线的分页逻辑，同步和异步请求共用：逐页产出(接口, 请求参数)并接收该页数据，
+        结束时返回全部K线（时间倒序）。本地没有数据时只取最近limit根，否则分页拉取晚于last_ts的全部K线；
+        停机过久时/market/candles只能取到最近一段，最早一根之前的缺口改用/market/history-candles补齐"""
+        if last_ts is None:
+            return (yield CANDLES_ENDPOINT, self._candle_params(bar, limit))
+        period = (bar_period(bar) or MONTH_SECONDS) * 1000
+        endpoint, page_limit = CANDLES_ENDPOINT, CANDLES_PAGE_LIMIT
+        rows = []
+        after = None
+        while True:
+            page = yield endpoint, self._candle_params(bar, page_limit, last_ts, after)
+            rows.extend(page)
+            if len(page) == page_limit:
+                after = page[-1][0]
+                continue
+            if endpoint == HISTORY_CANDLES_ENDPOINT or not rows or int(rows[-1][0]) <= last_ts + period:
+                return rows
+            logger.warning(f"{self.symbol} {bar} K线在 {last_ts} 之后有缺口，从历史K线接口补齐")
+            endpoint, page_limit = HISTORY_CANDLES_ENDPOINT, HISTORY_PAGE_LIMIT
+            after = rows[-1][0]
+
+    def _candle_params(self, bar, limit, before=None, after=None):
+        params = {
+            'instId': self.symbol,
+            'bar': bar,
+            'limit': limit
+        }
+        if before is not None:
+            params['before'] = str(before)
+        if after is not None:
+            params['after'] = after
+        return params
+
+    def _load_ohlcv(self, bar, limit):
+        """从内存K线缓冲区返回最近limit根已确认K线，末尾附加未确认K线；没有未确认K线时各列为缓冲区的零拷贝视图"""
+        return self.candle_buffer(self.symbol, bar, limit).frame(limit)
+
+    def candle_buffer(self, inst_id, bar, min_capacity=0):
+        """获取(instId, bar)的K线缓冲区，不存在或容量不足时创建并从本地存储预加载"""
+        key = (inst_id, bar)
+        buffer = self.candle_buffers.get(key)
+        if buffer is not None and buffer.capacity >= min_capacity:
+            return buffer
+        with self._ingest_lock(inst_id, bar):
+            buffer = self.candle_buffers.get(key)
+            if buffer is None or buffer.capacity < min_capacity:
+                old = buffer
+                buffer = CandleBuffer(max(CANDLE_BUFFER_SIZE, min_capacity))
+                buffer.append(self.candle_store.read(inst_id, bar, buffer.capacity))
+                if old is not None and old._pending is not None:
+                    buffer.set_pending(old._pending)
+                self.candle_buffers[key] = buffer
+            return buffer
+
+    def resampler(self, inst_id, bar):
+        """获取(instId, 基础bar)的多周期合成器，首次使用时用本地存储的K线预热"""
+        key = (inst_id, bar)
+        resampler = self.resamplers.get(key)
+        if resampler is not None:
+            return resampler
+        with self._ingest_lock(inst_id, bar):
+            resampler = self.resamplers.get(key)
+            if resampler is None:
+                resampler = Resampler(bar, self.resample_timeframes)
+                rows = resampler.warmup_rows()
+                if rows:
+                    resampler.update(self.candle_store.read(inst_id, bar, rows))
+                self.resamplers[key] = resampler
+            return resampler
+
+    def get_frames(self, limit=100, timeframes=None):
+        """当前合约由基础K线合成的高周期K线 {周期: DataFrame}，不发起网络请求；timeframes为None时返回全部周期"""
+        return self.resampler(self.symbol, self.get_bar()).frames(limit, timeframes)
+
+    def get_bar(self):
+        """当前时间周期对应的OKX K线粒度"""
+        bar = TIMEFRAME_MAP.get(self.timeframe)
+        if not bar:
+            raise ValueError(f"不支持的时间周期: {self.timeframe}")
+        return bar
+
+    def ingest_candles(self, bar, rows, inst_id=None):
+        """写入按时间正序排列的原始K线（REST或WebSocket推送）：已确认K线落盘，未确认K线只保留在内存"""
+        inst_id = inst_id or self.symbol
+        columns, confirm = parse_candles(rows)
+        confirmed = confirm == '1'
+        if not confirmed.all():
+            pending = np.flatnonzero(~confirmed)[-1]
+            pending = {name: values[pending] for name, values in columns.items()}
+            columns = {name: values[confirmed] for name, values in columns.items()}
+        else:
+            pending = None
+        with self._ingest_lock(inst_id, bar):
+            buffer = self.candle_buffer(inst_id, bar)
+            resampler = self.resampler(inst_id, bar) if self.resample_timeframes else None
+            self.candle_store.append_columns(inst_id, bar, columns)
+            buffer.append(columns)
+            if pending is not None:
+                buffer.set_pending(pending)
+            if resampler is not None:
+                resampler.update(columns)
+                resampler.set_pending(pending)
+
+    def _ingest_lock(self, inst_id, bar):
+        """(instId, bar)的写入锁（可重入）：K线存储、缓冲区和多周期合成器的写入，以及缓冲区和合成器的创建都在锁内完成"""
+        key = (inst_id, bar)
+        lock = self._ingest_locks.get(key)
+        if lock is None:
+            with self._buffer_lock:
+                lock = self._ingest_locks.setdefault(key, threading.RLock())
+        return lock
 
     # def get_balance(self):
     #     """获取账户余额"""
@@ -256,85 +479,195 @@ class OKXAPI:
         """获取全币种或指定币种余额"""
         def _fetch():
             response = self._make_request('GET', '/api/v5/account/balance')
-            details = response['data'][0]['details']
-            balance_dict = {}
-            
-            # 遍历所有子账户的币种（网页3的账户结构说明）
-            for item in details:
-                ccy = item['ccy']  # 币种代码（如BTC、USDT）
-                avail = float(item['availBal'])  # 可用余额
-                frozen = float(item['frozenBal'])  # 冻结金额
-                total = avail + frozen
-                
-                # 按币种聚合数据（跨子账户合并）
-                if ccy not in balance_dict:
-                    balance_dict[ccy] = {'available': 0.0, 'frozen': 0.0}
-                balance_dict[ccy]['available'] += avail
-                balance_dict[ccy]['frozen'] += frozen
+            return self._parse_balance(response, ccy_filter)
+        return self._retry_on_failure(_fetch)
+
+    async def get_balance_async(self, ccy_filter=None):
+        """异步获取全币种或指定币种余额"""
+        async def _fetch():
+            response = await self._make_request_async('GET', '/api/v5/account/balance')
+            return self._parse_balance(response, ccy_filter)
+        return await self._retry_on_failure_async(_fetch)
+
+    def _parse_balance(self, response, ccy_filter=None):
+        details = response['data'][0]['details']
+        balance_dict = {}
+        
+        # 遍历所有子账户的币种（网页3的账户结构说明）
+        for item in details:
+            ccy = item['ccy']  # 币种代码（如BTC、USDT）
+            avail = float(item['availBal'])  # 可用余额
+            frozen = float(item['frozenBal'])  # 冻结金额
             
-            # 按条件过滤（如指定币种）
-            if ccy_filter:
-                return balance_dict.get(ccy_filter.upper(), {'available': 0.0, 'frozen': 0.0})
-            return balance_dict
+            # 按币种聚合数据（跨子账户合并）
+            if ccy not in balance_dict:
+                balance_dict[ccy] = {'available': 0.0, 'frozen': 0.0}
+            balance_dict[ccy]['available'] += avail
+            balance_dict[ccy]['frozen'] += frozen
         
-        return self._retry_on_failure(_fetch)
+        # 按条件过滤（如指定币种）
+        if ccy_filter:
+            return balance_dict.get(ccy_filter.upper(), {'available': 0.0, 'frozen': 0.0})
+        return balance_dict
+
+    def create_order(self, side, amount, price=None, stop_loss=None, take_profit=None, inst_id=None, cl_ord_id=None):
+        """创建订单（支持止盈止损）；重试时复用同一clOrdId，结果未知时先查单，避免重复下单"""
+        body = self._build_order(side, amount, price, stop_loss, take_profit, inst_id, cl_ord_id)
 
-    def create_order(self, side, amount, price=None, stop_loss=None, take_profit=None):
-        """创建订单（支持止盈止损）"""
         def _create():
-            # 1. 基础参数构建
-            body = {
-                'instId': self.symbol,
-                # 'tdMode': 'cross',  # 全仓模式
-                'tdMode': 'isolated', # 逐仓模式
-                'side': side,
-                'ordType': 'limit' if price else 'market',
-                'sz': f"{float(amount):.8f}".rstrip('0').rstrip('.')  # 避免科学计数法，保留最多8位小数
-            }
+            try:
+                return self._make_request('POST', '/api/v5/trade/order', body=body)
+            except Exception as e:
+                if not (is_ambiguous(e) or getattr(e, 'code', None) == DUPLICATE_CLORDID_CODE):
+                    raise
+                order = self._find_order(body['instId'], body['clOrdId'])
+                if order is None:
+                    raise
+                logger.warning(f"订单已被交易所接收: {body['clOrdId']}")
+                return {'code': '0', 'msg': '', 'data': [{
+                    'ordId': order.get('ordId', ''), 'clOrdId': body['clOrdId'], 'sCode': '0', 'sMsg': ''
+                }]}
+        return self._retry_on_failure(_create)
+
+    def _find_order(self, inst_id, cl_ord_id=None, ord_id=None):
+        """按clOrdId（或ordId）查询订单，订单不存在时返回None"""
+        params = {'instId': inst_id}
+        if ord_id:
+            params['ordId'] = ord_id
+        else:
+            params['clOrdId'] = cl_ord_id
+        try:
+            result = self._make_request('GET', '/api/v5/trade/order', params=params)
+        except OKXAPIError as e:
+            if e.code == ORDER_NOT_FOUND_CODE:
+                return None
+            raise
+        return result['data'][0] if result.get('data') else None
+
+    def _build_order(self, side, amount, price=None, stop_loss=None, take_profit=None, inst_id=None, cl_ord_id=None):
+        """构建下单请求体，附带客户端订单ID用于幂等"""
+        # 1. 基础参数构建
+        body = {
+            'instId': inst_id or self.symbol,
+            'clOrdId': cl_ord_id or new_client_order_id(),
+            # 'tdMode': 'cross',  # 全仓模式
+            'tdMode': 'isolated', # 逐仓模式
+            'side': side,
+            'ordType': 'limit' if price else 'market',
+            'sz': f"{float(amount):.8f}".rstrip('0').rstrip('.')  # 避免科学计数法，保留最多8位小数
+        }
+        if price:
+            body['px'] = f"{float(price):.8f}".rstrip('0').rstrip('.')  # 格式化价格
+        
+        # 2. 止盈止损逻辑修正
+        if stop_loss:
             if price:
-                body['px'] = f"{float(price):.8f}".rstrip('0').rstrip('.')  # 格式化价格
-            
-            # 2. 止盈止损逻辑修正
-            if stop_loss:
-                if price:
-                    # 限价止损单：委托价需低于触发价（卖出方向）或高于触发价（买入方向）
-                    sl_ord_px = (float(stop_loss) * 0.99) if side == 'sell' else (float(stop_loss) * 1.01)
-                    sl_ord_px = f"{sl_ord_px:.8f}".rstrip('0').rstrip('.')
-                else:
-                    # 市价止损单：必须用-1
-                    sl_ord_px = '-1'
-                body.update({
-                    'slTriggerPx': f"{float(stop_loss):.8f}".rstrip('0').rstrip('.'),
-                    'slOrdPx': sl_ord_px
-                })
-            
-            if take_profit:
-                if price:
-                    # 限价止盈单：委托价需高于触发价（卖出方向）或低于触发价（买入方向）
-                    tp_ord_px = (float(take_profit) * 1.01) if side == 'sell' else (float(take_profit) * 0.99)
-                    tp_ord_px = f"{tp_ord_px:.8f}".rstrip('0').rstrip('.')
-                else:
-                    # 市价止盈单：必须用-1
-                    tp_ord_px = '-1'
-                body.update({
-                    'tpTriggerPx': f"{float(take_profit):.8f}".rstrip('0').rstrip('.'),
-                    'tpOrdPx': tp_ord_px
+                # 限价止损单：委托价需低于触发价（卖出方向）或高于触发价（买入方向）
+                sl_ord_px = (float(stop_loss) * 0.99) if side == 'sell' else (float(stop_loss) * 1.01)
+                sl_ord_px = f"{sl_ord_px:.8f}".rstrip('0').rstrip('.')
+            else:
+                # 市价止损单：必须用-1
+                sl_ord_px = '-1'
+            body.update({
+                'slTriggerPx': f"{float(stop_loss):.8f}".rstrip('0').rstrip('.'),
+                'slOrdPx': sl_ord_px
+            })
+        
+        if take_profit:
+            if price:
+                # 限价止盈单：委托价需高于触发价（卖出方向）或低于触发价（买入方向）
+                tp_ord_px = (float(take_profit) * 1.01) if side == 'sell' else (float(take_profit) * 0.99)
+                tp_ord_px = f"{tp_ord_px:.8f}".rstrip('0').rstrip('.')
+            else:
+                # 市价止盈单：必须用-1
+                tp_ord_px = '-1'
+            body.update({
+                'tpTriggerPx': f"{float(take_profit):.8f}".rstrip('0').rstrip('.'),
+                'tpOrdPx': tp_ord_px
+            })
+        
+        # 3. 全仓模式预校验（防止错误码51010）
+        if body['tdMode'] == 'cross':
+            self._validate_account_mode('cross')
+        
+        return body
+
+    def place_orders(self, orders):
+        """批量下单：orders为下单意图列表（side、amount，可选price、stop_loss、take_profit、instId），
+        按交易所上限自动分批，返回与输入一一对应的逐笔结果"""
+        bodies = [self._build_order(
+            order['side'],
+            order['amount'],
+            order.get('price'),
+            order.get('stop_loss'),
+            order.get('take_profit'),
+            order.get('instId'),
+            order.get('clOrdId')
+        ) for order in orders]
+        # 每笔订单的clOrdId在重试间保持不变，结果未知时可以安全地重发整批：
+        # 上次已被接收的订单返回clOrdId重复，按clOrdId查单后视为成功
+        results = self._batch_request('/api/v5/trade/batch-orders', bodies)
+        for result in results:
+            if result['sCode'] != DUPLICATE_CLORDID_CODE:
+                continue
+            order = self._find_order(result['request']['instId'], result['request']['clOrdId'])
+            if order is not None:
+                logger.warning(f"订单已被交易所接收: {result['clOrdId']}")
+                result.update(ok=True, ordId=order.get('ordId', ''), sCode='0', sMsg='')
+        return results
+
+    def cancel_orders(self, orders):
+        """批量撤单：orders为订单ID或包含ordId/clOrdId（可选instId）的字典列表"""
+        bodies = []
+        for order in orders:
+            if not isinstance(order, dict):
+                order = {'ordId': order}
+            bodies.append({'instId': order.get('instId') or self.symbol,
+                           **{k: v for k, v in order.items() if k != 'instId'}})
+        return self._batch_request('/api/v5/trade/cancel-batch-orders', bodies)
+
+    def amend_orders(self, amendments):
+        """批量改单：amendments为包含ordId/clOrdId及newSz/newPx等字段的字典列表"""
+        bodies = [{'instId': amendment.get('instId') or self.symbol,
+                   **{k: v for k, v in amendment.items() if k != 'instId'}} for amendment in amendments]
+        return self._batch_request('/api/v5/trade/amend-batch-orders', bodies)
+
+    def _batch_request(self, endpoint, bodies):
+        """按BATCH_ORDER_LIMIT分批发送，OKX整批返回码为1（全部失败）或2（部分成功）时按sCode解析逐笔结果"""
+        results = []
+        for i in range(0, len(bodies), BATCH_ORDER_LIMIT):
+            chunk = bodies[i:i + BATCH_ORDER_LIMIT]
+
+            def _send():
+                try:
+                    return self._make_request('POST', endpoint, body=chunk)
+                except OKXBatchError as e:
+                    return e.result
+
+            response = self._retry_on_failure(_send)
+            data = response.get('data') or []
+            for j, body in enumerate(chunk):
+                item = data[j] if j < len(data) else {}
+                results.append({
+                    'ok': item.get('sCode') == '0',
+                    'ordId': item.get('ordId', ''),
+                    'clOrdId': item.get('clOrdId', body.get('clOrdId', '')),
+                    'sCode': item.get('sCode', response.get('code')),
+                    'sMsg': item.get('sMsg', response.get('msg', '')),
+                    'request': body,
                 })
-            
-            # 3. 全仓模式预校验（防止错误码51010）
-            if body['tdMode'] == 'cross':
-                self._validate_account_mode('cross')
-            
-            return self._make_request('POST', '/api/v5/trade/order', body=body)
-        return self._retry_on_failure(_create)
+        return results
 
     def _validate_account_mode(self, mode='cross'):
-        """验证账户模式是否匹配"""
+        """验证账户模式是否匹配，校验通过的结果写入元数据缓存"""
         if not hasattr(self, '_account_mode_verified'):
-            response = self._make_request('GET', '/api/v5/account/config')
-            current_mode = response['data'][0]['acctLv']
-            if current_mode != mode:
-                raise ValueError(f"Account mode must be {mode}, current is {current_mode}")
+            key = self._cache_key('account_mode', mode)
+            if self.metadata_cache.get(key) is None:
+                response = self._make_request('GET', '/api/v5/account/config')
+                current_mode = response['data'][0]['acctLv']
+                if current_mode != mode:
+                    raise ValueError(f"Account mode must be {mode}, current is {current_mode}")
+                self.metadata_cache.set(key, current_mode)
             self._account_mode_verified = True
 
     def cancel_order(self, order_id):
@@ -346,11 +679,28 @@ class OKXAPI:
             })
         return self._retry_on_failure(_cancel)
 
-    def get_open_orders(self):
+    def get_order(self, cl_ord_id=None, ord_id=None, inst_id=None):
+        """查询单个订单，订单不存在时返回None"""
+        return self._retry_on_failure(self._find_order, inst_id or self.symbol, cl_ord_id, ord_id)
+
+    def amend_order(self, cl_ord_id=None, ord_id=None, new_px=None, new_sz=None, inst_id=None):
+        """原地修改未完成订单的价格或数量（一次往返，不撤单重下）；改单是幂等的，可以安全重试"""
+        body = {'instId': inst_id or self.symbol}
+        if ord_id:
+            body['ordId'] = ord_id
+        else:
+            body['clOrdId'] = cl_ord_id
+        if new_px is not None:
+            body['newPx'] = f"{float(new_px):.8f}".rstrip('0').rstrip('.')
+        if new_sz is not None:
+            body['newSz'] = f"{float(new_sz):.8f}".rstrip('0').rstrip('.')
+        return self._retry_on_failure(self._make_request, 'POST', '/api/v5/trade/amend-order', body=body)
+
+    def get_open_orders(self, inst_id=None):
         """获取未完成订单"""
         def _fetch():
             return self._make_request('GET', '/api/v5/trade/orders-pending', params={
-                'instId': self.symbol
+                'instId': inst_id or self.symbol
             })
         return self._retry_on_failure(_fetch)
 
@@ -363,15 +713,64 @@ class OKXAPI:
             return response['data'][0] if response['data'] else None
         return self._retry_on_failure(_fetch)
 
+    async def get_position_async(self):
+        """异步获取当前持仓"""
+        async def _fetch():
+            response = await self._make_request_async('GET', '/api/v5/account/positions', params={
+                'instId': self.symbol
+            })
+            return response['data'][0] if response['data'] else None
+        return await self._retry_on_failure_async(_fetch)
+
+    def get_positions(self, inst_type='SWAP'):
+        """一次请求获取全部合约持仓，按instId索引"""
+        def _fetch():
+            response = self._make_request('GET', '/api/v5/account/positions', params={
+                'instType': inst_type
+            })
+            return {position['instId']: position for position in response['data']}
+        return self._retry_on_failure(_fetch)
+
+    async def get_positions_async(self, inst_type='SWAP'):
+        """异步获取全部合约持仓，按instId索引"""
+        async def _fetch():
+            response = await self._make_request_async('GET', '/api/v5/account/positions', params={
+                'instType': inst_type
+            })
+            return {position['instId']: position for position in response['data']}
+        return await self._retry_on_failure_async(_fetch)
+
     def set_leverage(self):
-        """设置杠杆倍数"""
+        """设置杠杆倍数；同一合约、倍数和保证金模式在元数据缓存有效期内已设置过时跳过，返回None"""
+        lever = str(int(self.leverage))  # 确保杠杆为字符串格式的整数
+        key = self._cache_key('leverage', self.symbol, 'cross')
+        if self.metadata_cache.get(key) == lever:
+            return None
+
         def _set():
             return self._make_request('POST', '/api/v5/account/set-leverage', body={
                 'instId': self.symbol,
-                'lever': str(int(self.leverage)),  # 确保杠杆为字符串格式的整数
+                'lever': lever,
                 'mgnMode': 'cross'
             })
-        return self._retry_on_failure(_set)
+        response = self._retry_on_failure(_set)
+        self.metadata_cache.set(key, lever)
+        return response
+
+    def get_instrument(self, inst_id=None, inst_type='SWAP'):
+        """合约信息（面值、下单数量和价格精度等），优先读元数据缓存"""
+        inst_id = inst_id or self.symbol
+        key = self._cache_key('instrument', inst_id)
+        instrument = self.metadata_cache.get(key)
+        if instrument is None:
+            def _fetch():
+                return self._make_request('GET', '/api/v5/public/instruments', params={
+                    'instType': inst_type,
+                    'instId': inst_id
+                })['data'][0]
+            instrument = self._retry_on_failure(_fetch)
+            self.metadata_cache.set(key, instrument)
+        return instrument
 
     def get_ticker(self):
         """获取当前行情"""
@@ -381,16 +780,30 @@ class OKXAPI:
             })
         return self._retry_on_failure(_fetch)
 
+    async def get_ticker_async(self):
+        """异步获取当前行情"""
+        async def _fetch():
+            return await self._make_request_async('GET', '/api/v5/market/ticker', params={
+                'instId': self.symbol
+            })
+        return await self._retry_on_failure_async(_fetch)
+
+    def get_server_time(self):
+        """获取交易所服务器时间（毫秒）"""
+        def _fetch():
+            return int(self._make_request('GET', '/api/v5/public/time')['data'][0]['ts'])
+        return self._retry_on_failure(_fetch)
+
+    async def get_server_time_async(self):
+        """异步获取交易所服务器时间（毫秒）"""
+        async def _fetch():
+            return int((await self._make_request_async('GET', '/api/v5/public/time'))['data'][0]['ts'])
+        return await self._retry_on_failure_async(_fetch)
+
     def _retry_on_failure(self, func, *args, **kwargs):
-        """重试机制"""
-        last_error = None
-        for i in range(self.max_retries):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                last_error = e
-                print(f"操作失败，{self.retry_delay}秒后重试... 错误: {e}")
-                time.sleep(self.retry_delay)
-        
-        if last_error:
-            raise last_error 
\ No newline at end of file
+        """重试机制：只重试网络、限流和服务端错误，指数退避，总耗时受截止时间限制"""
+        return self.retry_policy.call(func, *args, **kwargs)
+
+    async def _retry_on_failure_async(self, func, *args, **kwargs):
+        """异步重试机制，等待期间不阻塞事件循环"""
+        return await self.retry_policy.call_async(func, *args, **kwargs)
@@ -0,0 +1,226 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+from collections import OrderedDict
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from backtest import Backtester, load_candles
+from resample import resample_candles
+from strategy import TradingStrategy
+from config import SYMBOL, TIMEFRAME, STRATEGY_WORKERS
+
+# 默认搜索空间：config.py中的策略参数以及TradingStrategy中写死的MACD/ATR周期
+DEFAULT_SPACE = {
+    'rsi_period': [6, 9, 14],
+    'rsi_overbought': [70, 75, 80],
+    'rsi_oversold': [20, 25, 30],
+    'ma_period': [10, 20],
+    'ma_fast': [5, 10],
+    'ma_slow': [20, 30],
+    'macd_fast': [6, 12],
+    'macd_slow': [13, 26],
+    'macd_signal': [4, 9],
+    'atr_period': [7, 14],
+}
+
+# 共享内存中的K线列
+CANDLE_COLUMNS = (
+    ('timestamp', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+)
+
+# 排序时参数的先后顺序：计算代价高、可复用的指标参数在前，使同一批任务尽量共享指标
+REUSE_ORDER = ('atr_period', 'macd_fast', 'macd_slow', 'macd_signal', 'ma_period', 'ma_fast', 'ma_slow', 'rsi_period')
+
+
+def is_valid(params):
+    """过滤无意义的参数组合"""
+    return (params.get('ma_fast', 0) < params.get('ma_slow', 1) and
+            params.get('macd_fast', 0) < params.get('macd_slow', 1) and
+            params.get('rsi_oversold', 0) < params.get('rsi_overbought', 100))
+
+
+def grid_search(space):
+    """网格搜索：全部有效组合"""
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        params = dict(zip(names, values))
+        if is_valid(params):
+            yield params
+
+
+def random_search(space, samples, seed=None):
+    """随机搜索：从搜索空间中抽取不重复的有效组合"""
+    rng = random.Random(seed)
+    seen = set()
+    names = list(space)
+    attempts = 0
+    while len(seen) < samples and attempts < samples * 20:
+        attempts += 1
+        values = tuple(rng.choice(space[name]) for name in names)
+        params = dict(zip(names, values))
+        if values not in seen and is_valid(params):
+            seen.add(values)
+            yield params
+
+
+class SharedCandles:
+    """将K线数组放入一块共享内存，工作进程按名称映射，无需逐任务序列化"""
+
+    def __init__(self, df):
+        self.length = len(df)
+        arrays = []
+        for name, dtype in CANDLE_COLUMNS:
+            values = df[name].to_numpy()
+            if name == 'timestamp':
+                values = values.astype('datetime64[ms]').astype(np.int64)
+            arrays.append(np.ascontiguousarray(values, dtype=dtype))
+        size = sum(a.nbytes for a in arrays)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.layout = []
+        offset = 0
+        for (name, dtype), values in zip(CANDLE_COLUMNS, arrays):
+            np.ndarray(values.shape, dtype=dtype, buffer=self.shm.buf, offset=offset)[:] = values
+            self.layout.append((name, np.dtype(dtype).str, offset))
+            offset += values.nbytes
+
+    @property
+    def spec(self):
+        return self.shm.name, self.length, self.layout
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# 工作进程内的状态
+_worker = {}
+
+
+def _init_worker(spec, bar):
+    name, length, layout = spec
+    shm = shared_memory.SharedMemory(name=name)
+    columns = {}
+    for column, dtype, offset in layout:
+        columns[column] = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=offset)
+    df = pd.DataFrame({column: values for column, values in columns.items() if column != 'timestamp'}, copy=False)
+    df.insert(0, 'timestamp', pd.to_datetime(columns['timestamp'], unit='ms'))
+    _worker['shm'] = shm
+    _worker['df'] = df
+    _worker['bar'] = bar
+    _worker['cache'] = OrderedDict()
+
+
+def _cached(key, compute, max_entries=64):
+    """进程内指标缓存：共享子参数的组合复用同一份指标序列"""
+    cache = _worker['cache']
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = compute()
+    cache[key] = value
+    if len(cache) > max_entries:
+        cache.popitem(last=False)
+    return value
+
+
+def _indicators(strategy, df):
+    """按参数从缓存中组装指标列，与TradingStrategy.calculate_indicators一致"""
+    close, high, low = df['close'], df['high'], df['low']
+    out = df.copy(deep=False)
+    out['rsi'] = _cached(('rsi', strategy.rsi_period), lambda: strategy.calculate_rsi(close, strategy.rsi_period))
+    for column, period in (('ma', strategy.ma_period), ('ma_fast', strategy.ma_fast), ('ma_slow', strategy.ma_slow)):
+        out[column] = _cached(('ma', period), lambda: close.rolling(window=period).mean())
+    macd_key = ('macd', strategy.macd_fast, strategy.macd_slow, strategy.macd_signal)
+    macd, signal = _cached(macd_key, lambda: strategy.calculate_macd(
+        close, fast=strategy.macd_fast, slow=strategy.macd_slow, signal=strategy.macd_signal))
+    out['macd'] = macd
+    out['macd_signal'] = signal
+    out['macd_hist'] = _cached(macd_key + ('hist',), lambda: macd - signal)
+    volume_ma = _cached(('volume_ma', strategy.volume_ma_period),
+                        lambda: df['volume'].rolling(window=strategy.volume_ma_period).mean())
+    out['volume_ma'] = volume_ma
+    out['volume_ratio'] = _cached(('volume_ratio', strategy.volume_ma_period), lambda: df['volume'] / volume_ma)
+    out['atr'] = _cached(('atr', strategy.atr_period),
+                         lambda: strategy.calculate_atr(high, low, close, strategy.atr_period))
+    out['adx'] = _cached(('adx', strategy.atr_period),
+                         lambda: strategy.calculate_adx(high, low, close, strategy.atr_period))
+    return out
+
+
+def _evaluate_chunk(chunk):
+    df = _worker['df']
+    bar = _worker['bar']
+    rows = []
+    for params in chunk:
+        strategy = TradingStrategy()
+        for name, value in params.items():
+            setattr(strategy, name, value)
+        indicators = _indicators(strategy, df)
+        if strategy.trend_timeframes:
+            # 与Backtester.run一样由基础K线合成高周期K线，合成结果与参数无关，可在组合间复用
+            frames = {timeframe: _cached(('frame', timeframe), lambda t=timeframe: resample_candles(df, t, bar))
+                      for timeframe in strategy.trend_timeframes}
+            indicators = strategy.attach_timeframes(indicators, frames, bar)
+        signals = strategy.signals_from_indicators(indicators)
+        summary = Backtester(strategy, bar=bar).run(df, signals=signals).summary()
+        rows.append({**params, **summary})
+    return rows
+
+
+class Optimizer:
+    """参数寻优：多进程并行回测大量参数组合，K线通过共享内存传给工作进程"""
+
+    def __init__(self, df, workers=STRATEGY_WORKERS, chunk_size=16, bar='1m'):
+        self.df = df
+        self.bar = bar
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def run(self, combinations, sort_by='total_return'):
+        """回测全部组合，返回按sort_by降序排列的结果表"""
+        combinations = sorted(combinations, key=lambda p: tuple(p.get(name, 0) for name in REUSE_ORDER))
+        chunks = [combinations[i:i + self.chunk_size] for i in range(0, len(combinations), self.chunk_size)]
+        shared = SharedCandles(self.df)
+        try:
+            with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(shared.spec, self.bar)) as pool:
+                rows = [row for result in pool.imap_unordered(_evaluate_chunk, chunks) for row in result]
+        finally:
+            shared.close()
+        results = pd.DataFrame(rows)
+        if results.empty:
+            return results
+        return results.sort_values(sort_by, ascending=False).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="策略参数并行寻优")
+    parser.add_argument('--inst', default=SYMBOL, help="合约ID")
+    parser.add_argument('--bar', default=None, help="K线粒度，如1m、1H")
+    parser.add_argument('--mode', choices=('grid', 'random'), default='grid', help="搜索方式")
+    parser.add_argument('--samples', type=int, default=1000, help="随机搜索的组合数量")
+    parser.add_argument('--seed', type=int, default=None, help="随机搜索的随机种子")
+    parser.add_argument('--workers', type=int, default=STRATEGY_WORKERS, help="并行进程数")
+    parser.add_argument('--sort', default='total_return', help="结果排序字段")
+    parser.add_argument('--output', default=os.path.join('results', 'optimizer.csv'), help="结果表输出路径")
+    args = parser.parse_args()
+
+    if args.mode == 'grid':
+        combinations = list(grid_search(DEFAULT_SPACE))
+    else:
+        combinations = list(random_search(DEFAULT_SPACE, args.samples, args.seed))
+    print(f"参数组合数: {len(combinations)}")
+
+    from okx_api import TIMEFRAME_MAP
+    bar = args.bar or TIMEFRAME_MAP[TIMEFRAME]
+    results = Optimizer(load_candles(args.inst, bar), workers=args.workers, bar=bar).run(combinations, args.sort)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(results.head(20).to_string())
@@ -0,0 +1,281 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from metrics import REGISTRY
+from okx_api import DUPLICATE_CLORDID_CODE
+from retry import is_ambiguous, new_client_order_id
+from config import CLIENT_ORDER_PREFIX, ORDER_INDEX_SIZE, ORDER_RECONCILE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# 本地状态：已发出下单请求、交易所尚未确认；交易所明确拒绝
+STATE_SUBMITTING = 'submitting'
+STATE_REJECTED = 'rejected'
+
+# 仍可能成交的订单状态
+OPEN_STATES = (STATE_SUBMITTING, 'live', 'partially_filled')
+
+# clOrdId最长32位字母数字
+CLIENT_ORDER_ID_LENGTH = 32
+
+
+def client_order_id(inst_id, side, tag, seq=0, prefix=CLIENT_ORDER_PREFIX):
+    """由(合约, 方向, 标签, 序号)确定性生成clOrdId：同一交易意图（如同一根K线的信号）
+    无论重试还是重启后重新提交都得到相同的ID，交易所按clOrdId拒绝重复订单"""
+    digest = hashlib.sha256(f"{inst_id}|{side}|{tag}|{seq}".encode()).hexdigest()
+    return (prefix + digest)[:CLIENT_ORDER_ID_LENGTH]
+
+
+class OrderManager:
+    """订单管理：确定性clOrdId下单、按clOrdId和状态索引的内存订单表、原地改单、与orders-pending对账。
+    私有频道推送的订单更新通过on_order写入订单表，查询不需要请求交易所"""
+
+    def __init__(self, api, reconcile_interval=ORDER_RECONCILE_INTERVAL, history=ORDER_INDEX_SIZE):
+        self.api = api
+        self.reconcile_interval = reconcile_interval
+        self.orders = {}
+        self._states = defaultdict(set)
+        self._ord_ids = {}
+        # 已结束订单按结束顺序保留最近history笔
+        self._finished = deque()
+        self._history = history
+        # 请求尚未返回的订单（clOrdId）：交易所可能还没收到，对账时跳过
+        self._inflight = set()
+        self._lock = threading.RLock()
+        self.reconciled_at = None
+        # 订单变化的监听者（如交易日志），参数为合并后的订单
+        self.listeners = []
+
+    # ---- 订单表 ----
+
+    def _store(self, order):
+        """合并订单字段并更新状态索引，返回合并后的订单"""
+        key = order.get('clOrdId') or order['ordId']
+        with self._lock:
+            current = self.orders.get(key)
+            if current is not None:
+                self._states[current['state']].discard(key)
+                merged = {**current, **{k: v for k, v in order.items() if v != '' or k not in current}}
+            else:
+                merged = dict(order)
+            merged['clOrdId'] = merged.get('clOrdId') or ''
+            self.orders[key] = merged
+            self._states[merged['state']].add(key)
+            if merged.get('ordId'):
+                self._ord_ids[merged['ordId']] = key
+            if merged['state'] not in OPEN_STATES and (current is None or current['state'] in OPEN_STATES):
+                self._finished.append(key)
+                self._prune()
+            for listener in self.listeners:
+                listener(dict(merged))
+            return merged
+
+    def _prune(self):
+        while len(self._finished) > self._history:
+            key = self._finished.popleft()
+            order = self.orders.get(key)
+            if order is None or order['state'] in OPEN_STATES:
+                continue
+            del self.orders[key]
+            self._states[order['state']].discard(key)
+            self._ord_ids.pop(order.get('ordId'), None)
+
+    def get(self, cl_ord_id=None, ord_id=None):
+        """按clOrdId或ordId查询本地订单"""
+        with self._lock:
+            key = cl_ord_id if cl_ord_id else self._ord_ids.get(ord_id)
+            order = self.orders.get(key)
+            return dict(order) if order is not None else None
+
+    def by_state(self, *states):
+        """指定状态的订单"""
+        with self._lock:
+            return [dict(self.orders[key]) for state in states for key in self._states[state]]
+
+    def open_orders(self, inst_id=None):
+        """未结束的订单（含尚未确认的订单）"""
+        return [order for order in self.by_state(*OPEN_STATES) if inst_id is None or order['instId'] == inst_id]
+
+    def on_order(self, order):
+        """私有频道orders推送"""
+        self._store(order)
+
+    def restore(self, orders):
+        """从交易日志恢复订单表，未结束的订单在下次对账时与交易所核对"""
+        listeners, self.listeners = self.listeners, []
+        try:
+            for order in orders:
+                self._store(order)
+        finally:
+            self.listeners = listeners
+
+    # ---- 下单、改单、撤单 ----
+
+    def place(self, side, amount, price=None, stop_loss=None, take_profit=None, inst_id=None, tag=None, seq=0):
+        """下单：tag（如信号所在K线的时间戳）不为None时clOrdId由交易意图确定，
+        同一意图已经提交过则直接返回已有订单，不会重复下单"""
+        inst_id = inst_id or self.api.symbol
+        cl_ord_id = client_order_id(inst_id, side, tag, seq) if tag is not None else new_client_order_id()
+        with self._lock:
+            existing = self.orders.get(cl_ord_id)
+            if existing is not None and existing['state'] != STATE_REJECTED:
+                logger.warning(f"交易意图已提交过，不重复下单: {cl_ord_id}")
+                return dict(existing)
+            self._store({
+                'clOrdId': cl_ord_id, 'ordId': '', 'instId': inst_id, 'side': side, 'state': STATE_SUBMITTING,
+                'sz': str(amount), 'px': '' if price is None else str(price), 'submittedAt': time.time(),
+            })
+            self._inflight.add(cl_ord_id)
+
+        try:
+            response = self.api.create_order(side, amount, price=price, stop_loss=stop_loss,
+                                             take_profit=take_profit, inst_id=inst_id, cl_ord_id=cl_ord_id)
+        except Exception as e:
+            # 结果未知的保持submitting，等待推送或对账确定
+            if not is_ambiguous(e):
+                self._store({'clOrdId': cl_ord_id, 'state': STATE_REJECTED})
+            raise
+        finally:
+            with self._lock:
+                self._inflight.discard(cl_ord_id)
+
+        update = {'clOrdId': cl_ord_id, 'ordId': response['data'][0].get('ordId', '')}
+        with self._lock:
+            # 推送可能先于响应到达，只在仍未确认时标记为live
+            if self.orders[cl_ord_id]['state'] == STATE_SUBMITTING:
+                update['state'] = 'live'
+            return self._store(update)
+
+    def place_batch(self, intents, tag=None):
+        """批量下单：intents为下单意图列表（side、amount，可选price、stop_loss、take_profit、instId、seq），
+        tag不为None时每笔的clOrdId由(合约, 方向, tag, seq)确定（seq默认为在列表中的位置）；
+        订单先记为submitting再通过批量接口提交，返回与输入一一对应的逐笔结果，已提交过的意图不重复下单"""
+        results = [None] * len(intents)
+        pending = []
+        with self._lock:
+            for i, intent in enumerate(intents):
+                inst_id = intent.get('instId') or self.api.symbol
+                side = intent['side']
+                seq = intent.get('seq', i)
+                cl_ord_id = client_order_id(inst_id, side, tag, seq) if tag is not None else new_client_order_id()
+                existing = self.orders.get(cl_ord_id)
+                if existing is not None and existing['state'] != STATE_REJECTED:
+                    logger.warning(f"交易意图已提交过，不重复下单: {cl_ord_id}")
+                    results[i] = {'ok': False, 'ordId': existing['ordId'], 'clOrdId': cl_ord_id,
+                                  'sCode': DUPLICATE_CLORDID_CODE, 'sMsg': "交易意图已提交过",
+                                  'request': {'instId': inst_id, 'side': side, 'sz': str(intent['amount'])}}
+                    continue
+                price = intent.get('price')
+                self._store({
+                    'clOrdId': cl_ord_id, 'ordId': '', 'instId': inst_id, 'side': side, 'state': STATE_SUBMITTING,
+                    'sz': str(intent['amount']), 'px': '' if price is None else str(price), 'submittedAt': time.time(),
+                })
+                pending.append((i, {**intent, 'instId': inst_id, 'clOrdId': cl_ord_id}))
+                self._inflight.add(cl_ord_id)
+        if not pending:
+            return results
+
+        try:
+            responses = self.api.place_orders([intent for _, intent in pending])
+        except Exception as e:
+            if not is_ambiguous(e):
+                for _, intent in pending:
+                    self._store({'clOrdId': intent['clOrdId'], 'state': STATE_REJECTED})
+            raise
+        finally:
+            with self._lock:
+                self._inflight.difference_update(intent['clOrdId'] for _, intent in pending)
+
+        for (i, intent), result in zip(pending, responses):
+            cl_ord_id = intent['clOrdId']
+            with self._lock:
+                if result['ok']:
+                    update = {'clOrdId': cl_ord_id, 'ordId': result['ordId']}
+                    if self.orders[cl_ord_id]['state'] == STATE_SUBMITTING:
+                        update['state'] = 'live'
+                    self._store(update)
+                elif result['sCode'] != DUPLICATE_CLORDID_CODE:
+                    self._store({'clOrdId': cl_ord_id, 'state': STATE_REJECTED})
+                # clOrdId重复说明交易所已有该订单（如重启前已提交），保持submitting等待推送或对账
+            results[i] = result
+        return results
+
+    def _require(self, cl_ord_id):
+        order = self.get(cl_ord_id)
+        if order is None:
+            raise KeyError(f"未知订单: {cl_ord_id}")
+        return order
+
+    def amend(self, cl_ord_id, price=None, amount=None):
+        """原地修改未完成订单的价格或数量，一次往返，订单保留原clOrdId"""
+        order = self._require(cl_ord_id)
+        self.api.amend_order(cl_ord_id=cl_ord_id, new_px=price, new_sz=amount, inst_id=order['instId'])
+        update = {'clOrdId': cl_ord_id}
+        if price is not None:
+            update['px'] = str(price)
+        if amount is not None:
+            update['sz'] = str(amount)
+        return self._store(update)
+
+    def reprice(self, cl_ord_id, price):
+        """把挂单改到新价格（改单而不是撤单重下）"""
+        return self.amend(cl_ord_id, price=price)
+
+    def cancel(self, cl_ord_id):
+        """撤单，返回是否成功"""
+        order = self._require(cl_ord_id)
+        result = self.api.cancel_orders([{'instId': order['instId'], 'clOrdId': cl_ord_id}])[0]
+        if result['ok']:
+            self._store({'clOrdId': cl_ord_id, 'state': 'canceled'})
+        else:
+            logger.warning(f"撤单失败: {cl_ord_id} {result['sCode']} {result['sMsg']}")
+        return result['ok']
+
+    # ---- 对账 ----
+
+    def needs_reconcile(self):
+        """有未结束订单且距上次对账超过间隔"""
+        if not self.open_orders():
+            return False
+        return self.reconciled_at is None or time.monotonic() - self.reconciled_at >= self.reconcile_interval
+
+    def reconcile(self, inst_ids=None):
+        """与orders-pending对账：交易所的挂单写入订单表（包括本地未记录的），
+        本地认为未结束但交易所没有挂单的订单逐个查单确定最终状态，返回不一致的订单数量"""
+        if inst_ids is None:
+            inst_ids = {order['instId'] for order in self.open_orders()} | {self.api.symbol}
+        mismatched = 0
+        for inst_id in inst_ids:
+            pending = self.api.get_open_orders(inst_id)['data']
+            seen = set()
+            for order in pending:
+                key = order.get('clOrdId') or order['ordId']
+                seen.add(key)
+                current = self.get(key)
+                if current is None or current['state'] != order['state']:
+                    mismatched += 1
+                self._store(order)
+
+            for order in self.open_orders(inst_id):
+                key = order['clOrdId'] or order['ordId']
+                if key in seen or key in self._inflight:
+                    continue
+                mismatched += 1
+                found = self.api.get_order(cl_ord_id=order['clOrdId'] or None, ord_id=order['ordId'] or None,
+                                           inst_id=inst_id)
+                if found is not None:
+                    self._store(found)
+                elif order['state'] == STATE_SUBMITTING:
+                    # 交易所没有收到该订单
+                    self._store({'clOrdId': order['clOrdId'], 'ordId': order['ordId'], 'state': STATE_REJECTED})
+                else:
+                    logger.warning(f"订单在交易所不存在: {key}")
+                    self._store({'clOrdId': order['clOrdId'], 'ordId': order['ordId'], 'state': 'canceled'})
+
+        self.reconciled_at = time.monotonic()
+        if mismatched:
+            REGISTRY.inc('order_reconcile_mismatches_total', mismatched)
+            logger.warning(f"订单对账发现 {mismatched} 笔不一致，已按交易所校准")
+        return mismatched
@@ -0,0 +1,178 @@
+import threading
+import zlib
+from bisect import bisect_left
+
+# OKX校验和取买卖各前25档
+CHECKSUM_DEPTH = 25
+
+
+class OrderBookError(Exception):
+    """订单簿序列号不连续或校验和不一致，需要重新获取快照"""
+
+
+def checksum(bids, asks, depth=CHECKSUM_DEPTH):
+    """按OKX规则计算校验和：买卖档位交替拼接为 bidPx:bidSz:askPx:askSz:...，
+    一侧档位不足时只拼接另一侧，结果为有符号32位CRC32"""
+    parts = []
+    for i in range(depth):
+        if i < len(bids):
+            parts.extend(bids[i][:2])
+        if i < len(asks):
+            parts.extend(asks[i][:2])
+    crc = zlib.crc32(':'.join(parts).encode())
+    return crc - (1 << 32) if crc >= 1 << 31 else crc
+
+
+class BookSide:
+    """订单簿单边：价格有序的键列表（买盘取负价格）配合价格到档位的字典，
+    最优价O(1)，增删档位二分查找，按深度遍历不需要排序"""
+
+    def __init__(self, descending):
+        self.sign = -1.0 if descending else 1.0
+        self._keys = []
+        self._levels = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys.clear()
+        self._levels.clear()
+
+    def update(self, levels):
+        """应用档位变化[价格, 数量, ...]，数量为0表示删除该档"""
+        for level in levels:
+            px, sz = level[0], level[1]
+            price = float(px)
+            size = float(sz)
+            key = self.sign * price
+            if size == 0:
+                if self._levels.pop(key, None) is not None:
+                    del self._keys[bisect_left(self._keys, key)]
+                continue
+            if key not in self._levels:
+                self._keys.insert(bisect_left(self._keys, key), key)
+            # 保留原始字符串用于计算校验和
+            self._levels[key] = (px, sz, price, size)
+
+    def best(self):
+        if not self._keys:
+            return None
+        _, _, price, size = self._levels[self._keys[0]]
+        return price, size
+
+    def top(self, n=None):
+        """前n档原始数据 (px, sz, 价格, 数量)"""
+        keys = self._keys if n is None else self._keys[:n]
+        return [self._levels[key] for key in keys]
+
+    def walk(self, amount):
+        """按价格优先吃单amount，返回(成交均价, 最差成交价, 可成交数量)"""
+        remaining = amount
+        cost = 0.0
+        worst = None
+        for key in self._keys:
+            _, _, price, size = self._levels[key]
+            take = min(size, remaining)
+            cost += take * price
+            remaining -= take
+            worst = price
+            if remaining <= amount * 1e-9:
+                # 忽略浮点误差
+                remaining = 0.0
+                break
+        filled = amount - remaining
+        if filled <= 0:
+            return None, None, 0.0
+        return cost / filled, worst, filled
+
+
+class OrderBook:
+    """单个合约的本地L2订单簿：由books频道的快照和增量维护，校验序列号和CRC32，
+    校验失败时置为无效并抛出OrderBookError，等待新快照；可在任意线程查询"""
+
+    def __init__(self, inst_id):
+        self.inst_id = inst_id
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.seq_id = None
+        self.ts = None
+        self.valid = False
+        self._lock = threading.Lock()
+
+    def apply(self, action, data):
+        """应用一条推送：action为'snapshot'或'update'；books5等无action的推送视为完整快照"""
+        with self._lock:
+            if action == 'update':
+                if not self.valid:
+                    # 等待重新订阅后的快照
+                    return
+                prev = data.get('prevSeqId')
+                if prev is not None and int(prev) != self.seq_id:
+                    self.valid = False
+                    raise OrderBookError(f"{self.inst_id} 订单簿序列号不连续: {prev} != {self.seq_id}")
+            else:
+                self.bids.clear()
+                self.asks.clear()
+
+            self.bids.update(data.get('bids', ()))
+            self.asks.update(data.get('asks', ()))
+            if data.get('seqId') is not None:
+                self.seq_id = int(data['seqId'])
+            self.ts = int(data['ts']) if data.get('ts') else self.ts
+
+            expected = data.get('checksum')
+            if expected is not None:
+                actual = checksum(self.bids.top(CHECKSUM_DEPTH), self.asks.top(CHECKSUM_DEPTH))
+                if actual != int(expected):
+                    self.valid = False
+                    raise OrderBookError(f"{self.inst_id} 订单簿校验和不一致: {actual} != {expected}")
+            self.valid = True
+
+    def invalidate(self):
+        with self._lock:
+            self.valid = False
+
+    def _side(self, side):
+        # 买入吃卖盘，卖出吃买盘
+        return self.asks if side == 'buy' else self.bids
+
+    def best_bid(self):
+        """买一 (价格, 数量)"""
+        with self._lock:
+            return self.bids.best()
+
+    def best_ask(self):
+        """卖一 (价格, 数量)"""
+        with self._lock:
+            return self.asks.best()
+
+    def mid(self):
+        with self._lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return (bid[0] + ask[0]) / 2
+
+    def depth(self, side, levels=5):
+        """买盘('bids')或卖盘('asks')前levels档 [(价格, 数量)]"""
+        book_side = self.bids if side == 'bids' else self.asks
+        with self._lock:
+            return [(price, size) for _, _, price, size in book_side.top(levels)]
+
+    def walk(self, side, amount):
+        """按当前深度模拟吃单，返回(成交均价, 最差成交价, 可成交数量)"""
+        with self._lock:
+            return self._side(side).walk(amount)
+
+    def quote(self, side, amount):
+        """估算以amount数量立即成交的滑点和所需限价：
+        返回{'price': 可全部成交的限价, 'avg_price': 成交均价, 'slippage': 均价相对最优价的偏离}，深度不足时返回None"""
+        with self._lock:
+            book_side = self._side(side)
+            best = book_side.best()
+            avg, worst, filled = book_side.walk(amount)
+        if best is None or filled < amount:
+            return None
+        slippage = (avg - best[0]) / best[0] if side == 'buy' else (best[0] - avg) / best[0]
+        return {'price': worst, 'avg_price': avg, 'slippage': slippage}
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+import time
+
+
+class RateLimiter:
+    """令牌桶限速器：每window秒最多limit个请求，同步和异步调用共用同一个桶"""
+
+    def __init__(self, limit, window):
+        self.capacity = limit
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """预占一个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
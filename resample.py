@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from candle_buffer import CandleBuffer
+from candle_store import COLUMNS
+from scheduler import BAR_SECONDS, WEEK_ANCHOR, _parse_bar, bar_period
+from config import RESAMPLE_BUFFER_SIZE, RESAMPLE_WARMUP_BARS
+
+# 合成时求和的列，其余按开高低收聚合
+SUM_COLUMNS = ('volume', 'volCcy', 'volCcyQuote')
+
+# 月线按31天估算预热所需的基础K线数量
+MONTH_SECONDS = 31 * 86400
+
+
+def bar_start(bar, timestamps):
+    """各时间戳（毫秒）所在K线的开始时间（毫秒），与交易所的对齐方式一致"""
+    base, offset = _parse_bar(bar)
+    ts = np.asarray(timestamps, dtype=np.int64)
+    offset_ms = offset * 1000
+    if base == '1M':
+        months = (ts + offset_ms).astype('datetime64[ms]').astype('datetime64[M]')
+        return months.astype('datetime64[ms]').astype(np.int64) - offset_ms
+    period = BAR_SECONDS[base] * 1000
+    anchor = WEEK_ANCHOR * 1000 if base == '1W' else 0
+    return (ts + offset_ms - anchor) // period * period + anchor - offset_ms
+
+
+def bar_end(bar, timestamps):
+    """以timestamps为开始时间的K线的收盘时间（毫秒）"""
+    ts = np.asarray(timestamps, dtype=np.int64)
+    period = bar_period(bar)
+    if period is None:
+        return bar_start(bar, ts + MONTH_SECONDS * 1000)
+    return ts + period * 1000
+
+
+def can_resample(base_bar, bar):
+    """bar能否由base_bar合成：周期更长、为整数倍且对齐方式一致（月线视为按天对齐）"""
+    base = bar_period(base_bar)
+    if base is None:
+        return False
+    period = bar_period(bar) or 86400
+    shift = _parse_bar(bar)[1] - _parse_bar(base_bar)[1]
+    if period % base or shift % base:
+        return False
+    return bar_period(bar) is None or period > base
+
+
+def aggregate(columns, keys):
+    """按已排序的分组键（K线开始时间）聚合基础K线各列"""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    result = {
+        'timestamp': keys[starts],
+        'open': np.asarray(columns['open'])[starts],
+        'high': np.maximum.reduceat(np.asarray(columns['high']), starts),
+        'low': np.minimum.reduceat(np.asarray(columns['low']), starts),
+        'close': np.asarray(columns['close'])[ends],
+    }
+    for name in SUM_COLUMNS:
+        result[name] = np.add.reduceat(np.asarray(columns[name]), starts)
+    return result
+
+
+def _merge_row(first, second):
+    """合并同一根K线的前后两部分"""
+    row = {'timestamp': first['timestamp'], 'open': first['open'], 'close': second['close'],
+           'high': max(first['high'], second['high']), 'low': min(first['low'], second['low'])}
+    for name in SUM_COLUMNS:
+        row[name] = first[name] + second[name]
+    return row
+
+
+def resample_candles(df, bar, base_bar='1m'):
+    """把基础周期的K线DataFrame合成为bar周期（一次性计算，用于回测）；
+    只使用已确认的基础K线，最后一根没有走完的K线confirm为'0'"""
+    if 'confirm' in df.columns:
+        df = df[df['confirm'].astype(str) == '1']
+    ts = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    if not len(ts):
+        return pd.DataFrame({**{name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS}, 'confirm': []})
+    columns = {name: df[name].to_numpy(dtype=np.float64) for name in ('open', 'high', 'low', 'close', 'volume')}
+    for name in SUM_COLUMNS[1:]:
+        columns[name] = df[name].to_numpy(dtype=np.float64) if name in df.columns else np.zeros(len(ts))
+    result = aggregate(columns, bar_start(bar, ts))
+    closed = bar_start(bar, ts[-1] + bar_period(base_bar) * 1000) > result['timestamp'][-1]
+    confirm = np.full(len(result['timestamp']), '1', dtype='<U1')
+    if not closed:
+        confirm[-1] = '0'
+    frame = pd.DataFrame(result)
+    frame['timestamp'] = frame['timestamp'].to_numpy().view('datetime64[ms]')
+    frame['confirm'] = confirm
+    return frame
+
+
+class Resampler:
+    """由单一基础周期的已确认K线增量合成多个更高周期：每个周期保留一根进行中的K线，
+    走完后追加到该周期的内存缓冲区；基础周期的未确认K线并入进行中的K线作为未确认K线"""
+
+    def __init__(self, base_bar, bars, capacity=RESAMPLE_BUFFER_SIZE):
+        self.base_bar = base_bar
+        self.base_ms = bar_period(base_bar) * 1000
+        self.bars = [bar for bar in bars if can_resample(base_bar, bar)]
+        self.buffers = {bar: CandleBuffer(capacity) for bar in self.bars}
+        self._open = dict.fromkeys(self.bars)
+        self.last_timestamp = None
+
+    def warmup_rows(self, bars=RESAMPLE_WARMUP_BARS):
+        """预热最长周期的bars根K线所需的基础K线数量"""
+        if not self.bars:
+            return 0
+        longest = max(bar_period(bar) or MONTH_SECONDS for bar in self.bars)
+        return bars * longest * 1000 // self.base_ms
+
+    def update(self, columns):
+        """追加已确认的基础K线（各列数组，时间正序），不晚于已处理数据的行会被忽略，返回走完的高周期K线数量"""
+        ts = np.asarray(columns['timestamp'], dtype=np.int64)
+        if self.last_timestamp is not None:
+            start = int(np.searchsorted(ts, self.last_timestamp, side='right'))
+            ts = ts[start:]
+            columns = {name: np.asarray(values)[start:] for name, values in columns.items()}
+        if not len(ts) or not self.bars:
+            return 0
+        self.last_timestamp = int(ts[-1])
+
+        count = 0
+        for bar in self.bars:
+            result = aggregate(columns, bar_start(bar, ts))
+            current = self._open[bar]
+            if current is not None:
+                if result['timestamp'][0] == current['timestamp']:
+                    first = _merge_row(current, {name: values[0] for name, values in result.items()})
+                    for name, value in first.items():
+                        result[name][0] = value
+                else:
+                    # 缺少最后几根基础K线时，进行中的K线在下一根开始后视为走完
+                    result = {name: np.r_[current[name], values] for name, values in result.items()}
+            closed = bar_start(bar, self.last_timestamp + self.base_ms) > result['timestamp'][-1]
+            n = len(result['timestamp']) - (0 if closed else 1)
+            count += self.buffers[bar].append({name: values[:n] for name, values in result.items()})
+            self._open[bar] = None if closed else {name: values[-1] for name, values in result.items()}
+        self.set_pending(None)
+        return count
+
+    def set_pending(self, row):
+        """更新基础周期的未确认K线（各列数值），None表示没有未确认K线"""
+        for bar in self.bars:
+            current = self._open[bar]
+            if row is not None and row['timestamp'] > (self.last_timestamp or -1):
+                key = int(bar_start(bar, row['timestamp']))
+                pending = {name: row[name] for name, _ in COLUMNS}
+                pending['timestamp'] = key
+                if current is not None and current['timestamp'] == key:
+                    pending = _merge_row(current, pending)
+            else:
+                pending = current
+            if pending is not None:
+                self.buffers[bar].set_pending(pending)
+
+    def frames(self, limit=None, bars=None):
+        """{周期: K线DataFrame}，与get_ohlcv返回的格式相同；bars为None时返回全部周期"""
+        bars = self.buffers if bars is None else bars
+        return {bar: self.buffers[bar].frame(limit) for bar in bars}
+
@@ -0,0 +1,231 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+import requests
+from metrics import REGISTRY
+from config import (
+    RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, REQUEST_DEADLINE,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+# 可重试的HTTP状态码：超时、限流和服务端错误；其余4xx视为请求本身有误
+RETRYABLE_HTTP_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# 可重试的OKX错误码，其余错误码（参数错误、余额不足等）重试也不会成功
+RETRYABLE_CODES = {
+    '50001',  # 服务暂时不可用
+    '50004',  # 接口请求超时（请求可能已被处理）
+    '50011',  # 请求频率过高
+    '50013',  # 系统繁忙
+    '50026',  # 系统错误
+    '50061',  # 子账户请求频率过高
+}
+
+# 确定未被交易所处理的错误码：下单失败时无需查单确认
+REJECTED_CODES = {'50011', '50061'}
+
+# 最小请求超时（秒），剩余时间不足时直接判定超时
+MIN_REQUEST_TIMEOUT = 0.1
+
+# 当前调用链的截止时间（time.monotonic），线程和asyncio任务各自独立
+_deadline = contextvars.ContextVar('okx_deadline', default=None)
+
+
+class OKXAPIError(Exception):
+    """OKX接口返回的错误，code为OKX错误码，status为HTTP状态码"""
+
+    def __init__(self, message, code=None, status=None):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class CircuitOpenError(Exception):
+    """接口熔断中，请求未发送"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """调用已超过截止时间"""
+
+
+def is_retryable(error):
+    """判断错误是否值得重试：网络错误、超时、限流和服务端错误可重试，其余直接失败"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    if isinstance(error, OKXAPIError):
+        if error.code is not None:
+            return error.code in RETRYABLE_CODES
+        return error.status in RETRYABLE_HTTP_STATUS
+    network_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                      asyncio.TimeoutError, ConnectionError)
+    aiohttp = sys.modules.get('aiohttp')
+    if aiohttp is not None:
+        network_errors += (aiohttp.ClientConnectionError, aiohttp.ServerTimeoutError)
+    return isinstance(error, network_errors)
+
+
+def is_ambiguous(error):
+    """请求结果未知（可能已被交易所处理），下单时需要先按clOrdId查单再决定是否重发"""
+    if not is_retryable(error):
+        return False
+    return getattr(error, 'code', None) not in REJECTED_CODES
+
+
+def error_reason(error):
+    """错误的简短分类，用于指标标签：OKX错误码、HTTP状态码或异常类名"""
+    if getattr(error, 'code', None) is not None:
+        return error.code
+    if getattr(error, 'status', None) is not None:
+        return f"http_{error.status}"
+    return type(error).__name__
+
+
+def new_client_order_id():
+    """生成客户端订单ID（字母数字，32位），用于下单幂等"""
+    return uuid.uuid4().hex
+
+
+def remaining(default=None):
+    """当前调用链的剩余时间（秒），未设置截止时间时返回default"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    left = deadline - time.monotonic()
+    return left if default is None else min(default, left)
+
+
+def request_timeout(default):
+    """单次HTTP请求可用的超时时间，截止时间已过时抛出DeadlineExceeded"""
+    timeout = remaining(default)
+    if timeout < MIN_REQUEST_TIMEOUT:
+        raise DeadlineExceeded("已超过调用截止时间")
+    return timeout
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds):
+    """在with块内设置截止时间，嵌套时取更早者；交易循环用它限制每轮的总耗时"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(current, deadline)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+class CircuitBreaker:
+    """单个接口的熔断器：连续失败达到阈值后打开，冷却期后放行一次试探请求"""
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """是否放行请求；冷却期结束后放行一次试探，期间其余请求仍被拒绝"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.opened_at = now
+            return True
+
+    def record(self, error=None):
+        """记录一次请求结果：只有可重试的错误（网络、限流、服务端）计入失败"""
+        with self._lock:
+            if error is None or not is_retryable(error):
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """重试策略：按错误分类决定是否重试，指数退避加随机抖动，总耗时不超过截止时间；
+    同时持有各接口的熔断器"""
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY,
+                 max_delay=RETRY_MAX_DELAY, deadline=REQUEST_DEADLINE,
+                 breaker_threshold=CIRCUIT_FAILURE_THRESHOLD, breaker_reset=CIRCUIT_RESET_TIMEOUT):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, key):
+        """按接口路径获取熔断器"""
+        with self._lock:
+            breaker = self.breakers.get(key)
+            if breaker is None:
+                breaker = self.breakers[key] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return breaker
+
+    def backoff(self, attempt):
+        """第attempt次失败后的等待时间：指数增长并全量随机抖动，避免多个客户端同时重试"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _next_delay(self, attempt, error):
+        """返回下次重试前的等待时间，不应重试时返回None"""
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return None
+        delay = self.backoff(attempt)
+        if remaining(delay + MIN_REQUEST_TIMEOUT) < delay + MIN_REQUEST_TIMEOUT:
+            return None
+        return delay
+
+    def call(self, func, *args, deadline=None, **kwargs):
+        """同步调用func，失败时按策略重试"""
+        with deadline_scope(deadline or self.deadline):
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    delay = self._next_delay(attempt, e)
+                    if delay is None:
+                        raise
+                    REGISTRY.inc('retries_total', reason=error_reason(e))
+                    logger.warning(f"操作失败，{delay:.2f}秒后重试... 错误: {e}")
+                    time.sleep(delay)
+                    attempt += 1
+
+    async def call_async(self, func, *args, deadline=None, **kwargs):
+        """异步调用func，等待期间不阻塞事件循环"""
+        with deadline_scope(deadline or self.deadline):
+            attempt = 0
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    delay = self._next_delay(attempt, e)
+                    if delay is None:
+                        raise
+                    REGISTRY.inc('retries_total', reason=error_reason(e))
+                    logger.warning(f"操作失败，{delay:.2f}秒后重试... 错误: {e}")
+                    await asyncio.sleep(delay)
+                    attempt += 1
@@ -0,0 +1,161 @@
+import logging
+import threading
+from datetime import date, datetime
+from metrics import REGISTRY
+from config import MAX_DAILY_TRADES, PRICE_JUMP_LIMIT, MAX_ORDER_NOTIONAL, MAX_LEVERAGE, MAX_SYMBOL_EXPOSURE
+
+logger = logging.getLogger(__name__)
+
+# 拒绝原因代码
+REASON_DAILY_TRADES = 'daily_trades'      # 达到每日最大交易次数
+REASON_NO_PRICE = 'no_price'              # 没有可用的价格
+REASON_PRICE_JUMP = 'price_jump'          # 相对上次检查的价格波动过大
+REASON_NOTIONAL = 'order_notional'        # 单笔名义价值超限
+REASON_LEVERAGE = 'leverage'              # 下单后账户杠杆超限
+REASON_EXPOSURE = 'symbol_exposure'       # 下单后单合约敞口超限
+
+
+class RiskDecision:
+    """风控结果，可直接用作布尔值；被拒绝时reason为拒绝原因代码"""
+    __slots__ = ('ok', 'reason', 'message')
+
+    def __init__(self, ok, reason=None, message=''):
+        self.ok = ok
+        self.reason = reason
+        self.message = message
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        return 'RiskDecision(ok)' if self.ok else f"RiskDecision({self.reason}: {self.message})"
+
+
+ACCEPTED = RiskDecision(True)
+
+
+def _pos(position):
+    return float(position['pos'] or 0) if position is not None else 0.0
+
+
+def _notional(position, price=None):
+    """持仓名义价值：给定价格时按该价格计算，否则用推送中的notionalUsd或标记价格"""
+    if price is None:
+        if position.get('notionalUsd'):
+            return abs(float(position['notionalUsd']))
+        price = float(position.get('markPx') or position.get('avgPx') or 0)
+    return abs(_pos(position)) * price
+
+
+class RiskEngine:
+    """下单前风控：规则只读调用方传入的本地行情和账户缓存，不发起网络请求。
+    依次检查每日交易次数、价格跳变、单笔名义价值、单合约敞口和账户杠杆；
+    只减少持仓的订单不受敞口和杠杆限制。各上限为None时不检查"""
+
+    def __init__(self, max_daily_trades=MAX_DAILY_TRADES, price_jump=PRICE_JUMP_LIMIT, max_notional=MAX_ORDER_NOTIONAL,
+                 max_leverage=MAX_LEVERAGE, max_exposure=MAX_SYMBOL_EXPOSURE):
+        self.max_daily_trades = max_daily_trades
+        self.price_jump = price_jump
+        self.max_notional = max_notional
+        self.max_leverage = max_leverage
+        self.max_exposure = max_exposure
+        # 各合约上次检查时的价格，用于价格跳变检查
+        self.reference = {}
+        self.trades_today = 0
+        self.trade_day = None
+        self._lock = threading.Lock()
+
+    def _roll_day(self):
+        today = datetime.now().date()
+        if today != self.trade_day:
+            if self.trade_day is not None:
+                logger.info("新的一天开始，重置交易计数")
+            self.trade_day = today
+            self.trades_today = 0
+
+    def record_trade(self, count=1):
+        """记录成交的交易笔数，返回今日累计"""
+        with self._lock:
+            self._roll_day()
+            self.trades_today += count
+            return self.trades_today
+
+    def reserve_trade(self):
+        """预占一次当日交易次数（检查上限与计数在同一把锁内完成），成功返回预占所在的交易日，
+        达到上限时返回None；下单失败时用release_trade归还"""
+        with self._lock:
+            self._roll_day()
+            if self.max_daily_trades is not None and self.trades_today >= self.max_daily_trades:
+                return None
+            self.trades_today += 1
+            return self.trade_day
+
+    def release_trade(self, trade_day):
+        """归还reserve_trade预占的交易次数；已跨日时当天计数不受影响"""
+        with self._lock:
+            self._roll_day()
+            if trade_day == self.trade_day and self.trades_today > 0:
+                self.trades_today -= 1
+
+    def restore(self, trade_day, trades_today, reference):
+        """从交易日志恢复每日交易计数（trade_day为ISO日期）和各合约参考价"""
+        with self._lock:
+            self.trade_day = date.fromisoformat(trade_day) if trade_day else None
+            self.trades_today = trades_today
+            self.reference.update(reference)
+            self._roll_day()
+
+    def remaining_trades(self):
+        """今日剩余可交易次数，不限制时为None"""
+        if self.max_daily_trades is None:
+            return None
+        with self._lock:
+            self._roll_day()
+            return max(self.max_daily_trades - self.trades_today, 0)
+
+    def check(self, inst_id, side, amount, price, positions=None, balance=None):
+        """检查一笔订单：price为本地缓存的最新价，positions为{instId: 持仓}，
+        balance为保证金币种余额（为None时表示账户状态尚未加载，跳过杠杆检查）"""
+        decision = self._evaluate(inst_id, side, float(amount), price, positions or {}, balance)
+        if not decision:
+            REGISTRY.inc('risk_rejections_total', reason=decision.reason)
+            logger.warning(f"风控拒绝 {inst_id} {side} {amount}: {decision.message}",
+                           extra={'reason': decision.reason})
+        return decision
+
+    def _evaluate(self, inst_id, side, amount, price, positions, balance):
+        remaining = self.remaining_trades()
+        if remaining is not None and remaining <= 0:
+            return RiskDecision(False, REASON_DAILY_TRADES, "达到每日最大交易次数限制")
+        if price is None or not price > 0:
+            return RiskDecision(False, REASON_NO_PRICE, "没有可用的最新价")
+
+        with self._lock:
+            reference = self.reference.get(inst_id)
+            self.reference[inst_id] = price
+        if reference and self.price_jump is not None:
+            change = abs(price - reference) / reference
+            if change > self.price_jump:
+                return RiskDecision(False, REASON_PRICE_JUMP, f"价格波动过大: {change:.2%}")
+
+        notional = amount * price
+        if self.max_notional is not None and notional > self.max_notional:
+            return RiskDecision(False, REASON_NOTIONAL, f"名义价值 {notional:.2f} 超过上限 {self.max_notional}")
+
+        current = _pos(positions.get(inst_id))
+        after = current + amount if side == 'buy' else current - amount
+        if abs(after) <= abs(current):
+            return ACCEPTED
+
+        exposure = abs(after) * price
+        if self.max_exposure is not None and exposure > self.max_exposure:
+            return RiskDecision(False, REASON_EXPOSURE, f"持仓名义价值 {exposure:.2f} 超过上限 {self.max_exposure}")
+
+        if self.max_leverage is not None and balance is not None:
+            equity = balance['available'] + balance['frozen']
+            gross = exposure + sum(_notional(position) for other, position in positions.items()
+                                   if other != inst_id and position is not None)
+            if gross > equity * self.max_leverage:
+                leverage = gross / equity if equity > 0 else float('inf')
+                return RiskDecision(False, REASON_LEVERAGE, f"下单后杠杆 {leverage:.2f} 超过上限 {self.max_leverage}")
+        return ACCEPTED
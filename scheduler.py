@@ -0,0 +1,148 @@
+import logging
+import time
+from datetime import datetime, timezone
+from config import CLOCK_SYNC_INTERVAL, BAR_CLOSE_DELAY, BAR_CONFIRM_POLL, BAR_CONFIRM_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# K线粒度对应的周期（秒），月线按自然月计算
+BAR_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800,
+    '1H': 3600, '2H': 7200, '4H': 14400, '6H': 21600, '12H': 43200,
+    '1D': 86400, '1W': 604800, '1M': None,
+}
+
+# 不带utc后缀的K线按香港时间（UTC+8）对齐
+HK_OFFSET = 8 * 3600
+
+# 周线从周一开始，1970-01-01为周四
+WEEK_ANCHOR = 4 * 86400
+
+
+def _parse_bar(bar):
+    """返回(基础粒度, 时区偏移秒数)"""
+    base, offset = bar, HK_OFFSET
+    if bar.endswith('utc'):
+        base, offset = bar[:-3], 0
+    if base not in BAR_SECONDS:
+        raise ValueError(f"不支持的K线粒度: {bar}")
+    return base, offset
+
+
+def bar_period(bar):
+    """K线周期（秒），月线返回None"""
+    return BAR_SECONDS[_parse_bar(bar)[0]]
+
+
+def next_bar_close(bar, now):
+    """now（服务器时间，秒）之后最近的一个K线收盘时刻（秒）"""
+    base, offset = _parse_bar(bar)
+    local = now + offset
+    if base == '1M':
+        current = datetime.fromtimestamp(local, timezone.utc)
+        year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+        return datetime(year, month, 1, tzinfo=timezone.utc).timestamp() - offset
+    period = BAR_SECONDS[base]
+    anchor = WEEK_ANCHOR if base == '1W' else 0
+    return ((local - anchor) // period + 1) * period + anchor - offset
+
+
+class ServerClock:
+    """交易所服务器时钟：定期用/api/v5/public/time校准本地时钟偏差"""
+
+    def __init__(self, api, sync_interval=CLOCK_SYNC_INTERVAL):
+        self.api = api
+        self.sync_interval = sync_interval
+        self.offset = 0.0
+        self._synced_at = None
+
+    @property
+    def stale(self):
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.sync_interval
+
+    def _update(self, sent, server_ms, received):
+        # 以请求往返的中点作为服务器时间对应的本地时间
+        self.offset = server_ms / 1000 - (sent + received) / 2
+        self._synced_at = time.monotonic()
+        logger.debug(f"服务器时钟偏差: {self.offset * 1000:.1f}ms")
+
+    def adopt(self, sent, server_ms, received):
+        """用其他请求（如初始化时）取得的服务器时间校准，省去一次往返"""
+        self._update(sent, server_ms, received)
+
+    def sync(self):
+        """校准时钟，失败时保留上次的偏差"""
+        try:
+            sent = time.time()
+            server_ms = self.api.get_server_time()
+            self._update(sent, server_ms, time.time())
+        except Exception as e:
+            logger.warning(f"服务器时间校准失败: {e}")
+        return self.offset
+
+    async def sync_async(self):
+        """异步校准时钟"""
+        try:
+            sent = time.time()
+            server_ms = await self.api.get_server_time_async()
+            self._update(sent, server_ms, time.time())
+        except Exception as e:
+            logger.warning(f"服务器时间校准失败: {e}")
+        return self.offset
+
+    def now(self):
+        """当前服务器时间（秒）"""
+        return time.time() + self.offset
+
+
+class BarScheduler:
+    """按K线收盘时刻调度：多个粒度各自计算下一次收盘，收盘后delay秒唤醒；
+    唤醒后若交易所尚未给出该K线的确认数据，则每隔poll秒再次唤醒，直到确认或超过timeout"""
+
+    def __init__(self, clock, bars, delay=BAR_CLOSE_DELAY, poll=BAR_CONFIRM_POLL, timeout=BAR_CONFIRM_TIMEOUT):
+        self.clock = clock
+        self.bars = list(dict.fromkeys(bars))
+        self.delay = delay
+        self.poll = poll
+        self.timeout = timeout
+        now = clock.now()
+        self._next_close = {bar: next_bar_close(bar, now) for bar in self.bars}
+        # 已收盘但尚未确认的K线：bar -> 收盘时刻
+        self._awaiting = {}
+
+    def next_wake(self):
+        """下一次唤醒的服务器时间（秒）"""
+        wake = min(close + self.delay for close in self._next_close.values())
+        now = self.clock.now()
+        for bar, close in list(self._awaiting.items()):
+            if now - close > self.timeout:
+                logger.warning(f"{bar} K线收盘{self.timeout}秒后仍未确认")
+                del self._awaiting[bar]
+            else:
+                wake = min(wake, now + self.poll)
+        return wake
+
+    def wait_seconds(self):
+        """距下一次唤醒的秒数"""
+        return max(self.next_wake() - self.clock.now(), 0.0)
+
+    def pop_due(self):
+        """返回已到收盘时刻的粒度（含等待确认的粒度），并推进到下一次收盘"""
+        now = self.clock.now()
+        due = set(self._awaiting)
+        for bar, close in self._next_close.items():
+            if now >= close + self.delay:
+                self._awaiting[bar] = close
+                self._next_close[bar] = next_bar_close(bar, now)
+                due.add(bar)
+        return due
+
+    def confirm(self, bar, last_confirmed_ms):
+        """报告该粒度最新已确认K线的开盘时间（毫秒）；已覆盖最近一次收盘时返回True"""
+        close = self._awaiting.get(bar)
+        if close is None:
+            return True
+        if last_confirmed_ms is not None and next_bar_close(bar, last_confirmed_ms / 1000) >= close:
+            del self._awaiting[bar]
+            return True
+        return False
@@ -1,10 +1,19 @@
 import pandas as pd
 import numpy as np
+from indicators import IndicatorEngine
+from indicator_kernel import IndicatorKernel, OUTPUT_COLUMNS
+from metrics import REGISTRY
+from resample import bar_end
+from scheduler import bar_period
 from config import (
     RSI_PERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD,
-    MA_PERIOD, MA_FAST, MA_SLOW, STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT, POSITION_SIZE
+    MA_PERIOD, MA_FAST, MA_SLOW, STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT, POSITION_SIZE, TREND_TIMEFRAMES,
+    INDICATOR_BACKEND
 )
 
+# 附加到基础周期的高周期指标列，列名加上周期后缀，如 rsi_1H、trend_4H
+TIMEFRAME_COLUMNS = ('close', 'rsi', 'ma', 'ma_fast', 'ma_slow', 'macd_hist', 'atr', 'adx', 'trend')
+
 class TradingStrategy:
     def __init__(self):
         self.rsi_period = RSI_PERIOD
@@ -17,6 +26,14 @@ class TradingStrategy:
         self.take_profit = TAKE_PROFIT_PERCENT
         self.volume_ma_period = 10
         self.atr_period = 7
+        self.macd_fast = 6
+        self.macd_slow = 13
+        self.macd_signal = 4
+        self.trend_timeframes = list(TREND_TIMEFRAMES)
+        self.indicator_backend = INDICATOR_BACKEND
+        self.engine = None
+        # 增量模式下各高周期指标的缓存：{周期: (最后一根已确认K线的时间戳, 收盘时间, 指标列)}
+        self._timeframe_cache = {}
 
     def calculate_rsi(self, prices, period=14):
         """计算RSI"""
@@ -59,6 +76,9 @@ class TradingStrategy:
 
     def calculate_indicators(self, df):
         """计算技术指标"""
+        if self.indicator_backend == 'numpy':
+            return self.calculate_indicators_numpy(df)
+
         # RSI
         df['rsi'] = self.calculate_rsi(df['close'], self.rsi_period)
         
@@ -68,7 +88,7 @@ class TradingStrategy:
         df['ma_slow'] = df['close'].rolling(window=self.ma_slow).mean()
         
         # MACD
-        macd, signal = self.calculate_macd(df['close'], fast=6, slow=13, signal=4)
+        macd, signal = self.calculate_macd(df['close'], fast=self.macd_fast, slow=self.macd_slow, signal=self.macd_signal)
         df['macd'] = macd
         df['macd_signal'] = signal
         df['macd_hist'] = macd - signal
@@ -85,10 +105,61 @@ class TradingStrategy:
         
         return df
 
-    def generate_signals(self, df):
-        """生成交易信号"""
-        df = self.calculate_indicators(df)
-        
+    def calculate_indicators_numpy(self, df):
+        """用分块NumPy内核计算全部指标，结果与pandas实现一致，不产生中间Series"""
+        kernel = IndicatorKernel.from_strategy(self)
+        columns = kernel.run(df['high'].to_numpy(dtype=np.float64), df['low'].to_numpy(dtype=np.float64),
+                             df['close'].to_numpy(dtype=np.float64), df['volume'].to_numpy(dtype=np.float64))
+        for name in OUTPUT_COLUMNS:
+            df[name] = columns[name]
+        return df
+
+    def timeframe_indicators(self, frame, bar):
+        """计算一个高周期的指标（只用已确认K线），返回(各K线收盘时间毫秒, {带周期后缀的列: 数组})"""
+        if 'confirm' in frame.columns:
+            frame = frame[frame['confirm'].astype(str) == '1']
+        df = self.calculate_indicators(frame.copy())
+        trend_up = (df['ma_fast'] > df['ma_slow']) & (df['close'] > df['ma'])
+        trend_down = (df['ma_fast'] < df['ma_slow']) & (df['close'] < df['ma'])
+        df['trend'] = np.select([trend_up, trend_down], [1, -1], 0)
+        available = bar_end(bar, df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64))
+        return available, {f"{name}_{bar}": df[name].to_numpy(dtype=np.float64) for name in TIMEFRAME_COLUMNS}
+
+    def cached_timeframe_indicators(self, frame, bar):
+        """同timeframe_indicators，结果缓存到该周期出现新的已确认K线为止"""
+        confirmed = frame['timestamp'][frame['confirm'].astype(str) == '1'] if 'confirm' in frame.columns else frame['timestamp']
+        key = (len(confirmed), confirmed.iloc[-1] if len(confirmed) else None)
+        cached = self._timeframe_cache.get(bar)
+        if cached is None or cached[0] != key:
+            cached = (key,) + self.timeframe_indicators(frame, bar)
+            self._timeframe_cache[bar] = cached
+        return cached[1], cached[2]
+
+    def attach_timeframes(self, df, frames, bar='1m'):
+        """把高周期指标对齐到基础周期：每根基础K线只使用在其收盘时已经走完的高周期K线，不引入未来数据"""
+        closes = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64) + bar_period(bar) * 1000
+        for timeframe, frame in frames.items():
+            available, columns = self.timeframe_indicators(frame, timeframe)
+            index = np.searchsorted(available, closes, side='right') - 1
+            valid = index >= 0
+            for name, values in columns.items():
+                df[name] = np.where(valid, values[index], np.nan) if len(values) else np.nan
+        return df
+
+    def generate_signals(self, df, frames=None, bar='1m'):
+        """生成交易信号；frames为{周期: K线DataFrame}时附加高周期指标（bar为df的周期）"""
+        with REGISTRY.timer('signal_seconds', method='generate_signals'):
+            df = self.calculate_indicators(df)
+            if frames:
+                df = self.attach_timeframes(df, frames, bar)
+            return self.signals_from_indicators(df)
+
+    def trend_agrees(self, ind, direction):
+        """信号方向是否与trend_timeframes中各周期的趋势一致，缺少该周期指标时视为不一致"""
+        return all(ind.get(f"trend_{timeframe}") == direction for timeframe in self.trend_timeframes)
+
+    def signals_from_indicators(self, df):
+        """根据已计算好的指标列生成交易信号"""
         # 初始化信号列
         df['signal'] = 0
         df['signal_strength'] = 0
@@ -115,6 +186,12 @@ class TradingStrategy:
             trend_down                           # 下降趋势
         )
         
+        # 高周期趋势过滤
+        for timeframe in self.trend_timeframes:
+            trend = df[f"trend_{timeframe}"] if f"trend_{timeframe}" in df.columns else 0
+            buy_condition &= trend == 1
+            sell_condition &= trend == -1
+
         # 设置信号
         df.loc[buy_condition, 'signal'] = 1    # 1表示买入
         df.loc[sell_condition, 'signal'] = -1  # -1表示卖出
@@ -134,6 +211,62 @@ class TradingStrategy:
         
         return df
 
+    def evaluate_signal(self, ind):
+        """根据单根K线的指标计算信号和强度，逻辑与generate_signals一致"""
+        trend_up = ind['ma_fast'] > ind['ma_slow'] and ind['close'] > ind['ma']
+        trend_down = ind['ma_fast'] < ind['ma_slow'] and ind['close'] < ind['ma']
+
+        if (ind['rsi'] < self.rsi_oversold and ind['macd'] > ind['macd_signal'] and
+                ind['volume_ratio'] > 1.1 and ind['adx'] > 20 and trend_up and self.trend_agrees(ind, 1)):
+            strength = (
+                (self.rsi_oversold - ind['rsi']) / self.rsi_oversold * 0.4 +
+                (ind['volume_ratio'] - 1) * 0.3 +
+                (ind['adx'] - 20) / 80 * 0.3
+            )
+            return 1, strength
+
+        if (ind['rsi'] > self.rsi_overbought and ind['macd'] < ind['macd_signal'] and
+                ind['volume_ratio'] > 1.1 and ind['adx'] > 20 and trend_down and self.trend_agrees(ind, -1)):
+            strength = (
+                (ind['rsi'] - self.rsi_overbought) / (100 - self.rsi_overbought) * 0.4 +
+                (ind['volume_ratio'] - 1) * 0.3 +
+                (ind['adx'] - 20) / 80 * 0.3
+            )
+            return -1, strength
+
+        return 0, 0
+
+    def update_signals(self, df, frames=None, bar='1m'):
+        """增量更新指标：只把新增的已确认K线送入引擎，返回最新已确认K线的指标和信号；
+        frames为{周期: K线DataFrame}时附加最新已走完的高周期K线的指标"""
+        with REGISTRY.timer('signal_seconds', method='update_signals'):
+            if 'confirm' in df.columns:
+                df = df[df['confirm'].astype(str) == '1']
+            if df.empty:
+                return None
+
+            # 首次运行、引擎状态没有时间戳（由不带timestamp列的数据预热）或新数据与已有状态之间存在缺口时，
+            # 用完整历史重新预热
+            last = self.engine.last_timestamp if self.engine is not None else None
+            if last is None or 'timestamp' not in df.columns or df['timestamp'].iloc[0] > last:
+                self.engine = IndicatorEngine.from_strategy(self)
+                self.engine.warm_up(df)
+            else:
+                new_bars = df[df['timestamp'] > last]
+                if not new_bars.empty:
+                    self.engine.warm_up(new_bars)
+
+            latest = dict(self.engine.latest)
+            if frames:
+                close = pd.Timestamp(latest['timestamp']).value // 10 ** 6 + bar_period(bar) * 1000
+                for timeframe, frame in frames.items():
+                    available, columns = self.cached_timeframe_indicators(frame, timeframe)
+                    i = np.searchsorted(available, close, side='right') - 1
+                    for name, values in columns.items():
+                        latest[name] = values[i] if i >= 0 else np.nan
+            latest['signal'], latest['signal_strength'] = self.evaluate_signal(latest)
+            return latest
+
     def calculate_position_size(self, balance, current_price, signal_strength):
         """计算仓位大小"""
         base_size = balance * POSITION_SIZE  # 使用配置中的仓位大小
@@ -0,0 +1,180 @@
+import atexit
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from metrics import REGISTRY
+from config import (
+    API_KEY, SECRET_KEY, PASSPHRASE, LOG_FILE, LOG_LEVEL, LOG_QUEUE_SIZE,
+    LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_WHEN, LOG_SAMPLE_INTERVAL
+)
+
+# 控制台输出格式，与原有日志格式一致
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord的标准属性，其余属性视为通过extra传入的结构化字段
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+# 按字段名脱敏：请求头、签名、密钥、口令
+_SECRET_FIELD = re.compile(
+    r"""(['"]?\b(?:OK-ACCESS-(?:KEY|SIGN|PASSPHRASE)|api_?key|secret(?:_?key)?|passphrase|password|sign)['"]?\s*[:=]\s*)(['"]?)[^'",\s}]+""",
+    re.IGNORECASE
+)
+REDACTED = '***'
+
+
+class Redactor:
+    """日志脱敏：替换已知密钥的原值以及敏感字段名后的值"""
+
+    def __init__(self, secrets=(API_KEY, SECRET_KEY, PASSPHRASE)):
+        # 过短的值替换会误伤正常文本
+        self.secrets = sorted({s for s in secrets if s and len(s) >= 6}, key=len, reverse=True)
+
+    def __call__(self, text):
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, REDACTED)
+        return _SECRET_FIELD.sub(lambda m: m.group(1) + m.group(2) + REDACTED, text)
+
+    def redact_value(self, value):
+        if isinstance(value, str):
+            return self(value)
+        if isinstance(value, dict):
+            return {k: REDACTED if _SECRET_FIELD.match(f"{k}=x") else self.redact_value(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.redact_value(v) for v in value]
+        return value
+
+
+class RedactingFilter(logging.Filter):
+    """在写出前对消息和结构化字段脱敏"""
+
+    def __init__(self, redactor=None):
+        super().__init__()
+        self.redactor = redactor or Redactor()
+
+    def filter(self, record):
+        record.msg = self.redactor(record.getMessage())
+        record.args = None
+        for key, value in record_fields(record).items():
+            setattr(record, key, self.redactor.redact_value(value))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """高频事件采样：带extra={'sample': 键}的记录，每个键在interval秒内只保留一条，
+    保留的记录附带期间被丢弃的条数；WARNING及以上不采样"""
+
+    def __init__(self, interval=LOG_SAMPLE_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """单行JSON：时间、级别、模块、消息以及通过extra传入的字段"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def record_fields(record):
+    """通过extra传入的结构化字段"""
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS}
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """入队不阻塞：队列满时丢弃并计数，磁盘和控制台I/O由后台线程完成"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            REGISTRY.inc('log_dropped_total')
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, log_file=LOG_FILE, console=True):
+    """配置根日志：调用方只入队，后台线程负责脱敏、JSON格式化、按大小或时间轮转写文件以及控制台输出"""
+    global _listener
+    shutdown_logging()
+
+    redact = RedactingFilter()
+    handlers = []
+    if log_file:
+        if LOG_ROTATE_WHEN:
+            file_handler = TimedRotatingFileHandler(log_file, when=LOG_ROTATE_WHEN,
+                                                    backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        else:
+            file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES,
+                                               backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        file_handler.setFormatter(JSONFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+    for handler in handlers:
+        handler.addFilter(redact)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """停止后台线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,69 @@
+import numpy as np
+from backtest import Backtester
+from strategy import TradingStrategy
+from test_indicators import make_candles
+
+
+def reference_backtest(strategy, df, initial_balance, fee_rate, max_daily_trades):
+    """逐根K线的参考实现，用于校验向量化回测"""
+    signals = strategy.generate_signals(df.copy())
+    balance = initial_balance
+    position = None
+    counts = {}
+    trades = []
+    for j, row in enumerate(signals.itertuples()):
+        day = row.timestamp.date()
+        if position is not None:
+            entry, size, sl, tp = position
+            exit_price = None
+            if row.low <= sl:
+                exit_price = min(row.open, sl)
+            elif row.high >= tp:
+                exit_price = max(row.open, tp)
+            elif row.signal == -1 and counts.get(day, 0) < max_daily_trades:
+                exit_price = row.close
+                counts[day] = counts.get(day, 0) + 1
+            if exit_price is not None:
+                pnl = (exit_price - entry) * size - (entry + exit_price) * size * fee_rate
+                balance += pnl
+                trades.append(pnl)
+                position = None
+                if row.signal == -1:
+                    continue
+        if position is None and row.signal == 1 and counts.get(day, 0) < max_daily_trades and np.isfinite(row.atr):
+            size = strategy.calculate_position_size(balance, row.close, row.signal_strength)
+            position = (row.close, size,
+                        strategy.calculate_stop_loss(row.close, 'buy', row.atr),
+                        strategy.calculate_take_profit(row.close, 'buy', row.atr))
+            counts[day] = counts.get(day, 0) + 1
+    if position is not None:
+        entry, size, _, _ = position
+        close = signals['close'].iloc[-1]
+        trades.append((close - entry) * size - (entry + close) * size * fee_rate)
+    return trades
+
+
+class TestBacktester:
+    def test_matches_reference(self):
+        strategy = TradingStrategy()
+        strategy.rsi_oversold, strategy.rsi_overbought = 60, 40
+        df = make_candles(n=3000, seed=1)
+
+        result = Backtester(strategy, initial_balance=5000, fee_rate=0.0005, max_daily_trades=500).run(df)
+        expected = reference_backtest(strategy, df, 5000, 0.0005, 500)
+
+        assert len(result.trades) == len(expected) > 0
+        np.testing.assert_allclose(result.trades['pnl'], expected)
+        assert np.isclose(result.equity.iloc[-1], 5000 + sum(expected))
+
+    def test_daily_trade_limit(self):
+        strategy = TradingStrategy()
+        strategy.rsi_oversold, strategy.rsi_overbought = 60, 40
+        df = make_candles(n=3000, seed=1)
+
+        result = Backtester(strategy, max_daily_trades=3).run(df)
+        expected = reference_backtest(strategy, df, 5000, 0.0005, 3)
+        np.testing.assert_allclose(result.trades['pnl'], expected)
+        summary = result.summary()
+        assert summary['trades'] == len(expected)
+        assert 0 <= summary['max_drawdown'] < 1
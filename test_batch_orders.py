@@ -0,0 +1,98 @@
+import requests
+from okx_api import OKXAPI, OKXBatchError, BATCH_ORDER_LIMIT
+from retry import RetryPolicy
+
+
+class FakeExchange:
+    """按请求体逐笔返回结果，side为sell的订单失败"""
+
+    def __init__(self, api):
+        self.api = api
+        self.calls = []
+        self.accepted = {}
+        # 接下来几次请求处理完成后丢失响应（结果未知）
+        self.lost_responses = 0
+
+    def make_request(self, method, endpoint, params=None, body=None):
+        self.calls.append((endpoint, len(body)))
+        data = []
+        for i, order in enumerate(body):
+            failed = order.get('side') == 'sell'
+            duplicate = order.get('clOrdId') in self.accepted
+            item = {
+                'ordId': '' if failed or duplicate else f"{len(self.calls)}-{i}",
+                'clOrdId': order.get('clOrdId', ''),
+                'sCode': '51008' if failed else '51016' if duplicate else '0',
+                'sMsg': '余额不足' if failed else 'clOrdId重复' if duplicate else '',
+            }
+            if item['sCode'] == '0' and item['clOrdId']:
+                self.accepted[item['clOrdId']] = item['ordId']
+            data.append(item)
+        if self.lost_responses:
+            self.lost_responses -= 1
+            raise requests.exceptions.ReadTimeout("响应超时")
+        codes = {item['sCode'] == '0' for item in data}
+        code = '0' if codes == {True} else '1' if codes == {False} else '2'
+        return self.api._check_response(200, {'code': code, 'msg': '', 'data': data}, params, body)
+
+
+class TestBatchOrders:
+    def make_api(self):
+        api = OKXAPI()
+        exchange = FakeExchange(api)
+        api._make_request = exchange.make_request
+        return api, exchange
+
+    def test_place_orders_chunks_and_aligns_results(self):
+        api, exchange = self.make_api()
+        orders = [{'side': 'sell' if i % 7 == 0 else 'buy', 'amount': 0.01 * (i + 1), 'stop_loss': 90000}
+                  for i in range(45)]
+        results = api.place_orders(orders)
+
+        assert exchange.calls == [('/api/v5/trade/batch-orders', BATCH_ORDER_LIMIT),
+                                  ('/api/v5/trade/batch-orders', BATCH_ORDER_LIMIT),
+                                  ('/api/v5/trade/batch-orders', 5)]
+        assert len(results) == len(orders)
+        for order, result in zip(orders, results):
+            assert result['ok'] == (order['side'] == 'buy')
+            assert result['request']['side'] == order['side']
+            assert result['request']['slTriggerPx'] == '90000'
+            assert result['request']['instId'] == api.symbol
+        assert results[0]['sCode'] == '51008' and results[0]['ordId'] == ''
+        assert results[1]['ordId'] == '1-1'
+
+    def test_ambiguous_batch_is_retried_without_duplicates(self):
+        api, exchange = self.make_api()
+        api.retry_policy = RetryPolicy(base_delay=0.01, max_delay=0.05)
+        api._find_order = lambda inst_id, cl_ord_id=None, ord_id=None: (
+            {'ordId': exchange.accepted[cl_ord_id], 'clOrdId': cl_ord_id} if cl_ord_id in exchange.accepted else None)
+        exchange.lost_responses = 1
+        orders = [{'side': 'buy', 'amount': 1, 'clOrdId': f"c{i}"} for i in range(3)] + [{'side': 'sell', 'amount': 1}]
+        results = api.place_orders(orders)
+
+        assert exchange.calls == [('/api/v5/trade/batch-orders', 4)] * 2
+        assert [r['ok'] for r in results] == [True, True, True, False]
+        assert [r['ordId'] for r in results[:3]] == ['1-0', '1-1', '1-2']
+        assert results[3]['sCode'] == '51008'
+
+    def test_cancel_and_amend(self):
+        api, exchange = self.make_api()
+        results = api.cancel_orders(['1', {'clOrdId': 'abc', 'instId': 'ETH-USDT-SWAP'}])
+        assert [r['ok'] for r in results] == [True, True]
+        assert results[1]['request'] == {'instId': 'ETH-USDT-SWAP', 'clOrdId': 'abc'}
+        assert results[0]['request'] == {'instId': api.symbol, 'ordId': '1'}
+
+        results = api.amend_orders([{'ordId': '1', 'newSz': '2'}])
+        assert exchange.calls[-1] == ('/api/v5/trade/amend-batch-orders', 1)
+        assert results[0]['ok']
+
+    def test_single_request_errors_still_raise(self):
+        api = OKXAPI()
+        try:
+            api._check_response(200, {'code': '1', 'msg': 'failed', 'data': [{'sCode': '1'}]}, body={'instId': 'x'})
+        except OKXBatchError:
+            assert False, "非批量请求不应返回逐笔结果"
+        except Exception as e:
+            assert 'API错误' in str(e)
+        else:
+            assert False, "返回码非0应抛出异常"
@@ -0,0 +1,32 @@
+import time
+from benchmark import measure, compare, run, save, load, synthetic_candles, raw_candle_rows
+from candle_store import parse_candles
+
+
+class TestMeasure:
+    def test_calibrates_number_of_calls(self):
+        stats = measure(lambda: time.sleep(0.001), repeat=3, min_time=0.03)
+        assert stats['repeat'] == 3 and stats['number'] >= 1
+        assert 0.0009 < stats['min'] <= stats['median'] <= stats['max']
+
+    def test_inputs(self):
+        df = synthetic_candles(50)
+        assert len(df) == 50 and (df['high'] >= df['low']).all()
+        columns, confirm = parse_candles(raw_candle_rows(10))
+        assert len(columns['close']) == 10 and (confirm == '1').all()
+
+
+class TestBaseline:
+    def test_compare_flags_regressions(self):
+        baseline = {'a': {'median': 1.0}, 'b': {'median': 1.0}, 'c': {'median': 1.0}}
+        results = {'a': {'median': 1.05}, 'b': {'median': 1.5}, 'c': {'median': 0.5}, 'd': {'median': 1.0}}
+        statuses = {name: status for name, _, _, _, status in compare(results, baseline, threshold=0.15)}
+        assert statuses == {'a': 'ok', 'b': 'regression', 'c': 'improved', 'd': 'new'}
+
+    def test_run_and_round_trip(self, tmp_path):
+        results = run(filter='api.', min_time=0.01)
+        assert set(results) == {'api.sign', 'api.prepare_request', 'api.make_request'}
+        path = tmp_path / 'baseline.json'
+        save(results, path)
+        assert load(path) == results
+        assert {status for *_, status in compare(results, load(path))} == {'ok'}
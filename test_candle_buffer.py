@@ -0,0 +1,78 @@
+import numpy as np
+from candle_buffer import CandleBuffer
+from candle_store import parse_candles
+from strategy import TradingStrategy
+from test_candle_store import make_rows, START, MINUTE
+
+
+def columns_for(start, count):
+    return parse_candles(make_rows(start, count, confirm_last=True)[::-1])[0]
+
+
+class TestCandleBuffer:
+    def test_wraparound_matches_latest_rows(self):
+        buffer = CandleBuffer(capacity=7)
+        expected = []
+        for i in range(0, 40, 3):
+            buffer.append(columns_for(START + i * MINUTE, 3))
+            expected.extend(START + (i + j) * MINUTE for j in range(3))
+            for limit in (1, 4, 7, None):
+                count = min(limit or 7, len(expected))
+                assert list(buffer.view(limit)['timestamp']) == expected[-count:]
+        assert buffer.last_timestamp == expected[-1]
+        # 重复和过期的K线被忽略
+        assert buffer.append(columns_for(START, 10)) == 0
+
+    def test_views_are_zero_copy_and_not_reallocated(self):
+        buffer = CandleBuffer(capacity=50)
+        buffer.append(columns_for(START, 30))
+        storage = buffer._data['close']
+        df = buffer.frame(20)
+        assert np.shares_memory(df['close'].to_numpy(), storage)
+        assert np.shares_memory(df['timestamp'].to_numpy(), buffer._data['timestamp'])
+        assert not buffer.view()['close'].flags.writeable
+
+        for i in range(30, 200):
+            buffer.append(columns_for(START + i * MINUTE, 1))
+        assert buffer._data['close'] is storage
+        assert len(buffer.frame()) == 50
+
+    def test_pending_candle(self):
+        buffer = CandleBuffer(capacity=5)
+        buffer.append(columns_for(START, 5))
+        pending = {name: values[-1] for name, values in columns_for(START + 5 * MINUTE, 1).items()}
+        buffer.set_pending(pending)
+
+        df = buffer.frame(3)
+        assert list(df['confirm']) == ['1', '1', '1', '0']
+        assert df['timestamp'].iloc[-1].value // 10 ** 6 == START + 5 * MINUTE
+        assert len(buffer.frame(3, pending=False)) == 3
+
+        # 同一根K线确认后不再作为未确认K线出现
+        buffer.append(columns_for(START + 5 * MINUTE, 1))
+        df = buffer.frame()
+        assert list(df['confirm']) == ['1'] * 5
+        assert df['timestamp'].iloc[-1].value // 10 ** 6 == START + 5 * MINUTE
+
+    def test_frame_with_pending_is_not_mutated_by_pushes(self):
+        buffer = CandleBuffer(capacity=5)
+        buffer.append(columns_for(START, 5))
+        pending = {name: values[-1] for name, values in columns_for(START + 5 * MINUTE, 1).items()}
+        buffer.set_pending(pending)
+        df = buffer.frame(3)
+        close = df['close'].iloc[-1]
+
+        buffer.set_pending({**pending, 'close': close + 100})
+        buffer.append(columns_for(START + 5 * MINUTE, 1))
+        assert df['close'].iloc[-1] == close
+        assert list(df['confirm']) == ['1', '1', '1', '0']
+        assert not np.shares_memory(df['close'].to_numpy(), buffer._data['close'])
+        assert np.shares_memory(buffer.frame(3, pending=False)['close'].to_numpy(), buffer._data['close'])
+
+    def test_strategy_runs_on_frame(self):
+        buffer = CandleBuffer(capacity=300)
+        buffer.append(columns_for(START, 300))
+        df = buffer.frame(200)
+        signals = TradingStrategy().generate_signals(df)
+        assert len(signals) == 200 and 'signal' in signals
+        assert TradingStrategy().update_signals(df)['timestamp'] == df['timestamp'].iloc[-1]
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import numpy as np
+from candle_store import CandleStore
+from okx_api import OKXAPI
+
+START = 1746587400000
+MINUTE = 60000
+
+
+def serve_candles(rows, params):
+    """按OKX的before/after/limit语义从时间倒序的K线中取一页"""
+    page = [row for row in rows if ('before' not in params or int(row[0]) > int(params['before']))
+            and ('after' not in params or int(row[0]) < int(params['after']))]
+    return page[:int(params['limit'])]
+
+
+def make_rows(start, count, confirm_last=False):
+    """生成OKX格式的K线（时间倒序），最新一根默认未确认"""
+    rows = []
+    for i in range(count):
+        ts = start + i * MINUTE
+        price = str(96000 + i)
+        rows.append([str(ts), price, price, price, price, '1.5', '0.1', '9600', '1'])
+    if not confirm_last:
+        rows[-1][8] = '0'
+    return rows[::-1]
+
+
+class TestCandleStore:
+    def test_append_and_reopen(self, tmp_path):
+        store = CandleStore(str(tmp_path))
+        rows = make_rows(START, 5, confirm_last=True)[::-1]
+        assert store.append('BTC-USDT-SWAP', '1m', rows) == 5
+        # 重复追加已存在的K线会被忽略
+        assert store.append('BTC-USDT-SWAP', '1m', rows) == 0
+
+        reopened = CandleStore(str(tmp_path))
+        columns = reopened.read('BTC-USDT-SWAP', '1m', limit=3)
+        assert list(columns['timestamp']) == [START + 2 * MINUTE, START + 3 * MINUTE, START + 4 * MINUTE]
+        assert reopened.last_timestamp('BTC-USDT-SWAP', '1m') == START + 4 * MINUTE
+
+    def test_truncated_write_is_repaired(self, tmp_path):
+        store = CandleStore(str(tmp_path))
+        store.append('BTC-USDT-SWAP', '1m', make_rows(START, 3, confirm_last=True)[::-1])
+        with open(store._path('BTC-USDT-SWAP', '1m', 'close'), 'ab') as f:
+            f.write(b'\x00' * 4)
+        assert len(store.read('BTC-USDT-SWAP', '1m')['close']) == 3
+
+
+class TestGetOhlcv:
+    def test_only_new_candles_are_requested(self, tmp_path):
+        api = OKXAPI()
+        api.candle_store = CandleStore(str(tmp_path))
+        requests = []
+        responses = [make_rows(START, 100), make_rows(START + 99 * MINUTE, 2)]
+
+        def fake_request(method, endpoint, params=None, body=None):
+            requests.append(params)
+            return {'code': '0', 'data': responses[len(requests) - 1]}
+
+        api._make_request = fake_request
+
+        df = api.get_ohlcv()
+        assert len(df) == 100
+        assert list(df['confirm'][-2:]) == ['1', '0']
+        assert df['timestamp'].is_monotonic_increasing
+
+        df = api.get_ohlcv()
+        assert requests[1]['before'] == str(START + 98 * MINUTE)
+        assert len(df) == 101
+        assert df['timestamp'].iloc[-2].value // 10 ** 6 == START + 99 * MINUTE
+        assert df['confirm'].iloc[-1] == '0'
+
+    def test_concurrent_ingest_stays_contiguous(self, tmp_path):
+        # WebSocket线程逐根推送，同时主循环用REST批量补齐同一段K线
+        api = OKXAPI()
+        api.candle_store = CandleStore(str(tmp_path))
+        rows = make_rows(START, 600, confirm_last=True)[::-1]
+
+        def push():
+            for row in rows:
+                api.ingest_candles('1m', [row])
+
+        def refresh():
+            for i in range(0, len(rows), 50):
+                api.ingest_candles('1m', rows[i:i + 50])
+
+        threads = [threading.Thread(target=push), threading.Thread(target=refresh)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = START + MINUTE * np.arange(600)
+        stored = api.candle_store.read('BTC-USDT-SWAP', '1m')
+        np.testing.assert_array_equal(stored['timestamp'], expected)
+        np.testing.assert_array_equal(stored['close'], 96000 + np.arange(600))
+        view = api.candle_buffer('BTC-USDT-SWAP', '1m').view()
+        np.testing.assert_array_equal(view['timestamp'], expected[-len(view['timestamp']):])
+        assert len(api.get_frames()['5m']) == 100
+
+    def test_sync_and_async_refresh_page_identically(self, tmp_path):
+        rows = make_rows(START, 700)
+        results = []
+        for name, run in (('sync', lambda api: api.get_ohlcv()), ('async', lambda api: asyncio.run(api.get_ohlcv_async()))):
+            api = OKXAPI()
+            api.candle_store = CandleStore(str(tmp_path / name))
+            api.candle_store.append('BTC-USDT-SWAP', '1m', make_rows(START, 50, confirm_last=True)[::-1])
+            requests = []
+
+            def fake_request(method, endpoint, params=None, body=None):
+                requests.append(params)
+                return {'code': '0', 'data': serve_candles(rows, params)}
+
+            async def fake_request_async(method, endpoint, params=None, body=None):
+                return fake_request(method, endpoint, params, body)
+
+            api._make_request = fake_request
+            api._make_request_async = fake_request_async
+            df = run(api)
+            results.append((requests, api.candle_store.read('BTC-USDT-SWAP', '1m')['timestamp'], df))
+
+        (sync_requests, sync_stored, sync_df), (async_requests, async_stored, async_df) = results
+        assert sync_requests == async_requests and len(sync_requests) == 3
+        np.testing.assert_array_equal(sync_stored, START + MINUTE * np.arange(699))
+        np.testing.assert_array_equal(async_stored, sync_stored)
+        assert sync_df.equals(async_df)
+
+    def test_gap_after_downtime_is_backfilled(self, tmp_path):
+        # 停机期间积累的K线超过/market/candles可取的范围，缺口由history-candles补齐
+        rows = make_rows(START, 2000)
+        api = OKXAPI()
+        api.candle_store = CandleStore(str(tmp_path))
+        api.candle_store.append('BTC-USDT-SWAP', '1m', make_rows(START, 50, confirm_last=True)[::-1])
+        endpoints = []
+
+        def fake_request(method, endpoint, params=None, body=None):
+            endpoints.append(endpoint)
+            recent = rows[:1000] if endpoint == '/api/v5/market/candles' else rows[1:]
+            return {'code': '0', 'data': serve_candles(recent, params)}
+
+        api._make_request = fake_request
+        df = api.get_ohlcv()
+        stored = api.candle_store.read('BTC-USDT-SWAP', '1m')['timestamp']
+        np.testing.assert_array_equal(stored, START + MINUTE * np.arange(1999))
+        assert endpoints.count('/api/v5/market/candles') == 4
+        assert endpoints.count('/api/v5/market/history-candles') == 10
+        assert df['timestamp'].iloc[-1].value // 10 ** 6 == START + 1999 * MINUTE
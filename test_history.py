@@ -0,0 +1,112 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from candle_store import COLUMNS
+from exchange_sim import SimulatedExchange, ExchangeServer
+from history import partitions, merge_pages, HistoryStore, HistoryDownloader, load_history
+from okx_api import OKXAPI
+from retry import RetryPolicy
+from transport import RequestSigner
+
+SECRET = 'sim-secret'
+INST = 'BTC-USDT-SWAP'
+
+
+def ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def row(ts, close=1.0, confirm='1'):
+    return [str(ts), '1', '2', '0.5', str(close), '10', '1', '1', confirm]
+
+
+def columns(timestamps):
+    return {name: np.asarray(timestamps, dtype=dtype) for name, dtype in COLUMNS}
+
+
+@pytest.fixture
+def server():
+    server = ExchangeServer(SimulatedExchange(seed=1), secret=SECRET).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def api(server):
+    api = OKXAPI()
+    api.set_base_url(server.url)
+    api.signer = RequestSigner(SECRET)
+    api.retry_policy = RetryPolicy(base_delay=0.01, max_delay=0.05)
+    return api
+
+
+class TestPartitions:
+    def test_minute_bars_by_day(self):
+        parts = partitions('1m', ms(2025, 1, 1, 12), ms(2025, 1, 3, 1))
+        assert [name for name, _, _ in parts] == ['2025-01-01', '2025-01-02', '2025-01-03']
+        assert parts[0][1:] == (ms(2025, 1, 1), ms(2025, 1, 2))
+
+    def test_hour_bars_by_month(self):
+        parts = partitions('1H', ms(2024, 12, 15), ms(2025, 2, 1))
+        assert [name for name, _, _ in parts] == ['2024-12', '2025-01']
+        assert parts[-1][1:] == (ms(2025, 1, 1), ms(2025, 2, 1))
+
+
+class TestHistoryStore:
+    def test_roundtrip_and_range(self, tmp_path):
+        store = HistoryStore(str(tmp_path))
+        store.write(INST, '1m', '2025-01-02', columns([3, 4]))
+        store.write(INST, '1m', '2025-01-01', columns([1, 2]))
+        assert list(store.read(INST, '1m')['timestamp']) == [1, 2, 3, 4]
+        assert list(store.read(INST, '1m', 2, 4)['close']) == [2.0, 3.0]
+
+    def test_partial_replaced_when_complete(self, tmp_path):
+        store = HistoryStore(str(tmp_path))
+        store.write(INST, '1m', '2025-01-01', columns([1]), complete=False)
+        assert not store.has(INST, '1m', '2025-01-01')
+        assert list(store.read(INST, '1m')['timestamp']) == [1]
+        store.write(INST, '1m', '2025-01-01', columns([1, 2]))
+        assert store.has(INST, '1m', '2025-01-01')
+        assert os.listdir(os.path.dirname(store.path(INST, '1m', '2025-01-01'))) == ['2025-01-01.npz']
+
+    def test_load_history_dataframe(self, tmp_path):
+        HistoryStore(str(tmp_path)).write(INST, '1m', '2025-01-01', columns([ms(2025, 1, 1)]))
+        df = load_history(INST, '1m', root=str(tmp_path))
+        assert df['timestamp'][0] == np.datetime64('2025-01-01T00:00')
+        assert list(df.columns) == [name for name, _ in COLUMNS]
+
+
+class TestMergePages:
+    def test_dedupes_and_filters(self):
+        pages = [[row(300), row(200), row(100)], [row(200), row(100), row(0)], [row(400, confirm='0')]]
+        merged = merge_pages(pages, 100, 400)
+        assert list(merged['timestamp']) == [100, 200, 300]
+
+
+class TestHistoryDownloader:
+    def test_download_and_resume(self, api, server, tmp_path):
+        store = HistoryStore(str(tmp_path))
+        downloader = HistoryDownloader(api, store, limit=100, window=1, concurrency=4)
+        start, end = ms(2025, 1, 1), ms(2025, 1, 3)
+
+        async def download():
+            try:
+                return await downloader.download([INST, 'ETH-USDT-SWAP'], '5m', start, end)
+            finally:
+                await api.async_transport.close()
+
+        assert asyncio.run(download()) == 2 * 2 * 288
+        # 每天288根5分钟K线，每页最多100根
+        assert downloader.requests == 2 * 2 * 3
+        df = load_history(INST, '5m', root=str(tmp_path))
+        assert len(df) == 576
+        assert df['timestamp'].is_monotonic_increasing and df['timestamp'].is_unique
+        assert df['timestamp'].iloc[0] == np.datetime64('2025-01-01T00:00')
+
+        # 已完成的分区不再下载
+        downloader.requests = 0
+        assert asyncio.run(download()) == 0
+        assert downloader.requests == 0
+        assert server.exchange.requests['/api/v5/market/history-candles'] == 12
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from indicator_kernel import IndicatorKernel, allocate_outputs, OUTPUT_COLUMNS
+from strategy import TradingStrategy
+from test_indicators import make_candles
+
+
+def inputs(df):
+    return [df[name].to_numpy(dtype=np.float64) for name in ('high', 'low', 'close', 'volume')]
+
+
+def assert_matches(columns, expected):
+    for name in OUTPUT_COLUMNS:
+        np.testing.assert_allclose(columns[name], expected[name], rtol=1e-9, atol=1e-9,
+                                   equal_nan=True, err_msg=name)
+
+
+class TestIndicatorKernel:
+    @pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 16])
+    def test_matches_pandas(self, chunk_size):
+        strategy = TradingStrategy()
+        df = make_candles(n=700)
+        expected = strategy.calculate_indicators(df.copy())
+        columns = IndicatorKernel.from_strategy(strategy).run(*inputs(df), chunk_size=chunk_size)
+        assert_matches(columns, expected)
+
+    def test_memmap_input_and_output(self, tmp_path):
+        strategy = TradingStrategy()
+        df = make_candles(n=500)
+        expected = strategy.calculate_indicators(df.copy())
+        arrays = []
+        for i, values in enumerate(inputs(df)):
+            path = tmp_path / f"in{i}.bin"
+            values.tofile(path)
+            arrays.append(np.memmap(path, dtype=np.float64, mode='r'))
+        out = allocate_outputs(len(df), str(tmp_path / 'out'))
+        IndicatorKernel.from_strategy(strategy).run(*arrays, out=out, chunk_size=128)
+        for values in out.values():
+            values.flush()
+        assert_matches({name: np.load(tmp_path / 'out' / f"{name}.npy") for name in OUTPUT_COLUMNS}, expected)
+
+    def test_numpy_backend_signals(self):
+        pandas_strategy = TradingStrategy()
+        numpy_strategy = TradingStrategy()
+        numpy_strategy.indicator_backend = 'numpy'
+        for strategy in (pandas_strategy, numpy_strategy):
+            strategy.rsi_oversold, strategy.rsi_overbought = 60, 40
+        df = make_candles(n=400, seed=0)
+        expected = pandas_strategy.generate_signals(df.copy())
+        signals = numpy_strategy.generate_signals(df.copy())
+        assert (expected['signal'] != 0).any()
+        np.testing.assert_array_equal(signals['signal'], expected['signal'])
+        np.testing.assert_allclose(signals['signal_strength'], expected['signal_strength'], rtol=1e-9)
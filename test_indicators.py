@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from strategy import TradingStrategy
+from indicators import IndicatorEngine
+
+COLUMNS = ['rsi', 'ma', 'ma_fast', 'ma_slow', 'macd', 'macd_signal', 'macd_hist',
+           'volume_ma', 'volume_ratio', 'atr', 'adx']
+
+
+def make_candles(n=500, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 96000 + np.cumsum(rng.normal(0, 30, n))
+    # 插入一段横盘，覆盖除零和NaN传播的情况
+    close[200:230] = close[199]
+    high = close + rng.uniform(0, 20, n)
+    low = close - rng.uniform(0, 20, n)
+    high[200:230] = close[199]
+    low[200:230] = close[199]
+    volume = rng.uniform(1, 100, n)
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2025-05-07', periods=n, freq='min'),
+        'open': close,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+        'confirm': '1',
+    })
+
+
+class TestIndicatorEngine:
+    def test_matches_batch(self):
+        strategy = TradingStrategy()
+        df = make_candles()
+        batch = strategy.calculate_indicators(df.copy())
+
+        engine = IndicatorEngine.from_strategy(strategy)
+        rows = [engine.update(h, l, c, v) for h, l, c, v in
+                zip(df['high'], df['low'], df['close'], df['volume'])]
+        stream = pd.DataFrame(rows)
+
+        for column in COLUMNS:
+            np.testing.assert_allclose(stream[column], batch[column], rtol=1e-9, atol=1e-9,
+                                       equal_nan=True, err_msg=column)
+
+    def test_update_signals_matches_generate_signals(self):
+        # 放宽RSI阈值，让随机行情也能产生买卖信号
+        strategy = TradingStrategy()
+        strategy.rsi_oversold, strategy.rsi_overbought = 60, 40
+        df = make_candles(n=400, seed=0)
+        expected = strategy.generate_signals(df.copy())
+        assert (expected['signal'] != 0).any()
+
+        incremental = TradingStrategy()
+        incremental.rsi_oversold, incremental.rsi_overbought = 60, 40
+        for end in range(100, len(df) + 1):
+            latest = incremental.update_signals(df.iloc[end - 100:end])
+            assert latest['signal'] == expected['signal'].iloc[end - 1]
+            assert np.isclose(latest['signal_strength'], expected['signal_strength'].iloc[end - 1])
+
+    def test_engine_warmed_without_timestamps_is_rebuilt(self):
+        strategy = TradingStrategy()
+        df = make_candles(n=240)
+        strategy.engine = IndicatorEngine.from_strategy(strategy)
+        strategy.engine.warm_up(df.drop(columns='timestamp'))
+        latest = strategy.update_signals(df)
+        assert latest['timestamp'] == df['timestamp'].iloc[-1]
+        expected = TradingStrategy().update_signals(df)
+        assert np.isclose(latest['rsi'], expected['rsi']) and latest['signal'] == expected['signal']
+
+    def test_unconfirmed_bar_is_ignored(self):
+        strategy = TradingStrategy()
+        df = make_candles(n=240)
+        df.loc[df.index[-1], 'confirm'] = '0'
+        latest = strategy.update_signals(df)
+        assert latest['timestamp'] == df['timestamp'].iloc[-2]
@@ -0,0 +1,133 @@
+import os
+import pytest
+import main
+from candle_store import CandleStore
+from exchange_sim import SimulatedExchange, ExchangeServer
+from journal import Journal, read_segment, SNAPSHOT_FILE
+from main import TradingBot
+from metadata_cache import MetadataCache
+from retry import RetryPolicy
+from transport import RequestSigner
+
+SECRET = 'sim-secret'
+INST = 'BTC-USDT-SWAP'
+
+
+def order(cl_ord_id, state, **fields):
+    return {'clOrdId': cl_ord_id, 'ordId': fields.pop('ordId', ''), 'instId': INST, 'state': state, **fields}
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.log'))
+
+
+class TestJournal:
+    def test_replay_restores_state(self, tmp_path):
+        journal = Journal(str(tmp_path))
+        journal.open()
+        journal.append('signal', instId=INST, ts=1746576000000, signal=1, px=96000.0)
+        journal.record_order(order('a', 'submitting', sz='1'))
+        journal.record_order(order('a', 'live', ordId='1'))
+        journal.record_order(order('a', 'filled', ordId='1', accFillSz='1'))
+        journal.append('trade', day='2025-05-07', n=3)
+        journal.append('account', positions={INST: {'instId': INST, 'pos': '1'}}, balance={'available': 1.0, 'frozen': 0.0})
+        journal.close()
+
+        records, _ = read_segment(os.path.join(str(tmp_path), segments(str(tmp_path))[0]))
+        assert [r['k'] for r in records] == ['signal', 'intent', 'ack', 'fill', 'trade', 'account']
+        state = Journal(str(tmp_path)).open()
+        assert state['seq'] == 6 and state['last_bar_ts'] == 1746576000000
+        assert state['orders']['a'] == order('a', 'filled', ordId='1', accFillSz='1', sz='1')
+        assert (state['trade_day'], state['trades_today']) == ('2025-05-07', 3)
+        assert state['positions'][INST]['pos'] == '1' and state['prices'][INST] == 96000.0
+
+    def test_torn_tail_is_truncated(self, tmp_path):
+        journal = Journal(str(tmp_path))
+        journal.open()
+        for n in range(3):
+            journal.append('trade', day='2025-05-07', n=n + 1)
+        journal.close()
+        path = os.path.join(str(tmp_path), segments(str(tmp_path))[0])
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(b'\x10\x00\x00\x00garbage')
+
+        journal = Journal(str(tmp_path))
+        assert journal.open()['trades_today'] == 3
+        assert os.path.getsize(path) == size
+        journal.append('trade', day='2025-05-07', n=4)
+        journal.close()
+        assert Journal(str(tmp_path)).open()['trades_today'] == 4
+
+    def test_snapshot_bounds_replay(self, tmp_path):
+        journal = Journal(str(tmp_path), snapshot_interval=10)
+        journal.open()
+        for i in range(25):
+            journal.record_order(order(f"o{i}", 'live', ordId=str(i)))
+        journal.close()
+        assert os.path.exists(os.path.join(str(tmp_path), SNAPSHOT_FILE))
+        (segment,) = segments(str(tmp_path))
+        records, _ = read_segment(os.path.join(str(tmp_path), segment))
+        assert [r['seq'] for r in records] == list(range(21, 26))
+
+        state = Journal(str(tmp_path)).open()
+        assert state['seq'] == 25 and len(state['orders']) == 25
+
+    def test_finished_orders_are_bounded(self, tmp_path):
+        journal = Journal(str(tmp_path))
+        journal.open()
+        journal.record_order(order('open', 'live'))
+        for i in range(1005):
+            journal.record_order(order(f"o{i}", 'filled'))
+        assert len(journal.state['orders']) == 1000 and 'open' in journal.state['orders']
+        journal.close()
+
+
+class TestTradingBotRecovery:
+    @pytest.fixture
+    def server(self):
+        server = ExchangeServer(SimulatedExchange(seed=1), secret=SECRET).start()
+        server.exchange.set_price(INST, 96000)
+        yield server
+        server.stop()
+
+    def make_bot(self, server, tmp_path, monkeypatch):
+        monkeypatch.setattr(main, 'JOURNAL_DIR', str(tmp_path / 'journal'))
+        bot = TradingBot()
+        bot.api.set_base_url(server.url)
+        bot.api.signer = RequestSigner(SECRET)
+        bot.api.candle_store = CandleStore(str(tmp_path))
+        bot.api.retry_policy = RetryPolicy(base_delay=0.01, max_delay=0.05)
+        bot.api.metadata_cache = MetadataCache(str(tmp_path / 'metadata.json'))
+        return bot
+
+    def test_restart_restores_state(self, server, tmp_path, monkeypatch):
+        bot = self.make_bot(server, tmp_path, monkeypatch)
+        assert not bot.recover()
+        bot.last_bar_ts = 1746576000000
+        bot.handle_signal(96000.0, {'signal': -1, 'signal_strength': 0.5, 'atr': 50.0})
+        bot.position, bot.balance = {'instId': INST, 'pos': '1'}, {'available': 100000.0, 'frozen': 0.0}
+        bot.record_account()
+        assert bot.execute_trade('sell', 1, None, None)
+        resting = bot.orders.place('buy', 1, price=95000, tag='resting')
+        bot.journal.close()
+
+        restarted = self.make_bot(server, tmp_path, monkeypatch)
+        assert restarted.recover()
+        assert restarted.last_bar_ts == 1746576000000
+        assert restarted.risk.trades_today == 1
+        assert restarted.risk.reference[INST] == 96000.0
+        assert restarted.account.get_position(INST)['pos'] == '1' and restarted.account.needs_reconcile()
+        # 没有私有频道推送时市价单在本地仍为live，恢复后与交易所对账确定最终状态
+        assert len(restarted.orders.open_orders()) == 2
+        restarted.reconcile_gap(True)
+        assert [o['clOrdId'] for o in restarted.orders.open_orders()] == [resting['clOrdId']]
+        restarted.orders.cancel(resting['clOrdId'])
+        restarted.journal.close()
+
+        requests = dict(server.exchange.requests)
+        again = self.make_bot(server, tmp_path, monkeypatch)
+        assert again.recover()
+        again.reconcile_gap(True)
+        assert server.exchange.requests == requests
+        again.journal.close()
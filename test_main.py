@@ -0,0 +1,113 @@
+import asyncio
+import time
+import pandas as pd
+from main import TradingBot
+from retry import deadline_scope, remaining
+
+
+def make_df(n=60):
+    return pd.DataFrame({
+        'timestamp': pd.date_range('2025-05-07', periods=n, freq='min'),
+        'open': 96000.0,
+        'high': 96010.0,
+        'low': 95990.0,
+        'close': 96000.0,
+        'volume': 10.0,
+        'confirm': '1',
+    })
+
+
+class TestAsyncTick:
+    def test_requests_run_concurrently(self):
+        bot = TradingBot()
+        calls = []
+
+        async def slow(name, result):
+            calls.append(name)
+            await asyncio.sleep(0.2)
+            return result
+
+        bot.api.get_ohlcv_async = lambda: slow('ohlcv', make_df())
+        bot.api.get_position_async = lambda: slow('position', None)
+        bot.api.get_balance_async = lambda ccy: slow('balance', {'available': 1000.0, 'frozen': 0.0})
+        bot.api.get_ticker_async = lambda: slow('ticker', {'data': [{'last': '96000'}]})
+
+        start = time.monotonic()
+        asyncio.run(bot.tick_async())
+        elapsed = time.monotonic() - start
+
+        assert sorted(calls) == ['balance', 'ohlcv', 'position', 'ticker']
+        assert elapsed < 0.35
+        assert bot.balance['available'] == 1000.0
+        assert bot.ticker['last'] == '96000'
+
+    def test_account_cache_replaces_rest(self):
+        bot = TradingBot()
+        bot.account_feed = type('Feed', (), {'connected': True})()
+        bot.account.reconcile({'USDT': {'available': 500.0, 'frozen': 0.0}},
+                              {'BTC-USDT-SWAP': {'instId': 'BTC-USDT-SWAP', 'pos': '1'}})
+        calls = []
+
+        async def fetch(name, result):
+            calls.append(name)
+            return result
+
+        bot.api.get_ohlcv_async = lambda: fetch('ohlcv', make_df())
+        bot.api.get_position_async = lambda: fetch('position', None)
+        bot.api.get_balance_async = lambda ccy: fetch('balance', None)
+        bot.api.get_ticker_async = lambda: fetch('ticker', {'data': [{'last': '96000'}]})
+
+        asyncio.run(bot.tick_async())
+        assert sorted(calls) == ['ohlcv', 'ticker']
+        assert bot.balance['available'] == 500.0
+        assert bot.position['pos'] == '1'
+
+
+    def test_blocking_order_calls_leave_loop_free(self):
+        bot = TradingBot()
+        bot.account_feed = type('Feed', (), {'connected': True})()
+        bot.account.reconcile({'USDT': {'available': 500.0, 'frozen': 0.0}}, {})
+
+        async def fetch(result):
+            return result
+
+        bot.api.get_ohlcv_async = lambda: fetch(make_df())
+        bot.api.get_ticker_async = lambda: fetch({'data': [{'last': '96000'}]})
+        bot.handle_signal = lambda price, latest: time.sleep(0.2)
+        bot.maintain_orders = lambda: time.sleep(0.2)
+        ticks = []
+
+        async def heartbeat():
+            while len(ticks) < 100:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def main():
+            beat = asyncio.ensure_future(heartbeat())
+            await bot.tick_async()
+            beat.cancel()
+
+        asyncio.run(main())
+        assert len(ticks) >= 20
+        assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.15
+
+    def test_blocking_calls_keep_tick_deadline(self):
+        bot = TradingBot()
+        bot.account_feed = type('Feed', (), {'connected': True})()
+        bot.account.reconcile({'USDT': {'available': 500.0, 'frozen': 0.0}}, {})
+
+        async def fetch(result):
+            return result
+
+        bot.api.get_ohlcv_async = lambda: fetch(make_df())
+        bot.api.get_ticker_async = lambda: fetch({'data': [{'last': '96000'}]})
+        seen = []
+        bot.handle_signal = lambda price, latest: seen.append(remaining())
+        bot.maintain_orders = lambda: seen.append(remaining())
+
+        async def main():
+            with deadline_scope(5):
+                await bot.tick_async()
+
+        asyncio.run(main())
+        assert len(seen) == 2 and all(left is not None and 0 < left <= 5 for left in seen)
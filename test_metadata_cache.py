@@ -0,0 +1,31 @@
+import time
+from metadata_cache import MetadataCache
+
+
+class TestMetadataCache:
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / 'cache' / 'metadata.json')
+        MetadataCache(path).set('instrument', {'ctVal': '0.01'})
+        assert MetadataCache(path).get('instrument') == {'ctVal': '0.01'}
+        assert MetadataCache(path).get('missing') is None
+
+    def test_expired_entries(self, tmp_path, monkeypatch):
+        path = str(tmp_path / 'metadata.json')
+        cache = MetadataCache(path, ttl=60)
+        cache.set('old', 1)
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 61)
+        assert cache.get('old') is None
+        cache.set('new', 2)
+        assert MetadataCache(path, ttl=60)._load() == {'new': {'at': now + 61, 'value': 2}}
+
+    def test_invalidate_and_corrupt_file(self, tmp_path):
+        path = tmp_path / 'metadata.json'
+        cache = MetadataCache(str(path))
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.invalidate('a')
+        assert (cache.get('a'), cache.get('b')) == (None, 2)
+        path.write_text('{broken')
+        assert MetadataCache(str(path)).get('b') is None
+        assert MetadataCache(None).get('b') is None
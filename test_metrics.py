@@ -0,0 +1,55 @@
+import urllib.request
+from metrics import MetricsRegistry, MetricsServer, Histogram, REGISTRY
+from test_transport import start_server, make_api
+
+
+class TestRegistry:
+    def test_histogram_quantile(self):
+        histogram = Histogram(buckets=(1, 2, 3, 4))
+        for value in (0.5, 1.5, 2.5, 3.5):
+            histogram.observe(value)
+        assert histogram.count == 4
+        assert histogram.quantile(0.5) == 2
+        assert 3 < histogram.quantile(0.9) <= 4
+
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.inc('retries_total', reason='50011')
+        registry.inc('retries_total', reason='50011')
+        registry.observe('http_request_seconds', 0.02, endpoint='/api/v5/market/ticker')
+        text = registry.render()
+        assert 'okx_bot_retries_total{reason="50011"} 2' in text
+        assert 'okx_bot_http_request_seconds_bucket{endpoint="/api/v5/market/ticker",le="0.025"} 1' in text
+        assert 'okx_bot_http_request_seconds_count{endpoint="/api/v5/market/ticker"} 1' in text
+        assert any(line.startswith('http_request_seconds') for line in registry.summary())
+
+    def test_metrics_server(self):
+        registry = MetricsRegistry()
+        registry.inc('orders_total')
+        server = MetricsServer(registry, port=0).start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                assert b'okx_bot_orders_total 1' in response.read()
+        finally:
+            server.stop()
+
+
+class TestRequestTiming:
+    def test_phases_recorded_per_endpoint(self):
+        server = start_server()
+        try:
+            api = make_api(server)
+            endpoint = '/api/v5/market/ticker'
+            before = REGISTRY.get('http_phase_seconds', endpoint=endpoint, phase='connect')
+            before = before[0] if before else 0
+            for _ in range(3):
+                api._make_request('GET', endpoint, params={'instId': 'BTC-USDT-SWAP'})
+
+            assert REGISTRY.get('http_request_seconds', endpoint=endpoint)[0] >= 3
+            assert REGISTRY.get('http_phase_seconds', endpoint=endpoint, phase='server')[0] >= 3
+            assert REGISTRY.get('http_phase_seconds', endpoint=endpoint, phase='parse')[0] >= 3
+            # 连接池复用连接：只有第一次请求新建连接
+            assert REGISTRY.get('http_phase_seconds', endpoint=endpoint, phase='connect')[0] - before == 1
+            assert REGISTRY.get('http_phase_seconds', endpoint=endpoint, phase='dns')[0] - before == 1
+        finally:
+            server.shutdown()
@@ -0,0 +1,155 @@
+import threading
+import time
+import numpy as np
+import pytest
+from multi_symbol import MultiSymbolBot, StrategyPool, ExecutionGateway
+from order_manager import OrderManager, client_order_id
+from rate_limit import RateLimiter
+from resample import resample_candles
+from retry import deadline_scope, remaining
+from strategy import TradingStrategy
+from test_indicators import make_candles
+
+SYMBOLS = ['BTC-USDT-SWAP', 'ETH-USDT-SWAP', 'SOL-USDT-SWAP']
+
+
+class TestStrategyPool:
+    def test_matches_single_process(self):
+        candles = {symbol: make_candles(n=300, seed=i) for i, symbol in enumerate(SYMBOLS)}
+        local = {symbol: TradingStrategy() for symbol in SYMBOLS}
+        pool = StrategyPool(SYMBOLS, workers=2)
+        try:
+            for end in (250, 251, 252, 260, 300):
+                frames = {symbol: df.iloc[end - 100:end] for symbol, df in candles.items()}
+                results = pool.evaluate(frames)
+                for symbol, df in frames.items():
+                    expected = local[symbol].update_signals(df)
+                    assert results[symbol]['timestamp'] == expected['timestamp']
+                    assert np.isclose(results[symbol]['rsi'], expected['rsi'], equal_nan=True)
+                    assert results[symbol]['signal'] == expected['signal']
+        finally:
+            pool.close()
+
+    def test_trend_frames_are_sent_to_workers(self):
+        candles = {symbol: make_candles(n=600, seed=i) for i, symbol in enumerate(SYMBOLS)}
+        local = {symbol: TradingStrategy() for symbol in SYMBOLS}
+        pool = StrategyPool(SYMBOLS, workers=2)
+        try:
+            for end in (550, 551, 600):
+                frames = {symbol: df.iloc[end - 100:end] for symbol, df in candles.items()}
+                trend_frames = {symbol: {'15m': resample_candles(df.iloc[:end], '15m')} for symbol, df in candles.items()}
+                results = pool.evaluate(frames, trend_frames, dict.fromkeys(SYMBOLS, '1m'))
+                for symbol, df in frames.items():
+                    expected = local[symbol].update_signals(df, trend_frames[symbol], '1m')
+                    assert results[symbol]['trend_15m'] == expected['trend_15m']
+                    assert results[symbol]['close_15m'] == expected['close_15m']
+        finally:
+            pool.close()
+
+
+class FakeAPI:
+    def __init__(self, orders, fail=False):
+        self.symbol = SYMBOLS[0]
+        self.orders = orders
+        self.fail = fail
+
+    def create_order(self, side, amount, price=None, stop_loss=None, take_profit=None, inst_id=None, cl_ord_id=None):
+        if self.fail:
+            raise ValueError("下单失败")
+        self.orders.append((inst_id, side, amount))
+        return {'code': '0', 'data': [{'ordId': str(len(self.orders)), 'clOrdId': cl_ord_id}]}
+
+
+class TestExecutionGateway:
+    def test_orders_are_rate_limited(self):
+        orders = []
+        gateway = ExecutionGateway(OrderManager(FakeAPI(orders)), limit=2, window=0.2, workers=3)
+        start = time.monotonic()
+        futures = [gateway.submit(symbol, 'buy', 1) for symbol in SYMBOLS * 2]
+        for future in futures:
+            assert future.result()['state'] == 'live'
+        gateway.close()
+
+        # 6个请求，桶容量2、速率10/秒：至少需要等待0.4秒
+        assert time.monotonic() - start >= 0.35
+        assert sorted(orders) == sorted((symbol, 'buy', 1) for symbol in SYMBOLS * 2)
+
+    def test_orders_keep_caller_deadline(self):
+        seen = []
+
+        class DeadlineAPI(FakeAPI):
+            def create_order(self, *args, **kwargs):
+                seen.append(remaining())
+                return super().create_order(*args, **kwargs)
+
+        gateway = ExecutionGateway(OrderManager(DeadlineAPI([])))
+        with deadline_scope(5):
+            future = gateway.submit(SYMBOLS[0], 'buy', 1)
+        future.result()
+        gateway.close()
+        assert seen[0] is not None and 0 < seen[0] <= 5
+
+
+class TestMultiSymbolOrders:
+    @pytest.mark.parametrize('fail', [False, True])
+    def test_failed_order_releases_reserved_trade(self, fail):
+        bot = MultiSymbolBot(symbols=SYMBOLS[:1])
+        orders = []
+        bot.orders = OrderManager(FakeAPI(orders, fail=fail))
+        bot.gateway = ExecutionGateway(bot.orders)
+        bot.balance = {'available': 1000.0, 'frozen': 0.0}
+        bot.last_bar_ts[SYMBOLS[0]] = 1746576000000
+        try:
+            future = bot.handle_signal(SYMBOLS[0], 96000.0, {'signal': 1, 'signal_strength': 0.5, 'atr': 50.0})
+            assert future.exception() is not None if fail else future.result()['state'] == 'live'
+        finally:
+            bot.gateway.close()
+
+        cl_ord_id = client_order_id(SYMBOLS[0], 'buy', 1746576000000)
+        assert bot.orders.get(cl_ord_id)['state'] == ('rejected' if fail else 'live')
+        assert bot.risk.trades_today == (0 if fail else 1)
+
+    def test_signals_in_one_tick_respect_daily_limit(self):
+        bot = MultiSymbolBot(symbols=SYMBOLS)
+        release = threading.Event()
+
+        class SlowAPI(FakeAPI):
+            def create_order(self, *args, **kwargs):
+                release.wait(5)
+                return super().create_order(*args, **kwargs)
+
+        orders = []
+        bot.orders = OrderManager(SlowAPI(orders))
+        bot.gateway = ExecutionGateway(bot.orders)
+        bot.risk.max_daily_trades = 2
+        bot.balance = {'available': 1000.0, 'frozen': 0.0}
+        latest = {'signal': 1, 'signal_strength': 0.5, 'atr': 50.0}
+        try:
+            # 下单尚未完成时，同一轮的第三个信号已经不能再交易
+            futures = [bot.handle_signal(symbol, 96000.0, latest) for symbol in SYMBOLS]
+            assert futures[2] is None
+            release.set()
+            assert all(future.result()['state'] == 'live' for future in futures[:2])
+        finally:
+            bot.gateway.close()
+        assert len(orders) == 2 and bot.risk.trades_today == 2
+
+    def test_trend_frames_follow_strategy(self):
+        bot = MultiSymbolBot(symbols=SYMBOLS[:1])
+        try:
+            assert bot.trend_frames(SYMBOLS[0]) is None
+            bot.strategy.trend_timeframes = ['15m']
+            assert list(bot.trend_frames(SYMBOLS[0])) == ['15m']
+        finally:
+            bot.gateway.close()
+
+
+class TestRateLimiter:
+    def test_burst_then_throttle(self):
+        limiter = RateLimiter(5, 0.5)
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        assert time.monotonic() - start < 0.05
+        limiter.acquire()
+        assert time.monotonic() - start >= 0.09
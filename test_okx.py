@@ -1,44 +1,141 @@
+import asyncio
+import subprocess
+import sys
+import time
+import pytest
+from candle_store import CandleStore
+from exchange_sim import SimulatedExchange, ExchangeServer, load_test
 from main import TradingBot
-from okx_api import OKXAPI
+from metadata_cache import MetadataCache
+from retry import RetryPolicy
+from transport import RequestSigner
+
+SECRET = 'sim-secret'
+
+
+@pytest.fixture
+def server():
+    server = ExchangeServer(SimulatedExchange(seed=1), secret=SECRET).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def exchange(server):
+    return server.exchange
+
+
+def make_bot(server, tmp_path):
+    bot = TradingBot()
+    bot.api.set_base_url(server.url)
+    bot.api.signer = RequestSigner(SECRET)
+    bot.api.candle_store = CandleStore(str(tmp_path))
+    bot.api.retry_policy = RetryPolicy(base_delay=0.01, max_delay=0.05)
+    bot.api.metadata_cache = MetadataCache(str(tmp_path / 'metadata.json'))
+    return bot
+
+
+@pytest.fixture
+def bot(server, tmp_path):
+    return make_bot(server, tmp_path)
+
 
 class TestTradingBot:
-    def __init__(self):
-        self.bot = TradingBot()
+    def test_initialize(self, bot, exchange):
+        bot.api.initialize()
+        assert bot.api.initialized
+        assert exchange.leverage[bot.api.symbol] == str(bot.api.leverage)
+
+    def test_initialize_runs_checks_concurrently(self, bot, exchange):
+        exchange.latency = 0.1
+        start = time.monotonic()
+        bot.api.initialize()
+        # 四个检查依次进行至少需要0.4秒
+        assert time.monotonic() - start < 0.3
+        assert bot.api.server_time is not None
+        assert exchange.requests['/api/v5/public/instruments'] == 1
 
-    def test_initialize(self):
-        self.bot.api.initialize()
-        assert self.bot.api.initialized
+    def test_restart_reuses_cached_metadata(self, bot, server, exchange, tmp_path):
+        bot.api.initialize()
+        assert bot.api.get_instrument()['ctVal'] == '1'
+        bot.api._validate_account_mode(exchange.acct_lv)
+        counts = dict(exchange.requests)
+        restarted = make_bot(server, tmp_path)
+        restarted.api.initialize()
+        restarted.api._validate_account_mode(exchange.acct_lv)
+        for endpoint in ('/api/v5/account/set-leverage', '/api/v5/public/instruments', '/api/v5/account/config'):
+            assert exchange.requests[endpoint] == counts[endpoint]
+        assert exchange.requests['/api/v5/public/time'] == counts['/api/v5/public/time'] + 1
 
-    def test_get_ohlcv(self):
-        df = self.bot.api.get_ohlcv()
-        print(df)
-        assert not df.empty
+        # 缓存过期后重新请求
+        expired = make_bot(server, tmp_path)
+        expired.api.metadata_cache.ttl = -1
+        expired.api.initialize()
+        assert exchange.requests['/api/v5/account/set-leverage'] == counts['/api/v5/account/set-leverage'] + 1
+
+    def test_ccxt_is_imported_lazily(self):
+        code = "import sys, main; main.TradingBot(); assert 'ccxt' not in sys.modules"
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+    def test_get_ohlcv(self, bot):
+        df = bot.api.get_ohlcv()
+        assert len(df) == 100
         assert 'close' in df.columns
+        assert list(df['confirm'][-2:]) == ['1', '0']
+        # 再次拉取只请求新K线
+        assert len(bot.api.get_ohlcv()) == 100
 
-    def test_generate_signals(self):
-        df = self.bot.strategy.generate_signals(pd.DataFrame({'close': [1, 2, 3]}))
+    def test_generate_signals(self, bot):
+        df = bot.strategy.generate_signals(bot.api.get_ohlcv())
         assert 'signal' in df.columns
         assert 'signal_strength' in df.columns
 
-    def test_execute_trade_buy(self):
-        self.bot.execute_trade('buy', 1, 95000.0, 98000.0)
-        assert self.bot.api.last_trade['side'] == 'buy'
-        assert self.bot.api.last_trade['amount'] == 1
-        assert self.bot.api.last_trade['stop_loss'] == 1
-        assert self.bot.api.last_trade['take_profit'] == 2
-
-    def test_execute_trade_sell(self):
-        self.bot.execute_trade('sell', 1, None, None)
-        assert self.bot.api.last_trade['side'] == 'sell'
-        assert self.bot.api.last_trade['amount'] == 1
-
-    def test_check_market_conditions(self):
-        df = self.bot.api.get_ohlcv()
-        self.bot.check_market_conditions()
-    
-if __name__ == "__main__":
-    test_bot = TestTradingBot()
-    api = OKXAPI()
-    # api.get_balance()
-    # test_bot.test_execute_trade_buy()
-    test_bot.test_execute_trade_sell()
+    def test_execute_trade_buy_then_take_profit(self, bot, exchange):
+        exchange.set_price('BTC-USDT-SWAP', 96000)
+        assert bot.execute_trade('buy', 1, 95000.0, 98000.0)
+        order = exchange.fills[-1]
+        assert (order['side'], order['sz'], order['ordType']) == ('buy', '1', 'market')
+        assert (order['slTriggerPx'], order['tpTriggerPx']) == ('95000', '98000')
+        assert bot.api.get_position()['pos'] == '1'
+
+        # 价格涨过止盈触发价：止盈成交、止损撤销
+        exchange.set_price('BTC-USDT-SWAP', 98100)
+        assert exchange.fills[-1]['source'] == 'tp'
+        assert bot.api.get_position() is None
+        assert not exchange.algos
+
+    def test_execute_trade_sell(self, bot, exchange):
+        assert bot.execute_trade('sell', 1, None, None)
+        assert exchange.fills[-1]['side'] == 'sell'
+        assert bot.api.get_position()['pos'] == '-1'
+
+    def test_limit_order_rests_until_price_crosses(self, bot, exchange):
+        exchange.set_price('BTC-USDT-SWAP', 96000)
+        order_id = bot.api.create_order('buy', 2, price=95500)['data'][0]['ordId']
+        assert [o['ordId'] for o in bot.api.get_open_orders()['data']] == [order_id]
+        exchange.set_price('BTC-USDT-SWAP', 95400)
+        assert bot.api.get_open_orders()['data'] == []
+        assert bot.api.get_position()['avgPx'] == '95400'
+
+    def test_risk_check_uses_cached_price(self, bot, exchange):
+        bot.current_price = 96000.0
+        assert bot.check_risk('buy', 1)
+        assert not exchange.requests['/api/v5/market/ticker']
+
+
+class TestFaultInjection:
+    def test_retries_injected_faults(self, bot, exchange):
+        exchange.fail_next(503, '50001')
+        assert bot.api.get_ticker()['data'][0]['instId'] == 'BTC-USDT-SWAP'
+        assert exchange.requests['/api/v5/market/ticker'] == 3
+
+    def test_ambiguous_order_is_not_duplicated(self, bot, exchange):
+        exchange.fail_next(503)
+        bot.api.create_order('buy', 1)
+        assert len(exchange.fills) == 1
+
+    def test_load(self, bot, exchange):
+        exchange.latency = (0, 0.001)
+        rate, failures = asyncio.run(load_test(bot.api, requests=300, concurrency=20))
+        assert failures == 0 and rate > 0
+        assert exchange.requests['/api/v5/market/ticker'] == 300
@@ -0,0 +1,57 @@
+import numpy as np
+from backtest import Backtester
+from optimizer import Optimizer, grid_search, random_search, is_valid
+from strategy import TradingStrategy
+from test_indicators import make_candles
+
+SPACE = {
+    'rsi_period': [9, 14],
+    'rsi_overbought': [51],
+    'rsi_oversold': [50],
+    'ma_fast': [5, 10],
+    'ma_slow': [20],
+    'atr_period': [7, 14],
+}
+
+
+class TestOptimizer:
+    def test_results_match_direct_backtest(self):
+        df = make_candles(n=5000, seed=1)
+        combinations = list(grid_search(SPACE))
+        results = Optimizer(df, workers=2, chunk_size=3).run(combinations)
+
+        assert len(results) == len(combinations) == 8
+        assert results['total_return'].is_monotonic_decreasing
+        traded = False
+        for row in results.itertuples():
+            strategy = TradingStrategy()
+            for name in SPACE:
+                setattr(strategy, name, getattr(row, name))
+            expected = Backtester(strategy).run(df).summary()
+            assert row.trades == expected['trades']
+            traded = traded or expected['trades'] > 0
+            assert np.isclose(row.total_return, expected['total_return'])
+        assert traded
+
+    def test_random_search(self):
+        space = {'ma_fast': [5, 10, 20], 'ma_slow': [10, 20, 30], 'rsi_period': [9, 14]}
+        combinations = list(random_search(space, 8, seed=1))
+        assert len(combinations) == 8
+        assert all(is_valid(params) for params in combinations)
+        assert len({tuple(params.values()) for params in combinations}) == 8
+
+    def test_trend_timeframes_match_direct_backtest(self):
+        df = make_candles(n=5000, seed=1)
+        space = {**SPACE, 'trend_timeframes': [['15m']]}
+        combinations = list(grid_search(space))
+        results = Optimizer(df, workers=2, chunk_size=3).run(combinations)
+
+        unfiltered = Optimizer(df, workers=2, chunk_size=3).run(list(grid_search(SPACE)))
+        assert results['trades'].sum() < unfiltered['trades'].sum()
+        for row in results.itertuples():
+            strategy = TradingStrategy()
+            for name in space:
+                setattr(strategy, name, getattr(row, name))
+            expected = Backtester(strategy).run(df).summary()
+            assert row.trades == expected['trades']
+            assert np.isclose(row.total_return, expected['total_return'])
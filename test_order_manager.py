@@ -0,0 +1,193 @@
+import re
+import threading
+import pytest
+from candle_store import CandleStore
+from exchange_sim import SimulatedExchange, ExchangeServer
+from main import TradingBot
+from metadata_cache import MetadataCache
+from order_manager import OrderManager, client_order_id
+from retry import RetryPolicy, OKXAPIError
+from transport import RequestSigner
+
+SECRET = 'sim-secret'
+INST = 'BTC-USDT-SWAP'
+
+
+@pytest.fixture
+def server():
+    server = ExchangeServer(SimulatedExchange(seed=1), secret=SECRET).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def exchange(server):
+    exchange = server.exchange
+    exchange.set_price(INST, 96000)
+    return exchange
+
+
+def make_bot(server, root):
+    bot = TradingBot()
+    bot.api.set_base_url(server.url)
+    bot.api.signer = RequestSigner(SECRET)
+    bot.api.candle_store = CandleStore(str(root))
+    bot.api.retry_policy = RetryPolicy(base_delay=0.01, max_delay=0.05)
+    bot.api.metadata_cache = MetadataCache(str(root / 'metadata.json'))
+    return bot
+
+
+@pytest.fixture
+def bot(server, tmp_path):
+    return make_bot(server, tmp_path)
+
+
+@pytest.fixture
+def manager(bot):
+    return bot.orders
+
+
+def exchange_order(exchange, cl_ord_id):
+    return next(o for o in exchange.orders.values() if o['clOrdId'] == cl_ord_id)
+
+
+class TestClientOrderId:
+    def test_deterministic(self):
+        a = client_order_id(INST, 'buy', 1746576000000)
+        assert a == client_order_id(INST, 'buy', 1746576000000)
+        assert a != client_order_id(INST, 'sell', 1746576000000)
+        assert a != client_order_id(INST, 'buy', 1746576000000, seq=1)
+        assert re.fullmatch(r'[A-Za-z0-9]{1,32}', a) and a.startswith('bot')
+
+
+class TestOrderManager:
+    def test_same_intent_is_placed_once(self, manager, exchange):
+        first = manager.place('buy', 1, price=95000, tag=1)
+        second = manager.place('buy', 1, price=95000, tag=1)
+        assert first['clOrdId'] == second['clOrdId']
+        assert first['state'] == 'live' and first['ordId']
+        assert exchange.requests['/api/v5/trade/order'] == 1
+
+    def test_ambiguous_failure_is_not_duplicated(self, manager, exchange):
+        exchange.fail_next(503)
+        order = manager.place('buy', 1, price=95000, tag=2)
+        assert order['state'] == 'live'
+        assert len([o for o in exchange.orders.values() if o['clOrdId'] == order['clOrdId']]) == 1
+
+    def test_rejected_intent_can_be_retried(self, manager):
+        with pytest.raises(OKXAPIError):
+            manager.place('buy', 0, tag=3)
+        assert manager.by_state('rejected')[0]['sz'] == '0'
+        assert manager.place('buy', 1, price=95000, tag=3)['state'] == 'live'
+
+    def test_reprice_amends_in_place(self, manager, exchange):
+        order = manager.place('buy', 1, price=95000, tag=4)
+        manager.reprice(order['clOrdId'], 95500)
+        remote = exchange_order(exchange, order['clOrdId'])
+        assert (remote['ordId'], remote['px']) == (order['ordId'], '95500')
+        assert manager.get(order['clOrdId'])['px'] == '95500'
+        assert exchange.requests['/api/v5/trade/amend-order'] == 1
+        assert exchange.requests['/api/v5/trade/order'] == 1
+        assert not exchange.requests['/api/v5/trade/cancel-batch-orders']
+
+    def test_cancel(self, manager, exchange):
+        order = manager.place('sell', 1, price=97000, tag=5)
+        assert manager.cancel(order['clOrdId'])
+        assert exchange_order(exchange, order['clOrdId'])['state'] == 'canceled'
+        assert manager.open_orders() == []
+        assert manager.get(ord_id=order['ordId'])['state'] == 'canceled'
+
+    def test_push_updates_index(self, manager):
+        order = manager.place('buy', 1, price=95000, tag=6)
+        manager.on_order({**order, 'state': 'partially_filled', 'accFillSz': '0.5'})
+        assert [o['clOrdId'] for o in manager.by_state('partially_filled')] == [order['clOrdId']]
+        manager.on_order({'instId': INST, 'ordId': order['ordId'], 'clOrdId': order['clOrdId'], 'state': 'filled'})
+        assert manager.open_orders() == []
+        assert manager.get(order['clOrdId'])['accFillSz'] == '0.5'
+
+    def test_reconcile(self, bot, manager, exchange):
+        filled = manager.place('buy', 1, price=95000, tag=7)
+        resting = manager.place('sell', 1, price=97000, tag=8)
+        # 外部下的挂单、本地以为已提交但交易所没有收到的订单
+        bot.api.create_order('sell', 2, price=98000, cl_ord_id='external1')
+        manager._store({'clOrdId': 'lost1', 'ordId': '', 'instId': INST, 'state': 'submitting'})
+        exchange.set_price(INST, 94900)
+
+        assert manager.reconcile() == 3
+        assert manager.get(filled['clOrdId'])['state'] == 'filled'
+        assert manager.get(resting['clOrdId'])['state'] == 'live'
+        assert manager.get('external1')['sz'] == '2'
+        assert manager.get('lost1')['state'] == 'rejected'
+        assert not manager.needs_reconcile()
+        assert manager.reconcile() == 0
+
+    def test_batch_is_tracked_and_placed_once(self, manager, exchange):
+        intents = [{'side': 'buy', 'amount': 1, 'price': 95000}, {'side': 'buy', 'amount': 1, 'price': 94000},
+                   {'side': 'sell', 'amount': 0, 'price': 97000}]
+        results = manager.place_batch(intents, tag=9)
+        assert [r['ok'] for r in results] == [True, True, False]
+        assert [r['clOrdId'] for r in results] == [client_order_id(INST, 'buy', 9, 0), client_order_id(INST, 'buy', 9, 1),
+                                                   client_order_id(INST, 'sell', 9, 2)]
+        assert [manager.get(r['clOrdId'])['state'] for r in results] == ['live', 'live', 'rejected']
+        assert manager.get(results[0]['clOrdId'])['ordId'] == results[0]['ordId']
+
+        again = manager.place_batch(intents, tag=9)
+        assert [r['ok'] for r in again] == [False, False, False]
+        assert exchange.requests['/api/v5/trade/batch-orders'] == 2
+        assert len([o for o in exchange.orders.values() if o['clOrdId'].startswith('bot')]) == 2
+
+    def test_reconcile_skips_order_still_being_placed(self, bot, manager, exchange):
+        started, release = threading.Event(), threading.Event()
+        create_order = bot.api.create_order
+
+        def blocked_create_order(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return create_order(*args, **kwargs)
+
+        bot.api.create_order = blocked_create_order
+        placed = []
+        placing = threading.Thread(target=lambda: placed.append(manager.place('buy', 1, tag=10)))
+        placing.start()
+        assert started.wait(5)
+        # 下单请求尚未发出，交易所没有该订单，对账不能把它当作被拒绝
+        assert manager.reconcile() == 0
+        assert manager.open_orders()[0]['state'] == 'submitting'
+        release.set()
+        placing.join(5)
+        assert placed[0]['state'] == 'live'
+        assert manager.get(placed[0]['clOrdId'])['state'] == 'live'
+
+    def test_finished_orders_are_pruned(self, bot):
+        manager = OrderManager(bot.api, history=2)
+        for i in range(4):
+            manager.on_order({'instId': INST, 'ordId': str(i), 'clOrdId': f"c{i}", 'state': 'filled'})
+        manager.on_order({'instId': INST, 'ordId': '9', 'clOrdId': 'open', 'state': 'live'})
+        assert sorted(manager.orders) == ['c2', 'c3', 'open']
+        assert manager.get(ord_id='0') is None
+
+
+class TestTradingBotOrders:
+    def test_signal_is_traded_once_across_restart(self, bot, server, exchange, tmp_path):
+        bot.last_bar_ts = 1746576000000
+        assert bot.execute_trade('buy', 1, None, None)
+        # 重启后订单表为空，同一根K线的信号得到相同的clOrdId，交易所拒绝重复订单
+        restarted = make_bot(server, tmp_path)
+        restarted.last_bar_ts = bot.last_bar_ts
+        assert restarted.execute_trade('buy', 1, None, None)
+        assert len(exchange.fills) == 1
+        cl_ord_id = client_order_id(INST, 'buy', bot.last_bar_ts)
+        assert restarted.orders.get(cl_ord_id)['ordId'] == bot.orders.get(cl_ord_id)['ordId']
+
+    def test_intents_go_through_order_manager(self, bot, exchange):
+        bot.last_bar_ts = 1746576000000
+        bot.current_price = 96000.0
+        intents = [{'side': 'buy', 'amount': 1, 'price': 95000}, {'side': 'sell', 'amount': 1, 'price': 97000}]
+        results = bot.submit_intents(intents)
+        assert all(r['ok'] for r in results)
+        assert sorted(o['clOrdId'] for o in bot.orders.open_orders()) == sorted(r['clOrdId'] for r in results)
+        assert results[1]['clOrdId'] == client_order_id(INST, 'sell', bot.last_bar_ts, 1)
+        assert bot.risk.trades_today == 2
+        # 同一根K线重复提交不会重复下单，也不重复计数
+        assert not any(r['ok'] for r in bot.submit_intents(intents))
+        assert bot.risk.trades_today == 2
@@ -0,0 +1,108 @@
+import time
+import zlib
+import pytest
+from orderbook import OrderBook, OrderBookError, checksum
+from ws_client import MarketDataState, MarketDataFeed
+from test_ws_client import StandInServer
+
+INST = 'BTC-USDT-SWAP'
+
+
+def snapshot(bids, asks, seq=10):
+    data = {'bids': bids, 'asks': asks, 'ts': '1746587400000', 'seqId': seq, 'prevSeqId': -1}
+    data['checksum'] = checksum(bids, asks)
+    return data
+
+
+def update(book, bids, asks, seq, prev):
+    """按更新后的本地状态计算交易所会给出的校验和"""
+    shadow = OrderBook(INST)
+    shadow.bids.update(b[:2] for b in book.bids.top())
+    shadow.asks.update(a[:2] for a in book.asks.top())
+    shadow.bids.update(bids)
+    shadow.asks.update(asks)
+    expected = checksum(shadow.bids.top(25), shadow.asks.top(25))
+    return {'bids': bids, 'asks': asks, 'ts': '1746587400100', 'seqId': seq, 'prevSeqId': prev, 'checksum': expected}
+
+
+BIDS = [['3366.1', '7', '0', '3'], ['3366', '6', '0', '4'], ['3365.5', '20', '0', '1']]
+ASKS = [['3366.8', '9', '0', '3'], ['3368', '8', '0', '4'], ['3370', '50', '0', '2']]
+
+
+class TestChecksum:
+    def test_interleaves_bids_and_asks(self):
+        value = checksum(BIDS[:2], ASKS[:2])
+        expected = zlib.crc32(b'3366.1:7:3366.8:9:3366:6:3368:8')
+        assert value == expected - (1 << 32) if expected >= 1 << 31 else expected
+        # 一侧档位不足时继续拼接另一侧
+        expected = zlib.crc32(b'3366.1:7:3366.8:9:3366:6:3365.5:20')
+        assert checksum(BIDS, ASKS[:1]) % (1 << 32) == expected
+
+
+class TestOrderBook:
+    def test_snapshot_and_updates(self):
+        book = OrderBook(INST)
+        book.apply('snapshot', snapshot(BIDS, ASKS))
+        assert book.valid
+        assert book.best_bid() == (3366.1, 7.0) and book.best_ask() == (3366.8, 9.0)
+
+        # 新增、修改、删除档位
+        book.apply('update', update(book, [['3366.5', '1', '0', '1'], ['3366', '0', '0', '0']],
+                                    [['3366.8', '4', '0', '1']], seq=11, prev=10))
+        assert book.depth('bids') == [(3366.5, 1.0), (3366.1, 7.0), (3365.5, 20.0)]
+        assert book.depth('asks', 1) == [(3366.8, 4.0)]
+        assert book.mid() == pytest.approx((3366.5 + 3366.8) / 2)
+
+    def test_sequence_gap_and_bad_checksum_invalidate(self):
+        book = OrderBook(INST)
+        book.apply('snapshot', snapshot(BIDS, ASKS))
+        with pytest.raises(OrderBookError):
+            book.apply('update', update(book, [], [['3369', '1', '0', '1']], seq=13, prev=12))
+        assert not book.valid
+        # 等待快照期间的增量被忽略
+        book.apply('update', update(book, [], [], seq=14, prev=13))
+        assert not book.valid
+
+        book.apply('snapshot', snapshot(BIDS, ASKS, seq=20))
+        data = update(book, [['3366.1', '8', '0', '3']], [], seq=21, prev=20)
+        data['checksum'] += 1
+        with pytest.raises(OrderBookError):
+            book.apply('update', data)
+        assert not book.valid
+
+    def test_quote_walks_depth(self):
+        book = OrderBook(INST)
+        book.apply('snapshot', snapshot(BIDS, ASKS))
+        quote = book.quote('buy', 12)
+        assert quote['price'] == 3368.0
+        assert quote['avg_price'] == pytest.approx((9 * 3366.8 + 3 * 3368) / 12)
+        assert quote['slippage'] == pytest.approx((quote['avg_price'] - 3366.8) / 3366.8)
+        assert book.quote('sell', 7)['slippage'] == 0
+        assert book.quote('sell', 0.1 + 0.2 + 6.7)['price'] == 3366.1
+        assert book.quote('buy', 100) is None
+
+
+class TestOrderBookFeed:
+    def test_resubscribes_after_checksum_mismatch(self):
+        arg = {'channel': 'books', 'instId': INST}
+        bad = snapshot(BIDS, ASKS)
+        bad['checksum'] += 1
+        server = StandInServer([{'arg': arg, 'action': 'snapshot', 'data': [bad]}])
+        state = MarketDataState()
+        feed = MarketDataFeed(state, [INST], '1m', public_url=server.url, business_url=server.url)
+        feed.start()
+        try:
+            deadline = time.monotonic() + 5
+            while [arg] not in server.subscriptions and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # 校验失败后单独退订并重新订阅该频道
+            assert [arg] in server.subscriptions
+            assert state.get_book(INST) is None
+
+            server.pushes = [{'arg': arg, 'action': 'snapshot', 'data': [snapshot(BIDS, ASKS)]}]
+            while state.get_book(INST) is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert state.get_book(INST).best_ask() == (3366.8, 9.0)
+        finally:
+            feed.stop()
+            server.close()
@@ -0,0 +1,151 @@
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore
+from okx_api import OKXAPI
+from resample import bar_start, can_resample, resample_candles, Resampler
+from strategy import TradingStrategy
+from benchmark import synthetic_candles as make_candles
+
+
+def ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def columns_of(df):
+    columns = {name: df[name].to_numpy(dtype=np.float64) for name in ('open', 'high', 'low', 'close', 'volume')}
+    columns['timestamp'] = df['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+    columns['volCcy'] = columns['volCcyQuote'] = np.zeros(len(df))
+    return columns
+
+
+def raw_rows(df, confirm='1'):
+    return [[str(ts), str(o), str(h), str(l), str(c), str(v), '0', '0', confirm]
+            for ts, o, h, l, c, v in zip(columns_of(df)['timestamp'], df['open'], df['high'],
+                                         df['low'], df['close'], df['volume'])]
+
+
+class TestBarStart:
+    def test_alignment(self):
+        ts = ms(2025, 5, 7, 10, 37)
+        assert bar_start('15m', ts) == ms(2025, 5, 7, 10, 30)
+        assert bar_start('4H', ts) == ms(2025, 5, 7, 8)
+        # 日线按香港时间对齐，即UTC 16:00
+        assert bar_start('1D', ts) == ms(2025, 5, 6, 16)
+        assert bar_start('1Dutc', ts) == ms(2025, 5, 7)
+        # 2025-05-05为周一
+        assert bar_start('1W', ts) == ms(2025, 5, 4, 16)
+        assert bar_start('1M', ts) == ms(2025, 4, 30, 16)
+
+    def test_can_resample(self):
+        assert can_resample('1m', '5m') and can_resample('1m', '1D') and can_resample('1H', '1M')
+        assert not can_resample('1m', '1m')
+        assert not can_resample('15m', '5m')
+        assert can_resample('1H', '1Dutc')
+        assert not can_resample('12H', '1Dutc')
+
+
+class TestResampler:
+    def test_incremental_matches_batch(self):
+        df = make_candles(n=1000)
+        expected = resample_candles(df, '15m')
+        columns = columns_of(df)
+        resampler = Resampler('1m', ['5m', '15m', '1H'])
+        rng = np.random.default_rng(1)
+        start = 0
+        while start < len(df):
+            end = start + int(rng.integers(1, 40))
+            # 允许与已处理的数据重叠
+            resampler.update({name: values[max(start - 3, 0):end] for name, values in columns.items()})
+            start = end
+
+        frame = resampler.frames()['15m']
+        assert (frame['confirm'] == '1').sum() == (expected['confirm'] == '1').sum()
+        for name in ('timestamp', 'open', 'high', 'low', 'close'):
+            np.testing.assert_array_equal(frame[name].to_numpy(), expected[name].to_numpy(), err_msg=name)
+        np.testing.assert_allclose(frame['volume'], expected['volume'], rtol=1e-12)
+
+    def test_pending_bar_merges_open_bucket(self):
+        df = make_candles(n=12)
+        columns = columns_of(df)
+        resampler = Resampler('1m', ['5m'])
+        resampler.update({name: values[:11] for name, values in columns.items()})
+        resampler.set_pending({name: values[11] for name, values in columns.items()})
+        frame = resampler.frames()['5m']
+        assert list(frame['confirm']) == ['1', '1', '0']
+        last = frame.iloc[-1]
+        assert last['open'] == df['open'].iloc[10] and last['close'] == df['close'].iloc[11]
+        assert np.isclose(last['volume'], df['volume'].iloc[10:12].sum())
+
+    def test_api_resamples_ingested_candles(self, tmp_path):
+        api = OKXAPI()
+        api.candle_store = CandleStore(str(tmp_path))
+        df = make_candles(n=130)
+        api.ingest_candles('1m', raw_rows(df.iloc[:120]))
+        api.ingest_candles('1m', raw_rows(df.iloc[120:]))
+        frames = api.get_frames()
+        assert set(frames) == {'5m', '15m', '1H', '4H', '1D'}
+        assert len(frames['5m']) == 26
+        assert list(frames['1H']['confirm']) == ['1', '1', '0']
+
+        # 重启后用本地存储预热
+        restarted = OKXAPI()
+        restarted.candle_store = api.candle_store
+        np.testing.assert_array_equal(restarted.get_frames()['15m']['close'], frames['15m']['close'])
+
+
+class TestMultiTimeframeStrategy:
+    def test_no_lookahead(self):
+        df = make_candles(n=600)
+        frames = {'1H': resample_candles(df, '1H')}
+        signals = TradingStrategy().generate_signals(df.copy(), frames)
+        hourly = frames['1H']
+        # 00:58的K线收盘时第一根1小时线还没走完，00:59收盘时刚好走完
+        at = signals.set_index('timestamp')['close_1H']
+        assert np.isnan(at[pd.Timestamp('2025-05-07 00:58')])
+        assert at[pd.Timestamp('2025-05-07 00:59')] == hourly['close'].iloc[0]
+        assert at[pd.Timestamp('2025-05-07 02:58')] == hourly['close'].iloc[1]
+        assert at[pd.Timestamp('2025-05-07 02:59')] == hourly['close'].iloc[2]
+
+    def test_update_signals_matches_generate_signals(self):
+        df = make_candles(n=600)
+        frames = {timeframe: resample_candles(df, timeframe) for timeframe in ('5m', '15m')}
+        expected = TradingStrategy().generate_signals(df.copy(), frames).iloc[-1]
+        latest = TradingStrategy().update_signals(df, frames)
+        for name in ('rsi_5m', 'trend_5m', 'macd_hist_15m', 'adx_15m'):
+            assert np.isclose(latest[name], expected[name], equal_nan=True), name
+
+    def test_trend_filter(self):
+        df = make_candles(n=1500, seed=0)
+        frames = {'15m': resample_candles(df, '15m')}
+        strategy = TradingStrategy()
+        strategy.rsi_oversold, strategy.rsi_overbought = 60, 40
+        plain = strategy.generate_signals(df.copy(), frames)
+        strategy.trend_timeframes = ['15m']
+        filtered = strategy.generate_signals(df.copy(), frames)
+        assert (plain['signal'] != 0).sum() > (filtered['signal'] != 0).sum()
+        kept = filtered['signal'] != 0
+        assert (filtered.loc[kept, 'signal'] == filtered.loc[kept, 'trend_15m']).all()
+
+    def test_higher_timeframes_are_cached_until_new_bar(self, monkeypatch):
+        df = make_candles(n=600)
+        strategy = TradingStrategy()
+        calls = []
+        compute = strategy.timeframe_indicators
+        monkeypatch.setattr(strategy, 'timeframe_indicators', lambda frame, bar: calls.append(bar) or compute(frame, bar))
+        frames = {'15m': resample_candles(df.iloc[:590], '15m')}
+        first = strategy.update_signals(df.iloc[:590], frames)
+        strategy.update_signals(df.iloc[:591], frames)
+        assert calls == ['15m']
+        frames = {'15m': resample_candles(df, '15m')}
+        latest = strategy.update_signals(df, frames)
+        assert calls == ['15m', '15m']
+        assert latest['close_15m'] != first['close_15m']
+
+    def test_bot_only_passes_trend_timeframes(self):
+        from main import TradingBot
+        bot = TradingBot()
+        bot.api.get_frames = lambda limit=100, timeframes=None: {timeframe: None for timeframe in timeframes}
+        assert bot.strategy_frames() is None
+        bot.strategy.trend_timeframes = ['1H']
+        assert list(bot.strategy_frames()) == ['1H']
@@ -0,0 +1,132 @@
+import json
+import time
+import requests
+from okx_api import OKXAPI
+from retry import (
+    RetryPolicy, CircuitBreaker, OKXAPIError, CircuitOpenError, DeadlineExceeded,
+    is_retryable, deadline_scope, request_timeout
+)
+
+
+class TestClassification:
+    def test_retryable_and_fatal_errors(self):
+        assert is_retryable(requests.exceptions.Timeout())
+        assert is_retryable(requests.exceptions.ConnectionError())
+        assert is_retryable(OKXAPIError("API错误", code='50011'))
+        assert is_retryable(OKXAPIError("HTTP错误", status=503))
+        assert not is_retryable(OKXAPIError("API错误", code='51000', status=200))
+        assert not is_retryable(OKXAPIError("HTTP错误", status=401))
+        assert not is_retryable(ValueError())
+        assert not is_retryable(CircuitOpenError())
+
+
+class TestRetryPolicy:
+    def test_fatal_error_is_not_retried(self):
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise OKXAPIError("API错误", code='51000')
+
+        try:
+            RetryPolicy(base_delay=0.01).call(fail)
+        except OKXAPIError:
+            pass
+        assert len(calls) == 1
+
+    def test_retries_until_success(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise requests.exceptions.Timeout()
+            return 'ok'
+
+        assert RetryPolicy(base_delay=0.01, max_delay=0.02).call(flaky) == 'ok'
+        assert len(calls) == 3
+
+    def test_deadline_bounds_total_time(self):
+        def fail():
+            raise requests.exceptions.ConnectionError()
+
+        policy = RetryPolicy(max_attempts=100, base_delay=0.2, max_delay=0.2)
+        start = time.monotonic()
+        try:
+            policy.call(fail, deadline=0.5)
+        except requests.exceptions.ConnectionError:
+            pass
+        assert time.monotonic() - start < 0.6
+
+    def test_nested_deadline_uses_earliest(self):
+        with deadline_scope(0.3):
+            with deadline_scope(10):
+                assert request_timeout(30) <= 0.3
+            time.sleep(0.25)
+            try:
+                request_timeout(30)
+            except DeadlineExceeded:
+                pass
+            else:
+                assert False, "截止时间已过应抛出异常"
+
+
+class TestCircuitBreaker:
+    def test_opens_and_half_opens(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=0.1)
+        error = requests.exceptions.Timeout()
+        breaker.record(error)
+        assert breaker.allow()
+        breaker.record(error)
+        assert not breaker.allow()
+
+        time.sleep(0.11)
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record()
+        assert breaker.allow()
+
+    def test_fatal_errors_do_not_open(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+        breaker.record(OKXAPIError("API错误", code='51000'))
+        assert breaker.allow()
+
+
+class TestIdempotentOrder:
+    def test_timeout_after_accept_is_not_resubmitted(self):
+        api = OKXAPI()
+        api.retry_policy = RetryPolicy(base_delay=0.01)
+        orders = {}
+        calls = []
+
+        def request(method, request_path, payload="", headers=None, **kwargs):
+            calls.append((method, request_path))
+            if method == 'POST':
+                body = json.loads(payload)
+                orders[body['clOrdId']] = 'ord-1'
+                raise requests.exceptions.ReadTimeout()
+            cl_ord_id = request_path.split('clOrdId=')[1]
+            return 200, {'code': '0', 'msg': '', 'data': [{'ordId': orders[cl_ord_id], 'clOrdId': cl_ord_id}]}
+
+        api.transport.request = request
+        result = api.create_order('buy', 0.01)
+
+        assert result['data'][0]['ordId'] == 'ord-1'
+        assert [method for method, _ in calls] == ['POST', 'GET']
+        assert len(orders) == 1
+
+    def test_open_circuit_fails_fast(self):
+        api = OKXAPI()
+        api.retry_policy = RetryPolicy(base_delay=0.01, breaker_threshold=2, breaker_reset=10)
+        calls = []
+
+        def request(method, request_path, payload="", headers=None, **kwargs):
+            calls.append(request_path)
+            return 503, None
+
+        api.transport.request = request
+        try:
+            api.get_ticker()
+        except CircuitOpenError:
+            pass
+        assert len(calls) == 2
@@ -0,0 +1,106 @@
+from datetime import date
+import pytest
+from main import TradingBot
+from risk import (RiskEngine, REASON_DAILY_TRADES, REASON_NO_PRICE, REASON_PRICE_JUMP, REASON_NOTIONAL,
+                  REASON_LEVERAGE, REASON_EXPOSURE)
+
+INST = 'BTC-USDT-SWAP'
+BALANCE = {'available': 10000.0, 'frozen': 0.0}
+
+
+def engine(**kwargs):
+    options = dict(max_daily_trades=None, price_jump=None, max_notional=None, max_leverage=None, max_exposure=None)
+    options.update(kwargs)
+    return RiskEngine(**options)
+
+
+def position(pos, inst_id=INST, **fields):
+    return {'instId': inst_id, 'pos': str(pos), **fields}
+
+
+class TestRiskEngine:
+    def test_accepts_within_limits(self):
+        risk = RiskEngine(max_notional=5000, max_leverage=3, max_exposure=20000)
+        decision = risk.check(INST, 'buy', 0.05, 96000, {}, BALANCE)
+        assert decision and decision.reason is None
+
+    def test_daily_trades(self):
+        risk = engine(max_daily_trades=2)
+        risk.record_trade(2)
+        assert risk.remaining_trades() == 0
+        assert risk.check(INST, 'buy', 1, 96000).reason == REASON_DAILY_TRADES
+
+    def test_reserve_and_release_trades(self):
+        risk = engine(max_daily_trades=2)
+        day = risk.reserve_trade()
+        assert day is not None and risk.reserve_trade() == day
+        assert risk.reserve_trade() is None
+        risk.release_trade(day)
+        assert risk.remaining_trades() == 1
+        # 跨日后归还前一天的预占不影响当天计数
+        risk.release_trade(date(2000, 1, 1))
+        assert risk.remaining_trades() == 1
+
+    def test_no_price(self):
+        assert engine().check(INST, 'buy', 1, None).reason == REASON_NO_PRICE
+
+    def test_price_jump(self):
+        risk = engine(price_jump=0.05)
+        assert risk.check(INST, 'buy', 1, 96000)
+        assert risk.check(INST, 'buy', 1, 97000)
+        assert risk.check(INST, 'buy', 1, 90000).reason == REASON_PRICE_JUMP
+        # 参考价随每次检查更新，跳变之后恢复正常
+        assert risk.check(INST, 'buy', 1, 90100)
+        assert risk.check('ETH-USDT-SWAP', 'buy', 1, 1800)
+
+    def test_max_notional(self):
+        risk = engine(max_notional=10000)
+        assert risk.check(INST, 'buy', 0.1, 96000)
+        assert risk.check(INST, 'buy', 0.2, 96000).reason == REASON_NOTIONAL
+
+    def test_symbol_exposure(self):
+        risk = engine(max_exposure=15000)
+        positions = {INST: position(0.15)}
+        assert risk.check(INST, 'buy', 0.05, 96000, positions).reason == REASON_EXPOSURE
+        assert risk.check(INST, 'buy', 0.05, 96000, {})
+        # 减仓不受敞口限制，反手超过原持仓的部分受限制
+        assert risk.check(INST, 'sell', 0.15, 96000, positions)
+        assert risk.check(INST, 'sell', 0.4, 96000, positions).reason == REASON_EXPOSURE
+
+    def test_leverage_counts_all_positions(self):
+        risk = engine(max_leverage=3)
+        assert risk.check(INST, 'buy', 0.3, 96000, {}, BALANCE)
+        positions = {'ETH-USDT-SWAP': position(5, 'ETH-USDT-SWAP', notionalUsd='9000'),
+                     'SOL-USDT-SWAP': position(-20, 'SOL-USDT-SWAP', markPx='150')}
+        decision = risk.check(INST, 'buy', 0.3, 96000, positions, BALANCE)
+        assert decision.reason == REASON_LEVERAGE and '4.08' in decision.message
+        assert risk.check(INST, 'buy', 0.3, 96000, {}, {'available': 0.0, 'frozen': 0.0}).reason == REASON_LEVERAGE
+        # 余额未加载时跳过杠杆检查
+        assert risk.check(INST, 'buy', 0.3, 96000, positions, None)
+
+
+class TestTradingBotRisk:
+    @pytest.fixture
+    def bot(self):
+        bot = TradingBot()
+        bot.api.get_ticker = lambda: pytest.fail("风控不应请求REST行情")
+        bot.api.create_order = lambda *args, **kwargs: pytest.fail("风控拒绝的订单不应提交")
+        bot.risk = engine(max_exposure=20000, price_jump=0.05)
+        return bot
+
+    def test_uses_cached_ticker(self, bot):
+        bot.ticker = {'last': '96000'}
+        assert bot.check_risk('buy', 0.1)
+        bot.ticker = {'last': '80000'}
+        assert bot.check_risk('buy', 0.1).reason == REASON_PRICE_JUMP
+
+    def test_uses_candle_close_without_ticker(self, bot):
+        bot.current_price = 96000.0
+        bot.account.reconcile(positions={INST: position(0.2)})
+        assert bot.check_risk('buy', 0.1).reason == REASON_EXPOSURE
+        assert not bot.execute_trade('buy', 0.1, None, None)
+
+    def test_intents_rejected_with_reason(self, bot):
+        bot.current_price = 96000.0
+        results = bot.submit_intents([{'side': 'buy', 'amount': 1}, {'instId': 'ETH-USDT-SWAP', 'side': 'buy', 'amount': 1}])
+        assert [(r['ok'], r['sCode']) for r in results] == [(False, REASON_EXPOSURE), (False, REASON_NO_PRICE)]
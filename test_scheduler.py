@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timezone
+from scheduler import next_bar_close, ServerClock, BarScheduler
+
+
+def ts(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.current = now
+
+    def now(self):
+        return self.current
+
+
+class FakeAPI:
+    def __init__(self, server_ms):
+        self.server_ms = server_ms
+
+    def get_server_time(self):
+        return self.server_ms
+
+    async def get_server_time_async(self):
+        return self.server_ms
+
+
+class TestNextBarClose:
+    def test_intraday_bars(self):
+        now = ts(2024, 3, 5, 10, 7, 30)
+        assert next_bar_close('1m', now) == ts(2024, 3, 5, 10, 8)
+        assert next_bar_close('15m', now) == ts(2024, 3, 5, 10, 15)
+        assert next_bar_close('4H', now) == ts(2024, 3, 5, 12)
+        # 6小时K线按香港时间对齐：UTC 4、10、16、22点收盘
+        assert next_bar_close('6H', now) == ts(2024, 3, 5, 16)
+        assert next_bar_close('6Hutc', now) == ts(2024, 3, 5, 12)
+        # 恰好在收盘时刻时返回下一次收盘
+        assert next_bar_close('1m', ts(2024, 3, 5, 10, 8)) == ts(2024, 3, 5, 10, 9)
+
+    def test_daily_weekly_monthly(self):
+        now = ts(2024, 3, 5, 10, 7, 30)  # 周二
+        assert next_bar_close('1D', now) == ts(2024, 3, 5, 16)
+        assert next_bar_close('1Dutc', now) == ts(2024, 3, 6)
+        # 周线在香港时间周一0点收盘
+        assert next_bar_close('1W', now) == ts(2024, 3, 10, 16)
+        assert next_bar_close('1Wutc', now) == ts(2024, 3, 11)
+        assert next_bar_close('1M', now) == ts(2024, 3, 31, 16)
+        assert next_bar_close('1Mutc', ts(2024, 12, 31, 23)) == ts(2025, 1, 1)
+
+
+class TestServerClock:
+    def test_offset_from_server_time(self):
+        clock = ServerClock(FakeAPI(0), sync_interval=600)
+        assert clock.stale
+        clock.api.server_ms = (clock.now() + 5) * 1000
+        clock.sync()
+        assert abs(clock.offset - 5) < 0.1
+        assert not clock.stale
+
+        clock.api.server_ms = (clock.now() - clock.offset - 2) * 1000
+        asyncio.run(clock.sync_async())
+        assert abs(clock.offset + 2) < 0.1
+
+    def test_failed_sync_keeps_offset(self):
+        class BrokenAPI:
+            def get_server_time(self):
+                raise ConnectionError("timeout")
+
+        clock = ServerClock(BrokenAPI())
+        clock.offset = 1.5
+        assert clock.sync() == 1.5
+
+
+class TestBarScheduler:
+    def test_wakes_at_each_bar_close(self):
+        clock = FakeClock(ts(2024, 3, 5, 10, 2, 10))
+        scheduler = BarScheduler(clock, ['1m', '5m', '1m'], delay=0.5, poll=1, timeout=15)
+        assert scheduler.wait_seconds() == 50.5
+        assert scheduler.pop_due() == set()
+
+        clock.current = ts(2024, 3, 5, 10, 3) + 0.5
+        assert scheduler.pop_due() == {'1m'}
+        # 已确认则不再轮询
+        assert scheduler.confirm('1m', ts(2024, 3, 5, 10, 2) * 1000)
+        assert scheduler.wait_seconds() == 60
+
+        clock.current = ts(2024, 3, 5, 10, 5) + 0.5
+        assert scheduler.pop_due() == {'1m', '5m'}
+        assert scheduler.confirm('1m', ts(2024, 3, 5, 10, 4) * 1000)
+        assert scheduler.confirm('5m', ts(2024, 3, 5, 10, 0) * 1000)
+        assert scheduler.wait_seconds() == 60
+
+    def test_polls_until_confirmed(self):
+        clock = FakeClock(ts(2024, 3, 5, 10, 2, 59))
+        scheduler = BarScheduler(clock, ['1m'], delay=0.5, poll=1, timeout=3)
+        clock.current += 1.5
+        assert scheduler.pop_due() == {'1m'}
+        # 交易所尚未给出10:02这根K线的确认数据
+        assert not scheduler.confirm('1m', ts(2024, 3, 5, 10, 1) * 1000)
+        assert scheduler.wait_seconds() == 1
+
+        clock.current += 1
+        assert scheduler.pop_due() == {'1m'}
+        assert scheduler.confirm('1m', ts(2024, 3, 5, 10, 2) * 1000)
+        assert scheduler.wait_seconds() > 50
+
+    def test_gives_up_after_timeout(self):
+        clock = FakeClock(ts(2024, 3, 5, 10, 2, 59))
+        scheduler = BarScheduler(clock, ['1m'], delay=0.5, poll=1, timeout=3)
+        clock.current += 1.5
+        scheduler.pop_due()
+        clock.current += 4
+        assert scheduler.wait_seconds() > 50
+        assert scheduler.pop_due() == set()
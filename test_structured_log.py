@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueListener
+from metrics import REGISTRY
+from structured_log import (
+    Redactor, RedactingFilter, SamplingFilter, JSONFormatter, NonBlockingQueueHandler, REDACTED
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def make_logger(name, *handlers):
+    logger = logging.getLogger(name)
+    logger.handlers = list(handlers)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+class TestRedaction:
+    def test_secret_values_and_fields(self):
+        redact = Redactor(secrets=('my-api-key-123', 'pass-phrase!'))
+        text = redact("headers={'OK-ACCESS-KEY': 'my-api-key-123', 'OK-ACCESS-PASSPHRASE': 'pass-phrase!', "
+                      "'OK-ACCESS-SIGN': 'abc=', 'instId': 'BTC-USDT-SWAP'}")
+        assert 'my-api-key-123' not in text and 'pass-phrase!' not in text and 'abc=' not in text
+        assert 'BTC-USDT-SWAP' in text
+        assert redact("signal: 1, sign=xyz") == f"signal: 1, sign={REDACTED}"
+        assert redact.redact_value({'secretKey': 's', 'sz': '1'}) == {'secretKey': REDACTED, 'sz': '1'}
+
+
+class TestPipeline:
+    def test_json_lines_written_by_listener(self):
+        output = ListHandler()
+        output.setFormatter(JSONFormatter())
+        output.addFilter(RedactingFilter(Redactor(secrets=('super-secret',))))
+        log_queue = queue.Queue(100)
+        listener = QueueListener(log_queue, output)
+        listener.start()
+        logger = make_logger('test_pipeline', NonBlockingQueueHandler(log_queue))
+
+        logger.info("下单 %s", 'buy', extra={'inst_id': 'BTC-USDT-SWAP', 'body': {'passphrase': 'super-secret'}})
+        listener.stop()
+
+        entry = json.loads(output.lines[0])
+        assert entry['level'] == 'INFO' and entry['msg'] == '下单 buy'
+        assert entry['inst_id'] == 'BTC-USDT-SWAP'
+        assert entry['body'] == {'passphrase': REDACTED}
+
+    def test_full_queue_drops_without_blocking(self):
+        logger = make_logger('test_full_queue', NonBlockingQueueHandler(queue.Queue(1)))
+        before = REGISTRY.get('log_dropped_total')
+        start = time.monotonic()
+        for i in range(100):
+            logger.info(f"消息 {i}")
+        assert time.monotonic() - start < 0.5
+        assert REGISTRY.get('log_dropped_total') - before == 99
+
+    def test_sampling(self):
+        output = ListHandler()
+        output.setFormatter(JSONFormatter())
+        sampling = SamplingFilter(interval=0.2)
+        logger = make_logger('test_sampling', output)
+        logger.addFilter(sampling)
+
+        for _ in range(5):
+            logger.debug("行情", extra={'sample': 'ticker'})
+        logger.warning("价格波动过大", extra={'sample': 'ticker'})
+        time.sleep(0.25)
+        logger.debug("行情", extra={'sample': 'ticker'})
+
+        entries = [json.loads(line) for line in output.lines]
+        assert [e['level'] for e in entries] == ['DEBUG', 'WARNING', 'DEBUG']
+        assert entries[2]['suppressed'] == 4
@@ -0,0 +1,114 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from okx_api import OKXAPI
+import transport
+from transport import RequestSigner, HTTPTransport, AsyncHTTPTransport
+
+SECRET = 'test-secret'
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """按OKX规则校验签名，并记录客户端端口以检查连接复用"""
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode('utf-8')
+        message = self.headers['OK-ACCESS-TIMESTAMP'] + self.command + self.path + body
+        expected = base64.b64encode(hmac.new(SECRET.encode(), message.encode(), hashlib.sha256).digest()).decode()
+        self.server.requests.append((self.command, self.path, body, self.client_address[1]))
+        code = '0' if expected == self.headers['OK-ACCESS-SIGN'] else '50113'
+        payload = json.dumps({'code': code, 'msg': '', 'data': [{'path': self.path}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_api(server):
+    api = OKXAPI()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    api.signer = RequestSigner(SECRET)
+    api.transport = HTTPTransport(url)
+    api.async_transport = AsyncHTTPTransport(url)
+    return api
+
+
+class TestTransport:
+    def test_signed_requests_reuse_connection(self):
+        server = start_server()
+        api = make_api(server)
+        try:
+            api._make_request('GET', '/api/v5/market/ticker', params={'instId': 'BTC-USDT-SWAP'})
+            api._make_request('POST', '/api/v5/trade/order', body={'instId': 'BTC-USDT-SWAP', 'sz': '1'})
+            api._make_request('GET', '/api/v5/public/time')
+        finally:
+            server.shutdown()
+
+        assert [r[1] for r in server.requests] == [
+            '/api/v5/market/ticker?instId=BTC-USDT-SWAP', '/api/v5/trade/order', '/api/v5/public/time']
+        assert server.requests[1][2] == '{"instId":"BTC-USDT-SWAP","sz":"1"}'
+        assert len({r[3] for r in server.requests}) == 1
+
+    def test_async_request(self):
+        server = start_server()
+        api = make_api(server)
+
+        async def run():
+            try:
+                return await asyncio.gather(
+                    api._make_request_async('GET', '/api/v5/account/balance'),
+                    api._make_request_async('POST', '/api/v5/trade/order', body={'sz': '1'}),
+                )
+            finally:
+                await api.async_transport.close()
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            server.shutdown()
+        assert [r['data'][0]['path'] for r in results] == ['/api/v5/account/balance', '/api/v5/trade/order']
+
+    def test_tries_every_resolved_address(self, monkeypatch):
+        server = start_server()
+        port = server.server_address[1]
+        # 第一个地址上没有服务，连接被拒绝后应继续尝试下一个地址
+        addresses = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (ip, port)) for ip in ('127.0.0.2', '127.0.0.1')]
+        getaddrinfo = socket.getaddrinfo
+        monkeypatch.setattr(transport.socket, 'getaddrinfo',
+                            lambda host, *args: addresses if host == 'okx.test' else getaddrinfo(host, *args))
+        api = OKXAPI()
+        api.signer = RequestSigner(SECRET)
+        api.transport = HTTPTransport(f"http://okx.test:{port}")
+        try:
+            result = api._make_request('GET', '/api/v5/public/time')
+        finally:
+            server.shutdown()
+        assert result['data'][0]['path'] == '/api/v5/public/time'
+
+    def test_sign_matches_legacy_query_format(self):
+        api = OKXAPI()
+        api.signer = RequestSigner(SECRET)
+        message = '2025-05-07T12:00:00.000ZGET/api/v5/market/ticker?instId=BTC-USDT-SWAP'
+        expected = base64.b64encode(hmac.new(SECRET.encode(), message.encode(), hashlib.sha256).digest()).decode()
+        assert api._sign('2025-05-07T12:00:00.000Z', 'GET', '/api/v5/market/ticker', 'instId=BTC-USDT-SWAP') == expected
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from websockets.sync.server import serve
+from ws_client import MarketDataState, MarketDataFeed, OKXWebSocketClient, AccountState, AccountFeed
+
+
+class StandInServer:
+    """本地WebSocket替身服务器：记录订阅和登录，回复心跳，可主动断开连接"""
+
+    def __init__(self, pushes=()):
+        self.pushes = list(pushes)
+        self.subscriptions = []
+        self.logins = []
+        self.pings = 0
+        self.connections = 0
+        self.drop_first = False
+        self.server = serve(self.handler, 'localhost', 0)
+        self.url = f"ws://localhost:{self.server.socket.getsockname()[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handler(self, ws):
+        self.connections += 1
+        for message in ws:
+            if message == 'ping':
+                self.pings += 1
+                ws.send('pong')
+                continue
+            request = json.loads(message)
+            if request['op'] == 'login':
+                self.logins.append(request['args'])
+                ws.send(json.dumps({'event': 'login', 'code': '0', 'msg': ''}))
+                continue
+            self.subscriptions.append(request['args'])
+            for push in self.pushes:
+                ws.send(json.dumps(push))
+            if self.drop_first and self.connections == 1:
+                return
+
+    def close(self):
+        self.server.shutdown()
+
+
+def candle_push(ts, confirm):
+    return {
+        'arg': {'channel': 'candle1m', 'instId': 'BTC-USDT-SWAP'},
+        'data': [[str(ts), '96000', '96010', '95990', '96005', '12', '0.1', '9600', confirm]],
+    }
+
+
+class TestMarketDataFeed:
+    def test_pushes_update_state(self):
+        ticker = {'arg': {'channel': 'tickers', 'instId': 'BTC-USDT-SWAP'},
+                  'data': [{'instId': 'BTC-USDT-SWAP', 'last': '96005'}]}
+        trade = {'arg': {'channel': 'trades', 'instId': 'BTC-USDT-SWAP'},
+                 'data': [{'instId': 'BTC-USDT-SWAP', 'px': '96005', 'sz': '1', 'side': 'buy'}]}
+        server = StandInServer([ticker, trade, candle_push(1746587400000, '0'), candle_push(1746587400000, '1')])
+        state = MarketDataState()
+        closed = []
+        state.candle_listeners.append(lambda inst_id, bar, row: closed.append((bar, row[8])))
+        feed = MarketDataFeed(state, ['BTC-USDT-SWAP'], '1m', public_url=server.url, business_url=server.url)
+        feed.start()
+        try:
+            assert state.wait_for_bar(timeout=5)
+            assert ('1m', '1') in closed
+            assert state.get_candle('BTC-USDT-SWAP', '1m')[8] == '1'
+            assert state.get_ticker('BTC-USDT-SWAP')['last'] == '96005'
+            assert state.get_trades('BTC-USDT-SWAP')[0]['px'] == '96005'
+            assert {'channel': 'candle1m', 'instId': 'BTC-USDT-SWAP'} in sum(server.subscriptions, [])
+        finally:
+            feed.stop()
+            server.close()
+
+
+class TestOKXWebSocketClient:
+    def test_reconnects_and_resubscribes(self):
+        server = StandInServer()
+        server.drop_first = True
+        args = [{'channel': 'tickers', 'instId': 'BTC-USDT-SWAP'}]
+        reconnected = threading.Event()
+        connects = []
+
+        def on_connect():
+            connects.append(1)
+            if len(connects) == 2:
+                reconnected.set()
+
+        client = OKXWebSocketClient(server.url, args, lambda message: None,
+                                    reconnect_delay=0.05, on_connect=on_connect)
+        client.start()
+        try:
+            assert reconnected.wait(5)
+            deadline = time.monotonic() + 5
+            while len(server.subscriptions) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert server.subscriptions == [args, args]
+        finally:
+            client.stop()
+            server.close()
+
+    def test_heartbeat(self):
+        server = StandInServer()
+        client = OKXWebSocketClient(server.url, [], lambda message: None, ping_interval=0.1)
+        client.start()
+        try:
+            assert client.connected.wait(5)
+            time.sleep(0.5)
+            assert server.pings >= 2
+            assert client.connected.is_set()
+        finally:
+            client.stop()
+            server.close()
+
+
+def position(inst_id, pos):
+    return {'instId': inst_id, 'pos': pos, 'posSide': 'net'}
+
+
+class TestAccountState:
+    def test_pushes_update_cache(self):
+        state = AccountState()
+        seen = []
+        state.order_listeners.append(lambda order: seen.append(order['state']))
+        state.update_balances([{'details': [{'ccy': 'USDT', 'availBal': '900', 'frozenBal': '100'}]}])
+        state.update_positions([position('BTC-USDT-SWAP', '2')])
+        state.update_orders([{'ordId': '1', 'instId': 'BTC-USDT-SWAP', 'state': 'live'},
+                             {'ordId': '2', 'instId': 'ETH-USDT-SWAP', 'state': 'live'}])
+        state.update_orders([{'ordId': '2', 'instId': 'ETH-USDT-SWAP', 'state': 'filled'}])
+
+        assert state.get_balance('usdt') == {'available': 900.0, 'frozen': 100.0}
+        assert state.get_position('BTC-USDT-SWAP')['pos'] == '2'
+        assert [order['ordId'] for order in state.get_orders()] == ['1']
+        assert seen == ['live', 'live', 'filled']
+
+    def test_reconcile(self):
+        state = AccountState(reconcile_interval=0.1)
+        assert state.needs_reconcile()
+        state.reconcile({'USDT': {'available': 1.0, 'frozen': 0.0}},
+                        {'BTC-USDT-SWAP': position('BTC-USDT-SWAP', '1'), 'ETH-USDT-SWAP': position('ETH-USDT-SWAP', '3')})
+        assert not state.needs_reconcile()
+
+        # 只覆盖快照包含的合约
+        state.reconcile(positions={'BTC-USDT-SWAP': None}, inst_ids=['BTC-USDT-SWAP'])
+        assert state.get_position('BTC-USDT-SWAP') is None
+        assert state.get_position('ETH-USDT-SWAP')['pos'] == '3'
+        # 完整快照中没有的持仓被移除
+        state.reconcile(positions={})
+        assert state.get_positions() == {}
+        time.sleep(0.15)
+        assert state.needs_reconcile()
+
+
+class TestAccountFeed:
+    def test_login_then_subscribe(self):
+        push = {'arg': {'channel': 'positions', 'instType': 'SWAP'}, 'data': [position('BTC-USDT-SWAP', '5')]}
+        server = StandInServer([push])
+        state = AccountState()
+        state.reconcile(positions={})
+        login = {'op': 'login', 'args': [{'apiKey': 'key', 'passphrase': 'pass', 'timestamp': '1', 'sign': 'x'}]}
+        feed = AccountFeed(state, lambda: login, url=server.url)
+        feed.start()
+        try:
+            deadline = time.monotonic() + 5
+            while state.get_position('BTC-USDT-SWAP') is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert server.logins == [login['args']]
+            assert {'channel': 'orders', 'instType': 'SWAP'} in server.subscriptions[0]
+            assert state.get_position('BTC-USDT-SWAP')['pos'] == '5'
+            # 连接后需要先用REST校准
+            assert state.needs_reconcile()
+        finally:
+            feed.stop()
+            server.close()
+
@@ -0,0 +1,236 @@
+import base64
+import hashlib
+import hmac
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+# 当前线程正在进行的请求的分阶段耗时，由连接对象在新建连接时写入
+_timing = threading.local()
+
+
+def _record(phase, seconds):
+    timing = getattr(_timing, 'current', None)
+    if timing is not None:
+        timing[phase] = timing.get(phase, 0.0) + seconds
+
+
+def encode_request(method, endpoint, params=None, body=None):
+    """一次性编码请求：返回带查询串的请求路径和请求体字符串，签名和发送使用同一份结果"""
+    request_path = endpoint
+    if params:
+        request_path += '?' + urlencode(params)
+    if body is None or method == 'GET':
+        payload = ''
+    elif isinstance(body, str):
+        payload = body
+    else:
+        payload = json.dumps(body, separators=(',', ':'))
+    return request_path, payload
+
+
+def decode_response(content):
+    """解析响应体，非JSON内容返回None"""
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+class RequestSigner:
+    """OKX请求签名：密钥只编码一次，每次签名复制预先初始化的HMAC对象"""
+
+    def __init__(self, secret_key):
+        self._mac = hmac.new((secret_key or '').encode('utf-8'), digestmod=hashlib.sha256)
+
+    def sign(self, timestamp, method, request_path, payload=''):
+        mac = self._mac.copy()
+        mac.update(f"{timestamp}{method}{request_path}{payload}".encode('utf-8'))
+        return base64.b64encode(mac.digest()).decode('utf-8')
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """新建连接时分别记录DNS解析和TCP连接耗时"""
+
+    def _new_conn(self):
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            # 先解析地址并计时，再依次尝试各个地址建立连接（与socket.create_connection相同）；
+            # 解析失败时交给urllib3报告原始错误
+            addresses = list(dict.fromkeys(
+                info[4][0] for info in socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)))
+        except OSError:
+            addresses = [host]
+        resolved = time.perf_counter()
+        _record('dns', resolved - start)
+        try:
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError):
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+            _record('connect', time.perf_counter() - resolved)
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    """在DNS和TCP连接之外记录TLS握手耗时"""
+
+    def connect(self):
+        timing = getattr(_timing, 'current', None)
+        before = (timing.get('dns', 0.0) + timing.get('connect', 0.0)) if timing is not None else 0.0
+        start = time.perf_counter()
+        super().connect()
+        if timing is not None:
+            setup = timing.get('dns', 0.0) + timing.get('connect', 0.0) - before
+            _record('tls', time.perf_counter() - start - setup)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """连接池使用可计时的连接类"""
+
+    POOL_CLASSES = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if hasattr(manager, 'pool_classes_by_scheme'):
+            manager.pool_classes_by_scheme = self.POOL_CLASSES
+        return manager
+
+
+class HTTPTransport:
+    """同步HTTP传输：持久化Session和连接池，复用TCP+TLS连接"""
+
+    def __init__(self, base_url, proxies=None, pool_connections=4, pool_maxsize=16, timeout=30, verify=False):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = verify
+        if proxies:
+            self.session.proxies.update(proxies)
+
+    def request(self, method, request_path, payload='', headers=None, timeout=None, timing=None):
+        """发送请求，返回(HTTP状态码, 解析后的JSON)；timeout为本次请求的超时（秒），
+        传入timing字典时写入dns、connect、tls、server、parse各阶段耗时（秒，复用连接时无前三项）"""
+        if timing is not None:
+            _timing.current = timing
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.base_url + request_path,
+                data=payload.encode('utf-8') if payload else None,
+                headers=headers,
+                timeout=timeout or self.timeout
+            )
+        finally:
+            _timing.current = None
+        received = time.perf_counter()
+        result = decode_response(response.content)
+        if timing is not None:
+            setup = timing.get('dns', 0.0) + timing.get('connect', 0.0) + timing.get('tls', 0.0)
+            timing['server'] = received - start - setup
+            timing['parse'] = time.perf_counter() - received
+        return response.status_code, result
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHTTPTransport:
+    """asyncio HTTP传输：基于aiohttp的连接池，在首次请求时创建会话"""
+
+    def __init__(self, base_url, proxy=None, limit=16, timeout=30, verify=False):
+        self.base_url = base_url
+        self.proxy = proxy
+        self.limit = limit
+        self.timeout = timeout
+        self.verify = verify
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.limit, ssl=self.verify)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config(aiohttp)]
+            )
+        return self._session
+
+    @staticmethod
+    def _trace_config(aiohttp):
+        """aiohttp请求跟踪：记录DNS解析和建立连接（含TLS握手）的耗时"""
+        def timer(phase):
+            async def on_start(session, ctx, params):
+                ctx.started = time.perf_counter()
+
+            async def on_end(session, ctx, params):
+                timing = ctx.trace_request_ctx
+                if isinstance(timing, dict) and hasattr(ctx, 'started'):
+                    timing[phase] = timing.get(phase, 0.0) + time.perf_counter() - ctx.started
+            return on_start, on_end
+
+        trace = aiohttp.TraceConfig()
+        dns_start, dns_end = timer('dns')
+        connect_start, connect_end = timer('connect')
+        trace.on_dns_resolvehost_start.append(dns_start)
+        trace.on_dns_resolvehost_end.append(dns_end)
+        trace.on_connection_create_start.append(connect_start)
+        trace.on_connection_create_end.append(connect_end)
+        return trace
+
+    async def request(self, method, request_path, payload='', headers=None, timeout=None, timing=None):
+        """发送请求，返回(HTTP状态码, 解析后的JSON)；timing的含义同HTTPTransport.request，
+        其中connect包含TLS握手"""
+        import aiohttp
+        session = self._get_session()
+        start = time.perf_counter()
+        async with session.request(
+            method,
+            self.base_url + request_path,
+            data=payload.encode('utf-8') if payload else None,
+            headers=headers,
+            proxy=self.proxy,
+            timeout=aiohttp.ClientTimeout(total=timeout or self.timeout),
+            trace_request_ctx=timing
+        ) as response:
+            content = await response.read()
+        received = time.perf_counter()
+        result = decode_response(content)
+        if timing is not None:
+            timing['server'] = received - start - timing.get('dns', 0.0) - timing.get('connect', 0.0)
+            timing['parse'] = time.perf_counter() - received
+        return response.status, result
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,397 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from websockets.sync.client import connect
+from metrics import REGISTRY
+from orderbook import OrderBook, OrderBookError
+from config import ORDER_BOOK_CHANNEL, ACCOUNT_RECONCILE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# OKX WebSocket地址：K线频道在business端点，行情和成交在public端点
+WS_PUBLIC_URL = 'wss://ws.okx.com:8443/ws/v5/public'
+WS_BUSINESS_URL = 'wss://ws.okx.com:8443/ws/v5/business'
+WS_SIMULATED_PUBLIC_URL = 'wss://wspap.okx.com:8443/ws/v5/public'
+WS_SIMULATED_BUSINESS_URL = 'wss://wspap.okx.com:8443/ws/v5/business'
+WS_PRIVATE_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+WS_SIMULATED_PRIVATE_URL = 'wss://wspap.okx.com:8443/ws/v5/private'
+
+# 订单终态，推送后从未完成订单中移除
+ORDER_FINAL_STATES = ('filled', 'canceled', 'mmp_canceled')
+
+
+class MarketDataState:
+    """线程安全的行情内存状态，由WebSocket推送更新"""
+
+    def __init__(self, max_trades=1000):
+        self._lock = threading.Lock()
+        self._bar_closed = threading.Event()
+        self.max_trades = max_trades
+        self.tickers = {}
+        self.candles = {}
+        self.trades = {}
+        self.books = {}
+        self.candle_listeners = []
+
+    def update_ticker(self, ticker):
+        with self._lock:
+            self.tickers[ticker['instId']] = ticker
+
+    def get_ticker(self, inst_id):
+        with self._lock:
+            return self.tickers.get(inst_id)
+
+    def add_trades(self, trades):
+        with self._lock:
+            for trade in trades:
+                queue = self.trades.get(trade['instId'])
+                if queue is None:
+                    queue = self.trades[trade['instId']] = deque(maxlen=self.max_trades)
+                queue.append(trade)
+
+    def get_trades(self, inst_id):
+        with self._lock:
+            return list(self.trades.get(inst_id, ()))
+
+    def update_candle(self, inst_id, bar, row):
+        """更新K线并通知监听者；K线确认收盘时唤醒等待中的交易循环"""
+        with self._lock:
+            self.candles[(inst_id, bar)] = row
+        for listener in self.candle_listeners:
+            listener(inst_id, bar, row)
+        if row[8] == '1':
+            self._bar_closed.set()
+
+    def update_book(self, inst_id, action, data):
+        """应用订单簿推送；序列号或校验和不一致时抛出OrderBookError"""
+        with self._lock:
+            book = self.books.get(inst_id)
+            if book is None:
+                book = self.books[inst_id] = OrderBook(inst_id)
+        book.apply(action, data)
+
+    def get_book(self, inst_id):
+        """校验通过的本地订单簿，尚未同步或等待重新同步时返回None"""
+        with self._lock:
+            book = self.books.get(inst_id)
+        return book if book is not None and book.valid else None
+
+    def get_candle(self, inst_id, bar):
+        with self._lock:
+            return self.candles.get((inst_id, bar))
+
+    def wait_for_bar(self, timeout=None):
+        """等待下一根K线收盘，超时返回False"""
+        closed = self._bar_closed.wait(timeout)
+        self._bar_closed.clear()
+        return closed
+
+
+class AccountState:
+    """线程安全的账户状态缓存（余额、持仓、未完成订单），由私有频道推送更新，定期用REST快照校准"""
+
+    def __init__(self, reconcile_interval=ACCOUNT_RECONCILE_INTERVAL):
+        self._lock = threading.Lock()
+        self.reconcile_interval = reconcile_interval
+        self.balances = {}
+        self.positions = {}
+        self.orders = {}
+        self.order_listeners = []
+        self.reconciled_at = None
+        # 是否在接收持仓推送，只有此时REST快照与缓存不一致才说明推送有遗漏
+        self._live = False
+
+    def update_balances(self, accounts):
+        """account频道推送：只包含有变化的币种"""
+        with self._lock:
+            for account in accounts:
+                for item in account.get('details', ()):
+                    self.balances[item['ccy']] = {
+                        'available': float(item['availBal'] or 0),
+                        'frozen': float(item['frozenBal'] or 0),
+                    }
+
+    def update_positions(self, positions):
+        with self._lock:
+            self._live = True
+            for position in positions:
+                self.positions[position['instId']] = position
+
+    def update_orders(self, orders):
+        """orders频道推送：未完成订单按ordId缓存，终态订单移除，并通知监听者"""
+        with self._lock:
+            for order in orders:
+                if order.get('state') in ORDER_FINAL_STATES:
+                    self.orders.pop(order['ordId'], None)
+                else:
+                    self.orders[order['ordId']] = order
+        for listener in self.order_listeners:
+            for order in orders:
+                listener(order)
+
+    def get_balance(self, ccy):
+        with self._lock:
+            return dict(self.balances.get(ccy.upper(), {'available': 0.0, 'frozen': 0.0}))
+
+    def get_position(self, inst_id):
+        with self._lock:
+            return self.positions.get(inst_id)
+
+    def get_positions(self):
+        with self._lock:
+            return dict(self.positions)
+
+    def get_orders(self, inst_id=None):
+        with self._lock:
+            return [order for order in self.orders.values() if inst_id is None or order['instId'] == inst_id]
+
+    def needs_reconcile(self):
+        """从未校准、推送中断过或距上次校准超过间隔"""
+        return self.reconciled_at is None or time.monotonic() - self.reconciled_at > self.reconcile_interval
+
+    def restore(self, balances, positions):
+        """从交易日志恢复缓存；不视为已校准，下一轮仍会用REST核对"""
+        with self._lock:
+            self.balances.update(balances)
+            self.positions.update(positions)
+
+    def invalidate(self):
+        """推送连接中断后调用，下一轮改用REST"""
+        self.reconciled_at = None
+        self._live = False
+
+    def reconcile(self, balances=None, positions=None, inst_ids=None):
+        """用REST快照覆盖缓存：balances为{币种: 余额}，positions为{instId: 持仓或None}，
+        inst_ids为持仓快照覆盖的合约，None表示快照包含全部持仓；与推送不一致时记录告警"""
+        with self._lock:
+            mismatched = []
+            if balances:
+                self.balances.update(balances)
+            if positions is not None:
+                covered = set(positions) if inst_ids is None else set(inst_ids)
+                if inst_ids is None:
+                    covered |= set(self.positions)
+                for inst_id in covered:
+                    position = positions.get(inst_id)
+                    cached = self.positions.get(inst_id)
+                    if self._live and self.reconciled_at is not None and _pos(cached) != _pos(position):
+                        mismatched.append(inst_id)
+                    if position is None:
+                        self.positions.pop(inst_id, None)
+                    else:
+                        self.positions[inst_id] = position
+            self.reconciled_at = time.monotonic()
+        for inst_id in mismatched:
+            REGISTRY.inc('account_reconcile_mismatches_total', inst_id=inst_id)
+            logger.warning(f"{inst_id} 持仓推送与REST快照不一致，已按REST校准")
+
+
+def _pos(position):
+    return float(position['pos'] or 0) if position is not None else 0.0
+
+
+class OKXWebSocketClient:
+    """单连接WebSocket订阅客户端：自动重连、心跳保活、断线后重新订阅；私有频道先登录再订阅"""
+
+    def __init__(self, url, subscriptions, on_message, ping_interval=20,
+                 reconnect_delay=1, max_reconnect_delay=30, on_connect=None, login=None):
+        self.url = url
+        self.subscriptions = subscriptions
+        self.on_message = on_message
+        self.on_connect = on_connect
+        # 返回登录请求的函数，每次连接时重新签名
+        self.login = login
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._ws = None
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"ws-{self.url}", daemon=True)
+        self._thread.start()
+
+    def resubscribe(self, args):
+        """退订后重新订阅，用于重新获取订单簿快照"""
+        ws = self._ws
+        if ws is not None:
+            ws.send(json.dumps({'op': 'unsubscribe', 'args': args}))
+            ws.send(json.dumps({'op': 'subscribe', 'args': args}))
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                with connect(self.url, open_timeout=10, close_timeout=1) as ws:
+                    self._ws = ws
+                    if self.login is not None:
+                        self._login(ws)
+                    ws.send(json.dumps({'op': 'subscribe', 'args': self.subscriptions}))
+                    self.connected.set()
+                    delay = self.reconnect_delay
+                    if self.on_connect:
+                        self.on_connect()
+                    self._listen(ws)
+            except Exception as e:
+                if not self._stop.is_set():
+                    logger.warning(f"WebSocket连接中断 {self.url}: {e}")
+            finally:
+                self._ws = None
+                self.connected.clear()
+
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _login(self, ws, timeout=10):
+        ws.send(json.dumps(self.login()))
+        deadline = time.monotonic() + timeout
+        while True:
+            message = ws.recv(timeout=max(deadline - time.monotonic(), 0))
+            if message == 'pong':
+                continue
+            message = json.loads(message)
+            if message.get('event') == 'login' and message.get('code') == '0':
+                return
+            if message.get('event') in ('login', 'error'):
+                raise ConnectionError(f"登录失败: {message.get('msg')} (错误码: {message.get('code')})")
+
+    def _listen(self, ws):
+        awaiting_pong = False
+        while not self._stop.is_set():
+            try:
+                message = ws.recv(timeout=self.ping_interval)
+            except TimeoutError:
+                # 一个心跳周期内没有任何消息：先发ping，再次超时则认为连接已断开
+                if awaiting_pong:
+                    raise ConnectionError("心跳超时")
+                ws.send('ping')
+                awaiting_pong = True
+                continue
+
+            awaiting_pong = False
+            if message == 'pong':
+                continue
+
+            message = json.loads(message)
+            if message.get('event') == 'error':
+                logger.error(f"WebSocket错误: {message.get('msg')} (错误码: {message.get('code')})")
+                continue
+            if 'data' in message:
+                self.on_message(message)
+
+
+class MarketDataFeed:
+    """订阅OKX公共频道（K线、行情、成交），将推送写入MarketDataState；
+    bar可以是统一的K线粒度，也可以是{instId: 粒度}；book_channel为订单簿频道（books/books5），None为不订阅"""
+
+    def __init__(self, state, inst_ids, bar, simulated=True, public_url=None, business_url=None,
+                 on_connect=None, book_channel=ORDER_BOOK_CHANNEL, **client_kwargs):
+        self.state = state
+        self.bar = bar
+        if public_url is None:
+            public_url = WS_SIMULATED_PUBLIC_URL if simulated else WS_PUBLIC_URL
+        if business_url is None:
+            business_url = WS_SIMULATED_BUSINESS_URL if simulated else WS_BUSINESS_URL
+
+        public_args = []
+        for inst_id in inst_ids:
+            public_args.append({'channel': 'tickers', 'instId': inst_id})
+            public_args.append({'channel': 'trades', 'instId': inst_id})
+            if book_channel:
+                public_args.append({'channel': book_channel, 'instId': inst_id})
+        bars = bar if isinstance(bar, dict) else dict.fromkeys(inst_ids, bar)
+        candle_args = [{'channel': f"candle{bars[inst_id]}", 'instId': inst_id} for inst_id in inst_ids]
+
+        self.clients = [
+            OKXWebSocketClient(public_url, public_args, self._handle, on_connect=on_connect, **client_kwargs),
+            OKXWebSocketClient(business_url, candle_args, self._handle, on_connect=on_connect, **client_kwargs),
+        ]
+
+    @property
+    def connected(self):
+        return all(client.connected.is_set() for client in self.clients)
+
+    def start(self):
+        for client in self.clients:
+            client.start()
+
+    def stop(self):
+        for client in self.clients:
+            client.stop()
+
+    def _handle(self, message):
+        arg = message['arg']
+        channel = arg['channel']
+        if channel == 'tickers':
+            for ticker in message['data']:
+                self.state.update_ticker(ticker)
+        elif channel == 'trades':
+            self.state.add_trades(message['data'])
+        elif channel.startswith('books'):
+            for data in message['data']:
+                try:
+                    self.state.update_book(arg['instId'], message.get('action'), data)
+                except OrderBookError as e:
+                    # 丢弃本地订单簿，重新订阅以获取新快照
+                    logger.warning(f"{e}，重新同步订单簿")
+                    REGISTRY.inc('orderbook_resyncs_total', inst_id=arg['instId'])
+                    self.clients[0].resubscribe([arg])
+                    break
+        elif channel.startswith('candle'):
+            for row in message['data']:
+                self.state.update_candle(arg['instId'], channel[len('candle'):], row)
+
+
+class AccountFeed:
+    """订阅私有频道（account、positions、orders），将推送写入AccountState"""
+
+    def __init__(self, state, login, simulated=True, url=None, inst_type='SWAP', on_connect=None, **client_kwargs):
+        self.state = state
+        if url is None:
+            url = WS_SIMULATED_PRIVATE_URL if simulated else WS_PRIVATE_URL
+        args = [
+            {'channel': 'account'},
+            {'channel': 'positions', 'instType': inst_type},
+            {'channel': 'orders', 'instType': inst_type},
+        ]
+
+        def connected():
+            # 断线期间可能漏掉推送，重连后先用REST校准
+            state.invalidate()
+            if on_connect:
+                on_connect()
+
+        self.client = OKXWebSocketClient(url, args, self._handle, on_connect=connected, login=login, **client_kwargs)
+
+    @property
+    def connected(self):
+        return self.client.connected.is_set()
+
+    def start(self):
+        self.client.start()
+
+    def stop(self):
+        self.client.stop()
+
+    def _handle(self, message):
+        channel = message['arg']['channel']
+        if channel == 'account':
+            self.state.update_balances(message['data'])
+        elif channel == 'positions':
+            self.state.update_positions(message['data'])
+        elif channel == 'orders':
+            self.state.update_orders(message['data'])